@@ -0,0 +1,269 @@
+import asyncio
+import collections
+import json
+import math
+import threading
+import time
+
+from metrics import ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS
+
+class Overloaded(Exception):
+    """A request was refused before any work started: its lane's queue was full or the wait ran out"""
+
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f"Server busy ({lane} {reason}), retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+class Lane:
+    """One class of requests: at most max_concurrency at once and max_queue waiting, each for
+    up to queue_timeout seconds. Lower priority numbers get freed slots first."""
+
+    def __init__(self, name, priority, max_concurrency, max_queue, queue_timeout):
+        self.name = name
+        self.priority = priority
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiters = collections.deque()
+        # Moving average of how long an admitted request holds its slot
+        self.service_seconds = None
+        self.waits = collections.deque(maxlen=1000)
+        self.counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+class _Ticket:
+    """An admitted request's slot; released once"""
+
+    def __init__(self, controller, lane, waited):
+        self.controller = controller
+        self.lane = lane
+        # Seconds the request was queued before it was admitted
+        self.waited = waited
+        self.admitted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self.lane, time.monotonic() - self.admitted_at)
+
+class AdmissionController:
+    """Bounded admission queue with per-lane concurrency limits under a shared limit.
+
+    A request that cannot start waits in its lane's FIFO queue; each freed slot
+    goes to the waiting request of the highest-priority lane that still has
+    room, so slow lanes cannot starve fast ones. A request that finds its queue
+    full, or is still waiting after its lane's queue_timeout, is refused with
+    Overloaded and a Retry-After estimated from the lane's recent service time
+    and queue depth. Limits are per worker process.
+    """
+
+    def __init__(self, lanes, max_concurrency=0):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._by_priority = sorted(lanes, key=lambda lane: lane.priority)
+        self._lock = threading.Lock()
+
+    def admit(self, name):
+        """Wait for a slot in the named lane; returns a ticket to release() when the request is done"""
+        lane = self.lanes[name]
+        start = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue(lane, event.set)
+        if not waiter.granted:
+            event.wait(lane.queue_timeout)
+        return self._settle(lane, waiter, start)
+
+    async def admit_async(self, name):
+        """admit() for the event loop: the wait is an asyncio event set from whichever thread frees a slot"""
+        lane = self.lanes[name]
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(lane, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            if not waiter.granted:
+                await asyncio.wait_for(event.wait(), lane.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled while queued: give back a slot granted in the meantime
+            self._settle(lane, waiter, start, cancelled=True)
+            raise
+        return self._settle(lane, waiter, start)
+
+    def stats(self):
+        with self._lock:
+            lanes = {}
+            for lane in self._by_priority:
+                waits = sorted(lane.waits)
+                lanes[lane.name] = {
+                        "priority": lane.priority,
+                        "in_flight": lane.in_flight,
+                        "queued": len(lane.waiters),
+                        "max_concurrency": lane.max_concurrency,
+                        "max_queue": lane.max_queue,
+                        "queue_timeout": lane.queue_timeout,
+                        **lane.counters,
+                        "wait_p50": round(waits[len(waits) // 2], 4) if waits else None,
+                        "wait_p99": round(waits[int(len(waits) * 0.99)], 4) if waits else None,
+                        "service_seconds": round(lane.service_seconds, 3) if lane.service_seconds is not None else None
+                        }
+            return {"in_flight": self.in_flight, "max_concurrency": self.max_concurrency, "lanes": lanes}
+
+    def _can_start(self, lane):
+        if lane.in_flight >= lane.max_concurrency:
+            return False
+        return not self.max_concurrency or self.in_flight < self.max_concurrency
+
+    def _enqueue(self, lane, wake):
+        waiter = _Waiter(wake)
+        with self._lock:
+            lane.waiters.append(waiter)
+            self._dispatch()
+            if not waiter.granted and len(lane.waiters) > lane.max_queue:
+                lane.waiters.remove(waiter)
+                lane.counters["rejected_queue_full"] += 1
+                retry_after = self._retry_after(lane)
+            else:
+                ADMISSION_QUEUE_DEPTH.labels(lane.name).set(len(lane.waiters))
+                return waiter
+        ADMISSION_WAIT_SECONDS.labels(lane.name, "queue_full").observe(0)
+        raise Overloaded(lane.name, "queue is full", retry_after)
+
+    def _settle(self, lane, waiter, start, cancelled=False):
+        waited = time.monotonic() - start
+        with self._lock:
+            if not waiter.granted:
+                lane.waiters.remove(waiter)
+                ADMISSION_QUEUE_DEPTH.labels(lane.name).set(len(lane.waiters))
+                if cancelled:
+                    return None
+                lane.counters["rejected_timeout"] += 1
+                retry_after = self._retry_after(lane)
+            else:
+                lane.waits.append(waited)
+                ticket = _Ticket(self, lane, waited)
+        if not waiter.granted:
+            ADMISSION_WAIT_SECONDS.labels(lane.name, "timeout").observe(waited)
+            raise Overloaded(lane.name, f"queue wait exceeded {lane.queue_timeout:g}s", retry_after)
+        ADMISSION_WAIT_SECONDS.labels(lane.name, "admitted").observe(waited)
+        if cancelled:
+            ticket.release()
+            return None
+        return ticket
+
+    def _dispatch(self):
+        """Start queued requests while there is room, highest-priority lanes first; call with the lock held"""
+        for lane in self._by_priority:
+            while lane.waiters and self._can_start(lane):
+                waiter = lane.waiters.popleft()
+                lane.in_flight += 1
+                self.in_flight += 1
+                lane.counters["admitted"] += 1
+                waiter.granted = True
+                waiter.wake()
+            ADMISSION_QUEUE_DEPTH.labels(lane.name).set(len(lane.waiters))
+
+    def _release(self, lane, held):
+        with self._lock:
+            lane.in_flight -= 1
+            self.in_flight -= 1
+            lane.service_seconds = held if lane.service_seconds is None else 0.8 * lane.service_seconds + 0.2 * held
+            self._dispatch()
+
+    def _retry_after(self, lane):
+        """Seconds until the queue ahead of a new request should have drained; call with the lock held"""
+        service = lane.service_seconds if lane.service_seconds is not None else lane.queue_timeout
+        return min(600, max(1, math.ceil(service * (len(lane.waiters) + 1) / max(1, lane.max_concurrency))))
+
+def _overloaded_body(e):
+    body = json.dumps({"error": str(e), "retry_after": e.retry_after}).encode('utf-8')
+    # Browsers only let the front end read the 429 and its Retry-After with these
+    headers = [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", str(e.retry_after)),
+            ("Access-Control-Allow-Origin", "*"),
+            ("Access-Control-Expose-Headers", "Retry-After")
+            ]
+    return body, headers
+
+class _ReleasingIterable:
+    """A WSGI response body that releases its admission ticket once the server closes it"""
+
+    def __init__(self, iterable, ticket):
+        self.iterable = iterable
+        self.ticket = ticket
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, "close"):
+                self.iterable.close()
+        finally:
+            self.ticket.release()
+
+class WSGIAdmission:
+    """WSGI middleware: admits each request through the controller before the app sees it and
+    holds the slot until the response, streamed or not, has been sent.
+    lane_for(method, path) names the lane, or None for requests that are never queued."""
+
+    def __init__(self, app, controller, lane_for):
+        self.app = app
+        self.controller = controller
+        self.lane_for = lane_for
+
+    def __call__(self, environ, start_response):
+        lane = self.lane_for(environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", ""))
+        if lane is None:
+            return self.app(environ, start_response)
+        try:
+            ticket = self.controller.admit(lane)
+        except Overloaded as e:
+            body, headers = _overloaded_body(e)
+            start_response("429 Too Many Requests", headers)
+            return [body]
+        try:
+            return _ReleasingIterable(self.app(environ, start_response), ticket)
+        except BaseException:
+            ticket.release()
+            raise
+
+class ASGIAdmission:
+    """WSGIAdmission for ASGI apps; the slot is held until the app has sent its whole response"""
+
+    def __init__(self, app, controller, lane_for):
+        self.app = app
+        self.controller = controller
+        self.lane_for = lane_for
+
+    async def __call__(self, scope, receive, send):
+        lane = self.lane_for(scope.get("method", "GET"), scope.get("path", "")) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            ticket = await self.controller.admit_async(lane)
+        except Overloaded as e:
+            body, headers = _overloaded_body(e)
+            await send({
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+                    })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ticket.release()
@@ -1,63 +1,240 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import openai
 from openai import OpenAI
 import httpx
 import time
 import psutil
 import re
-import sys
 import os
+import threading
+import concurrent.futures
+import contextlib
+import queue
 import uuid
 import json
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+import gzip
+from tenacity import retry, wait_exponential, stop_after_attempt, stop_any, retry_if_exception_type
 from dotenv import load_dotenv
-from gradio_client import Client
-from response_parser import parse_agent_response, save_as_markdown
+from response_parser import AgentResponseParser, extract_novelty_score, render_markdown
+from criteria_parser import (
+        CRITERIA_COUNT,
+        CriteriaStreamParser,
+        merge_criteria_outputs,
+        parse_criteria_output
+        )
+from result_cache import ResultCache, cache_key, normalize_proposal
+from rate_limiter import RateLimiter
+from hf_space import SpaceConnection, is_api_mismatch
+from memory_budget import BudgetExceeded, MemoryGovernor, MemoryPressure, SpillBuffer
+from batch import BatchError, parse_batch_items, run_batch
+from jobs import JobCancelled, JobQueue, JobStore, QueueFull, SUCCEEDED, FAILED, CANCELLED, public_view
+from resilience import CircuitBreaker, CircuitOpen, Deadline, DeadlineExceeded, stop_at_deadline
+from upstream_pool import UpstreamPool, UpstreamTarget, target_specs
+from similarity_index import SimilarityIndex
+from proposal_text import TokenCounter, prepare_proposal
+from trace_store import TraceStore
+from history import KINDS as HISTORY_KINDS, HistoryStore
+from artifact_store import ArtifactStore
+from response_encoding import ResponseEncoder, parse_fields, project
+from admission import AdmissionController, Lane, WSGIAdmission
+from metrics import evaluate_timings, research_timings, outcome_of, render as render_metrics
 
 # Load environment variables
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
-# OpenAI client for DeepSeek
-client = OpenAI(
-        base_url="https://api.deepseek.com",
-        api_key=os.getenv("DEEPSEEK_API_KEY"),
-        http_client=httpx.Client(
-            timeout=300.0,
-            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
-            transport=httpx.HTTPTransport(retries=5)
+# Upstream rate limits per API key, shared by all workers on the host (0 disables a bucket)
+RATE_LIMIT_STATE = os.getenv("RATE_LIMIT_STATE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "rate_limit.json"))
+DEEPSEEK_RPS = float(os.getenv("DEEPSEEK_RPS", 5))
+DEEPSEEK_BURST = float(os.getenv("DEEPSEEK_BURST", 5))
+DEEPSEEK_TPM = float(os.getenv("DEEPSEEK_TPM", 0))
+# Tokens reserved for the answer and reasoning until the real size is known, per evaluation
+# and per single-criterion request of a parallel evaluation
+EXPECTED_COMPLETION_TOKENS = int(os.getenv("EXPECTED_COMPLETION_TOKENS", 12000))
+EXPECTED_CRITERION_TOKENS = int(os.getenv("EXPECTED_CRITERION_TOKENS", 4000))
+
+# Per-request stream budgets: bytes kept in memory before spilling to a temp file, and hard caps
+REASONING_MEMORY_BYTES = int(os.getenv("REASONING_MEMORY_BYTES", 256 * 1024))
+REASONING_MAX_BYTES = int(os.getenv("REASONING_MAX_BYTES", 16 * 1024 * 1024))
+CONTENT_MEMORY_BYTES = int(os.getenv("CONTENT_MEMORY_BYTES", 512 * 1024))
+CONTENT_MAX_BYTES = int(os.getenv("CONTENT_MAX_BYTES", 4 * 1024 * 1024))
+# Memory set aside for each in-flight evaluation when deciding whether to admit another
+REQUEST_MEMORY_RESERVE = int(os.getenv("REQUEST_MEMORY_RESERVE_MB", 4)) * 1024 * 1024
+
+# Process-level memory governor; defaults to this worker's share of 75% of host memory
+memory_governor = MemoryGovernor(
+        int(os.getenv("WORKER_MAX_RSS_MB", 0)) * 1024 * 1024
+        or int(psutil.virtual_memory().total * 0.75 / int(os.getenv("WEB_CONCURRENCY", 1))),
+        queue_timeout=float(os.getenv("MEMORY_QUEUE_TIMEOUT", 5))
+        )
+
+# Batch evaluation: default and maximum concurrent upstream calls per batch request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 32))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+DEEPSEEK_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", max(20, BATCH_MAX_CONCURRENCY)))
+
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+# Upstream targets (key and base URL pairs): DEEPSEEK_UPSTREAMS as a JSON list, else the
+# comma-separated DEEPSEEK_API_KEYS or DEEPSEEK_API_KEY, all at DEEPSEEK_BASE_URL
+DEEPSEEK_TARGETS = target_specs(
+        os.getenv("DEEPSEEK_UPSTREAMS"),
+        os.getenv("DEEPSEEK_API_KEYS") or os.getenv("DEEPSEEK_API_KEY"),
+        DEEPSEEK_BASE_URL
+        )
+# Seconds between health probes of each upstream target (0 disables)
+UPSTREAM_HEALTH_INTERVAL = float(os.getenv("UPSTREAM_HEALTH_INTERVAL", 30))
+
+# Total time budget per request across all retries; clients may ask for less with X-Request-Timeout
+EVALUATE_DEADLINE = float(os.getenv("EVALUATE_DEADLINE", 600))
+RESEARCH_DEADLINE = float(os.getenv("RESEARCH_DEADLINE", 900))
+RESEARCH_JOB_DEADLINE = float(os.getenv("RESEARCH_JOB_DEADLINE", 3600))
+# No retry is started with less than this much of the budget left
+MIN_ATTEMPT_SECONDS = float(os.getenv("MIN_ATTEMPT_SECONDS", 60))
+
+def admission_lane(name, priority, concurrency, queue, timeout):
+    """A lane whose limits can be overridden with ADMISSION_<NAME>_CONCURRENCY, _QUEUE and _TIMEOUT"""
+    prefix = f"ADMISSION_{name.upper()}"
+    return Lane(
+            name,
+            priority,
+            max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+            max_queue=int(os.getenv(f"{prefix}_QUEUE", queue)),
+            queue_timeout=float(os.getenv(f"{prefix}_TIMEOUT", timeout))
             )
+
+# Admission control per worker: each lane has its own concurrency limit and bounded queue, and
+# freed slots go to the health check first, then /evaluate, then /research. Requests over the limit
+# get 429 with Retry-After instead of waiting in the listen backlog until the client gives up.
+# With the sync deployment this needs gunicorn --threads, so requests reach the app to be queued
+admission = AdmissionController(
+        [
+            admission_lane("health", 0, concurrency=8, queue=32, timeout=2),
+            admission_lane("evaluate", 1, concurrency=64, queue=256, timeout=30),
+            admission_lane("research", 2, concurrency=16, queue=64, timeout=30)
+            ],
+        max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", 80))
+        )
+
+def request_lane(method, path):
+    """The admission lane of a request; other requests (stats, metrics, job status, traces) are not queued"""
+    if method == "OPTIONS":
+        return None
+    if path == "/" or path.startswith("/ready"):
+        return "health"
+    if method == "POST" and path in ("/evaluate", "/evaluate/stream", "/evaluate/batch"):
+        return "evaluate"
+    if method == "POST" and path in ("/research", "/pipeline"):
+        return "research"
+    return None
+
+app.wsgi_app = WSGIAdmission(app.wsgi_app, admission, request_lane)
+
+EVAL_MODEL = "deepseek-reasoner"
+
+# "single" asks for all six criteria in one request; "parallel" sends one request per criterion
+# at once and merges the answers. Clients can pick per request with ?mode=
+EVALUATION_MODES = ("single", "parallel")
+EVALUATION_MODE = os.getenv("EVALUATION_MODE", "single")
+if EVALUATION_MODE not in EVALUATION_MODES:
+    raise ValueError(f"EVALUATION_MODE must be one of {', '.join(EVALUATION_MODES)}")
+# Threads per worker running the single-criterion requests of parallel evaluations
+CRITERION_WORKERS = int(os.getenv("CRITERION_WORKERS", 6 * 8))
+# Threads per worker running the evaluation and research branches of /pipeline requests, and streamed /research runs
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 2 * 8))
+
+# Content-addressed cache for evaluation and research results, shared by all workers on the host.
+# Each worker also keeps up to RESULT_CACHE_MEMORY_BYTES of encoded results in memory
+result_cache = ResultCache(
+        os.getenv("RESULT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "results")),
+        ttl=int(os.getenv("RESULT_CACHE_TTL", 7 * 24 * 3600)),
+        memory_bytes=int(os.getenv("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)),
+        max_disk_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+        )
+
+# Reasoning traces of evaluations, stored compressed apart from the answer and sent only on request
+reasoning_traces = TraceStore(
+        os.getenv("REASONING_TRACE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "reasoning")),
+        ttl=result_cache.ttl,
+        max_bytes=int(os.getenv("REASONING_TRACE_MAX_BYTES", 512 * 1024 * 1024))
+        )
+
+# Near-duplicate proposals: one at least this similar (estimated Jaccard over word 3-shingles) to a
+# proposal already answered gets that stored result, flagged as reused; 0 disables reuse
+SIMILAR_REUSE_THRESHOLD = float(os.getenv("SIMILAR_REUSE_THRESHOLD", 0))
+similar_proposals = SimilarityIndex(
+        os.getenv("SIMILARITY_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "similar_proposals.db")),
+        max_entries=int(os.getenv("SIMILARITY_INDEX_MAX_ENTRIES", 100000)),
+        ttl=result_cache.ttl
         )
 
+# Every evaluation and research result served, for lookup by id, search and score analytics.
+# Responses only queue their result; a background thread per worker writes them in batches
+history = HistoryStore(
+        os.getenv("HISTORY_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "history.db")),
+        flush_interval=float(os.getenv("HISTORY_FLUSH_SECONDS", 1)),
+        max_queued=int(os.getenv("HISTORY_MAX_QUEUED", 10000))
+        )
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 500))
+
+# The Markdown report and the response of each /research call, kept under its request_id for
+# GET /research/reports/<request_id>; written by a background thread and dropped ARTIFACT_TTL seconds
+# later, or sooner (oldest first) beyond ARTIFACT_MAX_BYTES on disk
+research_artifacts = ArtifactStore(
+        os.getenv("ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "artifacts")),
+        ttl=int(os.getenv("ARTIFACT_TTL", 3 * 24 * 3600)),
+        max_bytes=int(os.getenv("ARTIFACT_MAX_BYTES", 256 * 1024 * 1024)),
+        max_queued=int(os.getenv("ARTIFACT_MAX_QUEUED", 1000))
+        )
+
+# /evaluate and /research bodies of at least RESPONSE_COMPRESS_MIN_BYTES are sent brotli- or
+# gzip-compressed to clients that accept it
+response_encoder = ResponseEncoder(
+        min_bytes=int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", 1024)),
+        gzip_level=int(os.getenv("RESPONSE_GZIP_LEVEL", 5)),
+        brotli_quality=int(os.getenv("RESPONSE_BROTLI_QUALITY", 4))
+        )
+# Left out of /research responses unless ?fields= names them: the agent's raw messages are
+# several times the size of the parsed result derived from them
+RESEARCH_OMITTED_FIELDS = ("raw_result",)
+
+# Proposals are normalized and stripped of repeated blocks before they are sent or used as cache keys,
+# then cut to PROPOSAL_MAX_TOKENS (0 disables) keeping every section's opening. Tokens are counted with
+# the tiktoken encoding PROPOSAL_TOKENIZER, loaded in the background, or estimated ("estimate")
+PROPOSAL_MAX_TOKENS = int(os.getenv("PROPOSAL_MAX_TOKENS", 8000))
+token_counter = TokenCounter(
+        os.getenv("PROPOSAL_TOKENIZER", "cl100k_base"),
+        ready_timeout=float(os.getenv("TOKENIZER_READY_TIMEOUT", 10))
+        )
+token_counter.start()
+
 # Hugging Face setup
+HF_SPACE = os.getenv("HF_SPACE", "MaoShen/Moonshot_DeepResearch")
 hf_token = os.getenv("HF_TOKEN")
 if not hf_token:
-    print("Error: HF_TOKEN environment variable not found. Please set your Hugging Face token.")
-    sys.exit(1)
-
-# Initialize Gradio client with more robust error handling
-try:
-    print(f"Attempting to connect to Hugging Face space with token: {hf_token[:4]}..." if hf_token else "No HF token provided")
-    gradio_client = Client(
-            "MaoShen/Moonshot_DeepResearch", 
-            hf_token=hf_token
-            )
-    print("Successfully connected to Hugging Face space")
-except Exception as e:
-    print(f"Error initializing Gradio client: {str(e)}")
-    if isinstance(e, httpx.HTTPStatusError):
-        print(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
-    elif isinstance(e, httpx.RequestError):
-        print(f"Request error: {e.request.url} - {e}")
-    elif isinstance(e, json.JSONDecodeError):
-        print("Invalid JSON response received from the server.")
-    else:
-        print(f"Unhandled error: {str(e)}")
-    gradio_client = None
-
-# System message for DeepSeek evaluation
-system_message = '''
+    print("Warning: HF_TOKEN environment variable not found. /research is unavailable until it is set.")
+
+# The Gradio client connects in the background so workers bind right away and /evaluate
+# never waits on Hugging Face; the Space host, config and API info are cached on disk
+space = SpaceConnection(
+        HF_SPACE,
+        hf_token,
+        cache_path=os.getenv("SPACE_CONFIG_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "space_config.json")),
+        cache_ttl=int(os.getenv("SPACE_CONFIG_TTL", 24 * 3600)),
+        client_kwargs={"max_workers": int(os.getenv("SPACE_MAX_WORKERS", 40))}
+        )
+space.start()
+# Seconds a research request waits for a connection that is still being established
+SPACE_READY_TIMEOUT = float(os.getenv("SPACE_READY_TIMEOUT", 10))
+# Seconds between checks for new agent messages while a research run streams its progress
+SPACE_OUTPUT_POLL = float(os.getenv("SPACE_OUTPUT_POLL", 0.5))
+
+# System message for DeepSeek evaluation, in parts: the per-criterion mode reuses the
+# introduction and criteria with its own output format
+EVALUATION_INTRO = '''
 You are an evaluator of startup business ideas for a startup accelerator known as MoonshotAI. MoonshotAI is a platform that helps startups evaluate their ideas and provides improvement recommendations. MoonshotAI also assists startups in seeking funding opportunities from investors, but investors or VCs will only invest in the best and most promising startups. Therefore, the evaluation and improvement recommendations from MoonshotAI must be rigorous and genuinely helpful. Your role is to critically and thoroughly assess the startup ideas presented to you.
 
 The goal is to help startup founders evaluate whether their ideas are strong enough based on established criteria, which I will share, and to provide improvement suggestions. Assess each aspect according to the specified criteria.
@@ -80,7 +257,9 @@ Summarize your findings and score the startup based on the criteria. Each applic
 
 The scores reflect your evaluation of whether the startup idea meets the criteria and is a good idea. Use higher scores when startups meet the criteria and lower scores when startups do not meet the criteria.
 
-Provide your final answer in the following format, ensuring that each section has the exact word count described:
+'''
+
+EVALUATION_FORMAT = '''Provide your final answer in the following format, ensuring that each section has the exact word count described:
 
 This is the highest priority requirement: you must strictly follow the output format without any changes. This is the most critical principle. You are NOT allowed to modify the structure, wording, or order of the format. Every line and section must appear exactly as written. Fill in the missing values without altering anything else; you cannot leave them blank.
 
@@ -122,7 +301,9 @@ format = (
     "</chain_of_thought>"
 )
 
-Scoring Rubric:
+'''
+
+EVALUATION_CRITERIA = '''Scoring Rubric:
 
 Score how well the startup idea meets the criteria. Consider your certainty and doubts using this scale:
 
@@ -223,150 +404,683 @@ Focus on the following aspects when evaluating the criteria:
 6. Evaluate whether the team listens to users and iterates based on feedback.
 '''
 
-RETRY_EXCEPTIONS = (
+system_message = EVALUATION_INTRO + EVALUATION_FORMAT + EVALUATION_CRITERIA
+
+# Output format for evaluating one criterion; the criterion is named at the end of the user message
+CRITERION_FORMAT = '''
+You will be told which one of the criteria to evaluate. Evaluate only that criterion, writing its number in place of N, and provide your final answer in the following format, ensuring that each section has the exact word count described:
+
+This is the highest priority requirement: you must strictly follow the output format without any changes. This is the most critical principle. You are NOT allowed to modify the structure, wording, or order of the format. Every line and section must appear exactly as written. Fill in the missing values without altering anything else; you cannot leave them blank.
+
+format = (
+    "The score of criteriaN: {score} \n"
+    "Detailed reasoningN: {Reasoning: Explain your complete reasoning step-by-step in a detailed 300-word paragraph} \n"
+    "Summary reasoning criteriaN: {summary: Summary of the reasoning behind the score in one informative, 200-word paragraph} \n"
+    "Improvement suggestion criteriaN: {improvement: Improvement suggestions in a detailed 300-word paragraph} \n"
+    "\n--- Evaluation Details End ---\n"
+    "\n<chain_of_thought>\n"
+    "    <introduction>[Your introductory reasoning here]</introduction>\n"
+    "    <criteriaN>[Detailed evaluation for Criteria N]</criteriaN>\n"
+    "    <conclusion>[Summarize your reasoning for this criterion here]</conclusion>\n"
+    "</chain_of_thought>"
+)
+'''
+
+# Identical for all six per-criterion requests, so the upstream can reuse its cached prefix
+criterion_system_message = EVALUATION_INTRO + EVALUATION_CRITERIA + CRITERION_FORMAT
+
+# Errors that mean DeepSeek is unhealthy: retried, and counted by its circuit breaker
+UPSTREAM_FAILURES = (
         httpx.RemoteProtocolError,
         httpx.ReadTimeout,
         httpx.ConnectTimeout,
         httpx.WriteTimeout,
-        httpx.ProtocolError
+        httpx.ProtocolError,
+        openai.APIConnectionError,
+        openai.InternalServerError
         )
+# 429s are retried too, after the rate limiter's pause, but say nothing about health
+RETRY_EXCEPTIONS = UPSTREAM_FAILURES + (openai.RateLimitError,)
+
+UPSTREAM_WAIT = wait_exponential(multiplier=1, min=2, max=30)
 
-@retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=2, max=30),
+# The only retry layer for DeepSeek calls; it also stops once the call's deadline cannot fit another attempt
+upstream_retry = retry(
+        stop=stop_any(stop_after_attempt(5), stop_at_deadline(UPSTREAM_WAIT, MIN_ATTEMPT_SECONDS)),
+        wait=UPSTREAM_WAIT,
         retry=retry_if_exception_type(RETRY_EXCEPTIONS),
+        reraise=True,
         before_sleep=lambda _: print("Connection issue, retrying...")
         )
 
-def evaluate_criteria(proposal):
+# Circuit breakers fail fast with 503 while an upstream keeps failing
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", 30))
+space_breaker = CircuitBreaker(
+        "Research Space",
+        failure_threshold=BREAKER_FAILURES,
+        reset_timeout=BREAKER_RESET_SECONDS,
+        ignored_exceptions=(DeadlineExceeded, JobCancelled)
+        )
+
+# Errors that eject one target but are not retried: its key was revoked or lacks access
+TARGET_FAILURES = UPSTREAM_FAILURES + (openai.AuthenticationError, openai.PermissionDeniedError)
+
+def rate_limit_state(name):
+    """Rate-limit state file for one target; a lone target keeps RATE_LIMIT_STATE"""
+    if len(DEEPSEEK_TARGETS) == 1:
+        return RATE_LIMIT_STATE
+    root, ext = os.path.splitext(RATE_LIMIT_STATE)
+    return f"{root}-{name}{ext}"
+
+def build_target(spec):
+    """An upstream target with its own rate limiter, circuit breaker and OpenAI client"""
+    rps = spec["rps"] if spec["rps"] is not None else DEEPSEEK_RPS
+    limiter = RateLimiter(
+            rate_limit_state(spec["name"]),
+            requests_per_second=rps,
+            burst=DEEPSEEK_BURST if spec["rps"] is None else max(1.0, rps),
+            tokens_per_minute=spec["tpm"] if spec["tpm"] is not None else DEEPSEEK_TPM
+            )
+    breaker = CircuitBreaker(
+            f"DeepSeek ({spec['name']})",
+            failure_threshold=BREAKER_FAILURES,
+            reset_timeout=BREAKER_RESET_SECONDS,
+            failure_exceptions=TARGET_FAILURES
+            )
+    target = UpstreamTarget(spec["name"], spec["base_url"], spec["api_key"], limiter, breaker, weight=spec["weight"])
+    # Retries are left to upstream_retry so they are not stacked
+    target.client = OpenAI(
+            base_url=spec["base_url"],
+            api_key=spec["api_key"],
+            max_retries=0,
+            http_client=httpx.Client(
+                timeout=300.0,
+                # The pool limits belong on the transport; httpx ignores client limits when a transport is given
+                transport=httpx.HTTPTransport(
+                    limits=httpx.Limits(max_keepalive_connections=10, max_connections=spec["max_connections"] or DEEPSEEK_MAX_CONNECTIONS)
+                    ),
+                event_hooks={"response": [limiter.observe_response]}
+                )
+            )
+    return target
+
+# Each evaluation goes to the least-loaded DeepSeek target; targets that keep failing are ejected
+deepseek_pool = UpstreamPool("DeepSeek", [build_target(spec) for spec in DEEPSEEK_TARGETS])
+deepseek_pool.start_health_checks(lambda target: target.client.models.list(timeout=10.0), UPSTREAM_HEALTH_INTERVAL)
+
+def prepare(proposal):
+    """The proposal as the models see it and the caches key it, with its token counts"""
+    return prepare_proposal(proposal, token_counter, PROPOSAL_MAX_TOKENS)
+
+def approx_tokens(text):
+    """Rough token count used for rate-limit budgeting (about 4 characters per token)"""
+    return len(text) // 4
+
+def attempt_timeout(deadline):
+    """Connect and read timeouts for one upstream attempt, cut to the remaining budget"""
+    return httpx.Timeout(deadline.timeout(30.0), read=deadline.timeout(300.0))
+
+def expected_tokens(criterion=None):
+    return EXPECTED_COMPLETION_TOKENS if criterion is None else EXPECTED_CRITERION_TOKENS
+
+def completion_request(proposal, criterion=None):
+    """Arguments for the streamed evaluation call (less its timeout) and the tokens to reserve for it;
+    with a criterion number, the call evaluates that criterion alone"""
     user_message = f"\n This is the solution that you are going to evaluate: \n {proposal} \n"
+    prompt = system_message
+    if criterion is not None:
+        # Only the end of the user message differs, so all six requests share one prompt prefix
+        prompt = criterion_system_message
+        user_message += f"\n Evaluate only Criteria {criterion}, writing {criterion} in place of N in the format. \n"
+    tokens = approx_tokens(prompt) + approx_tokens(user_message) + expected_tokens(criterion)
+    return dict(
+            model=EVAL_MODEL,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": user_message}
+                ],
+            stream=True,
+            temperature=0
+            ), tokens
+
+def open_completion(target, proposal, deadline, timings, criterion=None):
+    """Start a streamed deepseek-reasoner completion for the proposal on the given upstream target"""
+    timings.attempts += 1
+    kwargs, tokens = completion_request(proposal, criterion)
+    timings.add("rate_limit_wait", target.rate_limiter.acquire(tokens, deadline))
+    deadline.check("DeepSeek evaluation")
+    timings.begin_attempt()
+    return target.client.chat.completions.create(**kwargs, timeout=attempt_timeout(deadline))
+
+def chunk_deltas(chunk):
+    """The ("reasoning", text) and ("content", text) pairs carried by one streamed chunk"""
+    if not chunk.choices:
+        return []
+    delta = chunk.choices[0].delta
+    extras = getattr(delta, "model_extra", None) or {}
+    rc = extras.get("reasoning_content") or getattr(delta, "reasoning_content", None)
+    deltas = []
+    if rc:
+        deltas.append(("reasoning", rc))
+    if delta.content:
+        deltas.append(("content", delta.content))
+    return deltas
+
+def iter_completion_deltas(completion, deadline, timings):
+    """Yield ("reasoning", text) and ("content", text) pairs from a streamed completion,
+    stopping with DeadlineExceeded if the deadline passes mid-stream"""
     try:
-        time.sleep(max(0, 1.2 - (time.time() % 1)))
-        completion = client.chat.completions.create(
-                model="deepseek-reasoner",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                    ],
-                stream=True,
-                temperature=0,
-                timeout=httpx.Timeout(30.0, read=300.0)
-                )
-        reasoning_text = []
-        response_text = []
-        chunk_count = 0
         for chunk in completion:
-            if chunk_count % 5 == 0 and psutil.virtual_memory().percent > 75:
-                print("[WARN] Memory usage high, trimming output")
-                response_text = response_text[-1000:]
-                reasoning_text = reasoning_text[-1000:]
-            if not chunk.choices:
-                continue
-            delta = chunk.choices[0].delta
-            extras = getattr(delta, "model_extra", None) or {}
-            rc = extras.get("reasoning_content") or getattr(delta, "reasoning_content", None)
-            if rc:
-                reasoning_text.append(rc)
-            if delta.content:
-                response_text.append(delta.content)
-                chunk_count += 1
-        reasoning = "".join(reasoning_text)
-        final_response = "".join(response_text)
-        if reasoning:
-            final_response = f"<think>{reasoning}</think>\n" + final_response
+            deadline.check("DeepSeek evaluation")
+            for kind, text in chunk_deltas(chunk):
+                timings.first(f"first_{kind}_token")
+                yield kind, text
+    finally:
+        completion.response.close()
+
+def assemble_response(target, reasoning_text, response_text, timings, criterion=None):
+    """The streamed answer, once the target's token reservation is settled; the reasoning
+    stays in its buffer for store_reasoning, so it is never parsed or held as one string"""
+    final_response = response_text.getvalue()
+    reasoning_tokens = reasoning_text.size // 4
+    timings.count_tokens("reasoning", reasoning_tokens)
+    timings.count_tokens("content", approx_tokens(final_response))
+    used_tokens = reasoning_tokens + approx_tokens(final_response)
+    target.rate_limiter.settle(expected_tokens(criterion), used_tokens)
+    target.record_tokens(used_tokens)
+    return final_response
+
+def store_reasoning(trace_id, reasoning_text):
+    """Compress the reasoning trace into the trace store under the id of the result it belongs to"""
+    if trace_id is not None and reasoning_text.size:
+        reasoning_traces.put(trace_id, reasoning_text.chunks())
+
+@upstream_retry
+def evaluate_criteria(proposal, deadline, timings, criterion=None, trace_id=None):
+    """Run one evaluation, of all criteria or just `criterion`, storing its reasoning under trace_id;
+    pass deadline by keyword so upstream_retry can see it"""
+    try:
+        with deepseek_pool.lease() as target, \
+                memory_governor.admit(REQUEST_MEMORY_RESERVE) as admission, \
+                SpillBuffer(REASONING_MEMORY_BYTES, REASONING_MAX_BYTES, "reasoning") as reasoning_text, \
+                SpillBuffer(CONTENT_MEMORY_BYTES, CONTENT_MAX_BYTES, "content") as response_text:
+            timings.add("queue_wait", admission.waited)
+            completion = open_completion(target, proposal, deadline, timings, criterion)
+            for kind, text in iter_completion_deltas(completion, deadline, timings):
+                if kind == "reasoning":
+                    reasoning_text.append(text)
+                else:
+                    response_text.append(text)
+            final_response = assemble_response(target, reasoning_text, response_text, timings, criterion)
+            store_reasoning(trace_id, reasoning_text)
         print(final_response)
         return final_response
     except Exception as e:
         print(f"Failed request: {type(e).__name__} - {str(e)}")
         raise
 
-def extract_key_elements_as_variables(text: str) -> dict:
-    extracted_variables = {}
-    evaluation_end_marker = "\n--- Evaluation Details End ---"
-
-    # Split the evaluation details if the end marker is present
-    evaluation_text = text.split(evaluation_end_marker, 1)[0] if evaluation_end_marker in text else text
+def evaluation_cache_key(proposal, mode="single"):
+    if mode == "parallel":
+        return cache_key("evaluate-parallel", normalize_proposal(proposal), criterion_system_message, EVAL_MODEL)
+    return cache_key("evaluate", normalize_proposal(proposal), system_message, EVAL_MODEL)
+
+def criterion_cache_key(proposal, criterion):
+    return cache_key("evaluate-criterion", criterion, normalize_proposal(proposal), criterion_system_message, EVAL_MODEL)
+
+def research_cache_key(proposal):
+    return cache_key("research", normalize_proposal(proposal), build_research_prompt(""), HF_SPACE)
+
+def evaluation_scope(mode="single"):
+    """Near-duplicate index scope: only results from the same prompt and model are reused"""
+    if mode == "parallel":
+        return cache_key("evaluate-parallel", criterion_system_message, EVAL_MODEL)
+    return cache_key("evaluate", system_message, EVAL_MODEL)
+
+def research_scope():
+    return cache_key("research", build_research_prompt(""), HF_SPACE)
+
+def similar_result(scope, proposal):
+    """The cached result of the most similar earlier proposal and its similarity, or (None, None)"""
+    if SIMILAR_REUSE_THRESHOLD <= 0:
+        return None, None
+    for match in similar_proposals.lookup(scope, normalize_proposal(proposal), SIMILAR_REUSE_THRESHOLD):
+        value = result_cache.get(match.result_key)
+        if value is not None:
+            similar_proposals.touch(scope, match.result_key)
+            print(f"Reusing the result of a proposal {match.similarity:.0%} similar to this one")
+            return value, match.similarity
+        # The result has left the cache, so its index entry is no use any more
+        similar_proposals.discard(scope, match.result_key)
+    return None, None
+
+def store_result(scope, proposal, key, value):
+    """Cache a freshly computed result and index its proposal for near-duplicate lookups"""
+    result_cache.set(key, value)
+    similar_proposals.add(scope, normalize_proposal(proposal), key)
+
+def cached_result(key, scope, proposal, compute, refresh=False, deadline=None):
+    """The cached value for key, else a near-duplicate's, else compute()'s, stored and indexed.
+
+    Returns (value, similarity); similarity is set only when a near-duplicate's
+    result was reused. refresh skips both lookups but still stores. Waiting on
+    another request computing the same key stops at deadline.
+    """
+    if refresh:
+        value = compute()
+        store_result(scope, proposal, key, value)
+        return value, None
+    value = result_cache.get(key)
+    if value is not None:
+        return value, None
+    value, similarity = similar_result(scope, proposal)
+    if value is not None:
+        return value, similarity
+
+    def compute_and_index():
+        value = compute()
+        similar_proposals.add(scope, normalize_proposal(proposal), key)
+        return value
+
+    return result_cache.get_or_compute(key, compute_and_index, checked=True, deadline=deadline), None
+
+class PartialEvaluation(Exception):
+    """Some criteria of a parallel evaluation failed. Carries the merged text of the others and a
+    note per failure; raised rather than returned so the incomplete result is never cached"""
+
+    def __init__(self, text, failures):
+        super().__init__(f"{len(failures)} of {CRITERIA_COUNT} criteria failed")
+        self.text = text
+        self.failures = failures
+
+def checked_criterion(text, criterion):
+    """A single-criterion response, if it has that criterion's score; anything else counts as a failure"""
+    results, _ = parse_criteria_output(text)
+    if results.get(f"score_criteria{criterion}") is None:
+        raise ValueError(f"Criteria {criterion} response has no score")
+    return text
+
+def merge_criteria(outputs):
+    """Merge per-criterion outputs, each a response text or the exception its request failed with.
+    Raises PartialEvaluation if some failed, and the first failure if all did"""
+    failures = {n: output for n, output in outputs.items() if isinstance(output, BaseException)}
+    if len(failures) == len(outputs):
+        raise failures[min(failures)]
+    text = merge_criteria_outputs({n: output for n, output in outputs.items() if n not in failures})
+    if failures:
+        raise PartialEvaluation(text, [f"Criteria {n} failed: {type(e).__name__}: {str(e)}" for n, e in sorted(failures.items())])
+    return text
+
+criterion_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CRITERION_WORKERS, thread_name_prefix="criterion")
+
+def evaluate_criterion(proposal, criterion, refresh, deadline, timings):
+    """One criterion of a parallel evaluation, cached on its own so a repeat only recomputes the criteria that failed"""
+    key = criterion_cache_key(proposal, criterion)
+
+    def compute():
+        return checked_criterion(
+                evaluate_criteria(proposal, deadline=deadline, timings=timings, criterion=criterion, trace_id=key),
+                criterion
+                )
 
-    # Regular expression to match criteria scores, detailed reasoning, summaries, and improvement suggestions
-    criteria_pattern = re.compile(
-            r"The score of criteria(\d+):\s*(\d+)\s*\n+"
-            r"Detailed reasoning\1:\s*(.*?)\n+"
-            r"Summary reasoning criteria\1:\s*(.*?)\n+"
-            r"Improvement suggestion criteria\1:\s*(.*?)(?=\n+The score of criteria|\Z)",
-            re.DOTALL | re.IGNORECASE
+    if refresh:
+        value = compute()
+        result_cache.set(key, value)
+        return value
+    return result_cache.get_or_compute(key, compute, deadline=deadline)
+
+def evaluate_in_parallel(proposal, refresh, deadline, timings):
+    """Evaluate every criterion in its own concurrent request and merge the answers"""
+    children = {n: evaluate_timings() for n in range(1, CRITERIA_COUNT + 1)}
+    futures = {
+            n: criterion_executor.submit(evaluate_criterion, proposal, n, refresh, deadline, child)
+            for n, child in children.items()
+            }
+    outputs = {}
+    for n, future in futures.items():
+        try:
+            outputs[n] = future.result()
+        except Exception as e:
+            outputs[n] = e
+    for child in children.values():
+        timings.absorb(child)
+    text = merge_criteria(outputs)
+    reasoning_traces.join(
+            evaluation_cache_key(proposal, "parallel"),
+            [(f"Criteria {n}:", criterion_cache_key(proposal, n)) for n in children]
             )
-
-    for match in criteria_pattern.finditer(evaluation_text):
-        num, score, detailed_reasoning, summary, improvement = match.groups()
-        extracted_variables[f"score_criteria{num}"] = int(score)
-        extracted_variables[f"detailed_reasoning_criteria{num}"] = detailed_reasoning.strip()
-        extracted_variables[f"summary_reasoning_criteria{num}"] = summary.strip()
-        extracted_variables[f"improvement_suggestion_criteria{num}"] = improvement.strip()
-
-    # Extract the think_section and chain_of_thought separately
-    think_section_match = re.search(r"<think>(.*?)</think>", text, re.DOTALL)
-    extracted_variables["think_section"] = think_section_match.group(1).strip() if think_section_match else None
-
-    chain_of_thought_match = re.search(r"<chain_of_thought>(.*?)</chain_of_thought>", text, re.DOTALL)
-    extracted_variables["chain_of_thought"] = chain_of_thought_match.group(1).strip() if chain_of_thought_match else None
-
-    return extracted_variables
-
-def extract_think_parts(text: str) -> dict:
-    think_parts = {}
-    think_sections = ['introduction', 'criteria1', 'criteria2', 'criteria3', 'criteria4', 'criteria5', 'criteria6', 'conclusion']
-
-    # Extract the raw chain_of_thought section from the text
-    chain_of_thought_match = re.search(r"<chain_of_thought>(.*?)</chain_of_thought>", text, re.DOTALL)
-    chain_of_thought = chain_of_thought_match.group(1).strip() if chain_of_thought_match else None
-    think_parts['chain_of_thought'] = chain_of_thought
-
-    # Loop through all defined think sections and extract their content
-    for part in think_sections:
-        pattern = re.compile(rf"<{part}>(.*?)</{part}>", re.DOTALL)
-        match = pattern.search(chain_of_thought if chain_of_thought else '')
-        think_parts[part] = match.group(1).strip() if match else None
-
-    return think_parts
+    return text
+
+def cached_evaluation(proposal, refresh=False, deadline=None, timings=None, mode="single"):
+    """Evaluate the proposal once per cache entry: (final_response, similarity) as from cached_result"""
+    deadline = deadline or Deadline(EVALUATE_DEADLINE)
+    timings = timings or evaluate_timings()
+    key = evaluation_cache_key(proposal, mode)
+    if mode == "parallel":
+        compute = lambda: evaluate_in_parallel(proposal, refresh, deadline, timings)
+    else:
+        compute = lambda: evaluate_criteria(proposal, deadline=deadline, timings=timings, trace_id=key)
+    return cached_result(key, evaluation_scope(mode), proposal, compute, refresh=refresh, deadline=deadline)
+
+def reuse_info(similarity):
+    """The "reused" field of a response: set when a near-duplicate's stored result was returned"""
+    return {"similarity": similarity} if similarity is not None else None
+
+def reasoning_fields(extracted_data, reasoning_id, include_reasoning):
+    """Set reasoning_id, and think_section only when the client asked for the trace. Answers cached
+    before traces were stored apart still carry theirs inline, which is used when the store has none"""
+    extracted_data["reasoning_id"] = reasoning_id
+    inline = extracted_data.get("think_section")
+    extracted_data["think_section"] = None
+    if include_reasoning:
+        extracted_data["think_section"] = (reasoning_traces.get(reasoning_id) if reasoning_id else None) or inline
+
+def result_outcome(timings, similarity):
+    """Metrics outcome of a successful request: no upstream attempt means a cached or reused result"""
+    if timings.attempts:
+        return "ok"
+    return "reused" if similarity is not None else "cached"
+
+def evaluate_proposal(prepared, refresh=False, deadline=None, mode="single", include_reasoning=False):
+    """Evaluate a prepared proposal (or fetch from cache) and parse into the /evaluate response shape;
+    in parallel mode criteria that failed are missing, with a note in parse_errors"""
+    proposal = prepared.text
+    timings = evaluate_timings()
+    failures = []
+    try:
+        try:
+            final_response, similarity = cached_evaluation(proposal, refresh=refresh, deadline=deadline, timings=timings, mode=mode)
+        except PartialEvaluation as e:
+            final_response, similarity, failures = e.text, None, e.failures
+        with timings.stage("parse"):
+            extracted_data, parse_errors = parse_criteria_output(final_response)
+    except Exception as e:
+        timings.finish(outcome_of(e))
+        raise
+    timings.finish("partial" if failures else result_outcome(timings, similarity))
+    parse_errors = failures + parse_errors
+    if parse_errors:
+        print(f"[WARN] Malformed evaluation output: {parse_errors}")
+    extracted_data["parse_errors"] = parse_errors
+    extracted_data["reused"] = reuse_info(similarity)
+    # A reused or partial result has no trace of its own
+    reasoning_id = evaluation_cache_key(proposal, mode) if similarity is None and not failures else None
+    reasoning_fields(extracted_data, reasoning_id, include_reasoning)
+    extracted_data["proposal_tokens"] = prepared.stats
+    # Reused and partial results are not this proposal's own, so they are not kept
+    extracted_data["history_id"] = reasoning_id
+    if reasoning_id is not None:
+        history.record("evaluation", reasoning_id, proposal, extracted_data, fresh=bool(timings.attempts))
+    return extracted_data
+
+def _cache_bypassed():
+    """Clients can force a fresh upstream call with Cache-Control: no-cache"""
+    return 'no-cache' in request.headers.get('Cache-Control', '')
+
+def request_deadline(default):
+    """The request's time budget: `default` seconds, or less if the client sent X-Request-Timeout"""
+    return Deadline.from_header(request.headers.get('X-Request-Timeout'), default)
+
+def _reasoning_requested():
+    """Clients get the reasoning trace in think_section with ?reasoning=1"""
+    return request.args.get('reasoning', '').lower() in ('1', 'true', 'yes')
+
+def evaluation_mode():
+    """The requested evaluation mode (?mode=single|parallel), else EVALUATION_MODE"""
+    return request.args.get('mode', EVALUATION_MODE)
+
+def unknown_mode(mode):
+    return jsonify({"error": f"Unknown mode '{mode}', expected one of: {', '.join(EVALUATION_MODES)}"}), 400
+
+@app.errorhandler(MemoryPressure)
+def memory_pressure(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(BudgetExceeded)
+def budget_exceeded(e):
+    return jsonify({"error": f"Upstream response too large: {str(e)}"}), 502
+
+@app.errorhandler(CircuitOpen)
+def circuit_open(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(e):
+    return jsonify({"error": str(e)}), 504
 
 @app.route('/', methods=['GET'])
 def index():
     return jsonify({"status": "ok"}), 200
 
+def readiness():
+    return {
+            "evaluate": {"ready": any(target.api_key for target in deepseek_pool.targets)},
+            "research": space.status()
+            }
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    status = readiness()
+    all_ready = all(service["ready"] for service in status.values())
+    return jsonify(status), 200 if all_ready else 503
+
+@app.route('/ready/<service>', methods=['GET'])
+def ready_service(service):
+    status = readiness().get(service)
+    if status is None:
+        return jsonify({"error": f"Unknown service '{service}'"}), 404
+    return jsonify(status), 200 if status["ready"] else 503
+
+def service_stats():
+    return {
+        "cache": result_cache.stats(),
+        "similar_proposals": similar_proposals.stats(),
+        "reasoning_traces": reasoning_traces.stats(),
+        "history": history.stats(),
+        "research_artifacts": research_artifacts.stats(),
+        "tokenizer": {"encoding": token_counter.name, "error": token_counter.error},
+        "admission": admission.stats(),
+        "upstreams": deepseek_pool.stats(),
+        "memory": memory_governor.stats(),
+        "research_jobs": research_jobs.stats()
+        }
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(service_stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/breakers', methods=['GET'])
+def breakers():
+    return jsonify({"deepseek": deepseek_pool.breaker_stats(), "research": space_breaker.stats()}), 200
+
+def json_response(document, status=200):
+    """document as a JSON response, compressed if the client accepts it"""
+    body, headers = response_encoder.encode(document, request.headers.get('Accept-Encoding', ''))
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
 @app.route('/evaluate', methods=['POST'])
 def evaluate():
     data = request.json
     if 'proposal' not in data:
         return jsonify({"error": "Missing 'proposal' in request"}), 400
 
-    final_response = evaluate_criteria(data['proposal'])
-    extracted_data = extract_key_elements_as_variables(final_response)
-    think_parts = extract_think_parts(final_response)
-    extracted_data.update(think_parts)
-    return jsonify(extracted_data)
-
-
-@app.route('/research', methods=['POST'])
-def research():
-    start_time = time.time()
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return _evaluate_event_stream(prepare(data['proposal']))
+
+    mode = evaluation_mode()
+    if mode not in EVALUATION_MODES:
+        return unknown_mode(mode)
+    return json_response(evaluate_proposal(
+            prepare(data['proposal']),
+            refresh=_cache_bypassed(),
+            deadline=request_deadline(EVALUATE_DEADLINE),
+            mode=mode,
+            include_reasoning=_reasoning_requested()
+            ))
+
+@app.route('/evaluate/<reasoning_id>/reasoning', methods=['GET'])
+def evaluation_reasoning(reasoning_id):
+    """The reasoning trace behind an evaluation, by the reasoning_id in its response"""
+    data = reasoning_traces.get_compressed(reasoning_id)
+    if data is None:
+        return jsonify({"error": "Unknown or expired reasoning trace"}), 404
+    body, headers = gzip_body(data, request.headers.get('Accept-Encoding', ''))
+    return Response(body, mimetype='text/plain', headers=headers)
+
+def gzip_body(data, accept_encoding):
+    """The stored gzip bytes as they are for clients that accept gzip, else decompressed; with the headers to send"""
+    if 'gzip' in accept_encoding:
+        return data, {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+    return gzip.decompress(data), {"Vary": "Accept-Encoding"}
+
+@app.route('/evaluate/stream', methods=['POST'])
+def evaluate_stream():
     data = request.json
-
     if 'proposal' not in data:
         return jsonify({"error": "Missing 'proposal' in request"}), 400
 
-    if gradio_client is None:
-        return jsonify({"error": "Gradio client not initialized. Check server logs for details."}), 503
-
-    # Generate a unique session and message ID
-    session_id = str(uuid.uuid4())
-    message_id = str(uuid.uuid4())
+    return _evaluate_event_stream(prepare(data['proposal']))
 
+@app.route('/evaluate/batch', methods=['POST'])
+def evaluate_batch():
+    ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
     try:
-        print(f"Processing research request for proposal: {data['proposal'][:50]}...")
+        items, invalid = parse_batch_items(request.get_data(as_text=True), ndjson=ndjson, max_items=BATCH_MAX_ITEMS)
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+
+    concurrency = min(request.args.get('concurrency', BATCH_CONCURRENCY, type=int), BATCH_MAX_CONCURRENCY)
+    refresh = _cache_bypassed()
+    mode = evaluation_mode()
+    if mode not in EVALUATION_MODES:
+        return unknown_mode(mode)
+
+    def generate():
+        yield json.dumps({"type": "started", "total": len(items) + len(invalid), "concurrency": concurrency}) + "\n"
+        records = run_batch(items, lambda proposal: evaluate_proposal(prepare(proposal), refresh=refresh, mode=mode), concurrency, invalid)
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+def _sse(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Event names for the per-criterion fields reported by the parser
+CRITERIA_FIELD_EVENTS = re.compile(r"(score|detailed_reasoning|summary|improvement)\w*_criteria(\d+)$")
+
+def field_event(key, value):
+    """Map a parsed (key, value) pair to an SSE event name and payload"""
+    match = CRITERIA_FIELD_EVENTS.match(key)
+    if match:
+        return match.group(1), {"criteria": int(match.group(2)), "value": value}
+    return "section", {"section": key, "value": value}
+
+def _evaluate_event_stream(prepared):
+    """Stream reasoning/content deltas and completed criteria fields as Server-Sent Events"""
+    proposal = prepared.text
+    key = evaluation_cache_key(proposal)
+    cached, similarity = None, None
+    if not _cache_bypassed():
+        cached = result_cache.get(key)
+        if cached is None:
+            cached, similarity = similar_result(evaluation_scope(), proposal)
+    deadline = request_deadline(EVALUATE_DEADLINE)
+    # Refuse before the 200 status line is sent if DeepSeek is down or this worker has no memory to spare
+    if cached is None:
+        deepseek_pool.check()
+    admission = memory_governor.admit(REQUEST_MEMORY_RESERVE) if cached is None else None
+    timings = evaluate_timings()
+    if admission is not None:
+        timings.add("queue_wait", admission.waited)
+
+    def record(fresh):
+        """Keep the streamed result in the history, in the shape /evaluate returns"""
+        history.record("evaluation", key, proposal, {**parser.results, "parse_errors": parser.errors, "reused": None,
+                       "reasoning_id": key, "proposal_tokens": prepared.stats, "history_id": key}, fresh)
+
+    parser = CriteriaStreamParser()
+
+    def generate():
+        # Left as is if the client goes away mid-stream
+        outcome = "disconnected"
+        try:
+            if cached is not None:
+                # Replay the stored answer as field events; there are no deltas to forward
+                for key_, value in parser.feed(cached) + parser.close():
+                    yield _sse(*field_event(key_, value))
+                outcome = "cached" if similarity is None else "reused"
+                if similarity is None:
+                    record(fresh=False)
+                yield _sse("done", {"parse_errors": parser.errors, "cached": True, "reused": reuse_info(similarity),
+                                    "reasoning_id": key if similarity is None else None, "proposal_tokens": prepared.stats,
+                                    "history_id": key if similarity is None else None})
+                return
+
+            # One target serves the whole stream; upstream_retry only retries opening it
+            with deepseek_pool.lease() as target, \
+                    SpillBuffer(REASONING_MEMORY_BYTES, REASONING_MAX_BYTES, "reasoning") as reasoning_text, \
+                    SpillBuffer(CONTENT_MEMORY_BYTES, CONTENT_MAX_BYTES, "content") as response_text:
+                completion = upstream_retry(open_completion)(target, proposal, deadline=deadline, timings=timings)
+                for kind, text in iter_completion_deltas(completion, deadline, timings):
+                    yield _sse(kind, {"text": text})
+                    if kind != "content":
+                        reasoning_text.append(text)
+                        continue
+                    response_text.append(text)
+                    for key_, value in parser.feed(text):
+                        yield _sse(*field_event(key_, value))
+                for key_, value in parser.close():
+                    yield _sse(*field_event(key_, value))
+                store_result(evaluation_scope(), proposal, key, assemble_response(target, reasoning_text, response_text, timings))
+                store_reasoning(key, reasoning_text)
+            record(fresh=True)
+            outcome = "ok"
+            yield _sse("done", {"parse_errors": parser.errors, "cached": False, "reused": None, "reasoning_id": key,
+                                "proposal_tokens": prepared.stats, "history_id": key})
+        except Exception as e:
+            print(f"Failed streaming request: {type(e).__name__} - {str(e)}")
+            outcome = outcome_of(e)
+            yield _sse("error", {"message": f"{type(e).__name__}: {str(e)}"})
+        finally:
+            timings.finish(outcome)
+            if admission is not None:
+                admission.release()
+
+    response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+    if admission is not None:
+        # Also release when the client disconnects before the stream starts
+        response.call_on_close(admission.release)
+    return response
 
-        # First log the user message
-        prompt = f"""
-        There is a startup idea: "{data['proposal']}".
+
+class ResearchStepError(RuntimeError):
+    """A call to the deep-research Space failed; the message names the step"""
+
+class SpaceUnavailable(ResearchStepError):
+    """The Space is needed for a result that is not cached, but its client is not connected"""
+
+@app.errorhandler(SpaceUnavailable)
+def space_unavailable(e):
+    return jsonify({"error": "Gradio client not initialized. Check server logs for details.", "research": space.status()}), 503
+
+def build_research_prompt(proposal):
+    return f"""
+        There is a startup idea: "{proposal}".
 
         Do you think this startup idea is highly novel? Please research this idea from three perspectives and generate a novelty score:
 
@@ -377,68 +1091,525 @@ def research():
         Your final answer should be as detailed and professional as possible, including a novelty score on a scale of 100 and a comprehensive report of over 5,000 words. The report should contain sections for the overview, problem uniqueness, existing solutions, differentiation, conclusion, and sources and references, with all sources displayed as hyperlinks. Ensure that the final content includes proper in-text citations with hyperlinks, making each citation a clickable link.
         """
 
-        print("Logging user message...")
-        try:
-            log_result = gradio_client.predict(
-                    text_input=prompt,
-                    api_name="/log_user_message"
-                    )
-            print(f"Log result completed: {len(log_result) if isinstance(log_result, str) else 'Not a string'} characters")
-        except Exception as e:
-            print(f"Error during message logging: {str(e)}")
-            return jsonify({"error": f"Error logging message: {str(e)}"}), 500
+@contextlib.contextmanager
+def space_api_checked(api_name, submitting=False):
+    """Reconnect to the Space, dropping its cached config, if a call fails because the Space's API
+    changed under the client (e.g. it was redeployed); the failure itself is passed on. Wrap only
+    gradio_client's own calls, submitting=True around Client.submit()"""
+    try:
+        yield
+    except Exception as e:
+        if is_api_mismatch(e, submitting):
+            space.reset(f"{api_name} failed with {type(e).__name__}: {str(e)}")
+        raise
 
-        # Then interact with agent using the logged message
-        print("Interacting with agent...")
+def follow_job(job, deadline, on_output=None, check_cancelled=None):
+    """Wait for a Space job, passing on_output its latest output whenever a new one has arrived;
+    returns its result. Raises TimeoutError when the deadline passes. check_cancelled is called
+    at every poll; if it raises, the job is cancelled and the exception passed on"""
+    seen = 0
+    while True:
         try:
-            result = gradio_client.predict(
-                    messages=[{
-                        "role": "user",
-                        "content": log_result,
-                        "metadata": {
-                            "id": message_id,
-                            "parent_id": session_id
-                            }
-                        }],
-                    api_name="/interact_with_agent_1"
-                    )
-            print(f"Agent interaction completed: {type(result)}")
-        except Exception as e:
-            print(f"Error during agent interaction: {str(e)}")
-            return jsonify({"error": f"Error during agent interaction: {str(e)}"}), 500
+            result = job.result(timeout=deadline.timeout(SPACE_OUTPUT_POLL))
+            done = True
+        except concurrent.futures.TimeoutError:
+            if deadline.remaining() <= 0:
+                raise
+            done = False
+        if not done and check_cancelled is not None:
+            try:
+                check_cancelled()
+            except Exception:
+                job.cancel()
+                raise
+        outputs = job.outputs()
+        if on_output is not None and len(outputs) > seen:
+            seen = len(outputs)
+            on_output(outputs[-1])
+        if done:
+            return result
+
+def call_space(gradio_client, deadline, timings, on_output=None, check_cancelled=None, **kwargs):
+    """Run one Space API call through its breaker; the job is cancelled if the deadline passes.
+    on_output, if given, is passed the job's intermediate outputs as they arrive, and
+    check_cancelled is polled while it runs as in follow_job"""
+    with timings.stage(kwargs["api_name"].lstrip("/")), space_breaker.call():
+        with space_api_checked(kwargs["api_name"], submitting=True):
+            job = gradio_client.submit(**kwargs)
+        try:
+            with space_api_checked(kwargs["api_name"]):
+                if on_output is not None or check_cancelled is not None:
+                    return follow_job(job, deadline, on_output, check_cancelled)
+                return job.result(timeout=deadline.remaining())
+        except concurrent.futures.TimeoutError:
+            job.cancel()
+            raise DeadlineExceeded(f"Research step {kwargs['api_name']} exceeded its {deadline.seconds:g}s deadline")
+
+def run_research_agent(proposal, on_stage=None, deadline=None, timings=None, on_messages=None, check_cancelled=None):
+    """Log the research prompt on the Space, then run the agent on it and return its messages.
+
+    on_stage, if given, is called with the name of each Space API before it is called;
+    on_messages with the agent's messages so far each time they change while it runs;
+    check_cancelled while either call runs, stopping the run and the Space job if it raises.
+    """
+    deadline = deadline or Deadline(RESEARCH_DEADLINE)
+    timings = timings or research_timings()
+    timings.attempts += 1
+    # Generate a unique session and message ID
+    session_id = str(uuid.uuid4())
+    message_id = str(uuid.uuid4())
+
+    space_breaker.check()
+    gradio_client = space.get(deadline.timeout(SPACE_READY_TIMEOUT))
+    if gradio_client is None:
+        raise SpaceUnavailable(f"Gradio client not initialized: {space.error or space.state}")
+
+    # First log the user message
+    prompt = build_research_prompt(proposal)
+    if on_stage:
+        on_stage("log_user_message")
+    print("Logging user message...")
+    try:
+        log_result = call_space(
+                gradio_client,
+                deadline,
+                timings,
+                check_cancelled=check_cancelled,
+                text_input=prompt,
+                api_name="/log_user_message"
+                )
+        print(f"Log result completed: {len(log_result) if isinstance(log_result, str) else 'Not a string'} characters")
+    except (CircuitOpen, DeadlineExceeded, JobCancelled):
+        raise
+    except Exception as e:
+        print(f"Error during message logging: {str(e)}")
+        raise ResearchStepError(f"Error logging message: {str(e)}") from e
+
+    # Then interact with agent using the logged message
+    if on_stage:
+        on_stage("interact_with_agent")
+    print("Interacting with agent...")
+    try:
+        result = call_space(
+                gradio_client,
+                deadline,
+                timings,
+                on_output=on_messages,
+                check_cancelled=check_cancelled,
+                messages=[{
+                    "role": "user",
+                    "content": log_result,
+                    "metadata": {
+                        "id": message_id,
+                        "parent_id": session_id
+                        }
+                    }],
+                api_name="/interact_with_agent_1"
+                )
+        print(f"Agent interaction completed: {type(result)}")
+    except (CircuitOpen, DeadlineExceeded, JobCancelled):
+        raise
+    except Exception as e:
+        print(f"Error during agent interaction: {str(e)}")
+        raise ResearchStepError(f"Error during agent interaction: {str(e)}") from e
+    return result
+
+def parse_research_events(result, timings, parser):
+    """Finish parsing the agent messages: a parser that was fed them while the agent ran only
+    reads the rest. Returns the events of what it read"""
+    with timings.stage("parse_agent_response"):
+        return parser.update(result, final=True)
+
+def parse_research(result, timings, parser=None):
+    """The parsed agent messages, as parse_agent_response returns them"""
+    parser = parser or AgentResponseParser()
+    parse_research_events(result, timings, parser)
+    return parser.result
+
+def build_research_response(result, execution_time, timings=None, similarity=None, parser=None):
+    """Parse the agent messages and assemble the /research response"""
+    timings = timings or research_timings()
+    # Parse the result using the response parser
+    parsed_result = parse_research(result, timings, parser)
+
+    # Format response with both raw and parsed results
+    return {
+            "execution_time": f"{execution_time:.2f} seconds",
+            "raw_result": result,
+            "parsed_result": parsed_result,
+            "reused": reuse_info(similarity)
+            }
+
+def store_artifacts(response, request_id=None):
+    """Give a finished /research response its request_id (a new one unless given) and report_url,
+    and queue its report and a copy of it for the artifact store"""
+    request_id = request_id or uuid.uuid4().hex
+    response["request_id"] = request_id
+    response["report_url"] = f"/research/reports/{request_id}"
+    research_artifacts.put(request_id, response["parsed_result"], dict(response))
+
+def record_research(proposal, parsed_result, timings, similarity):
+    """Keep a research result in the history under its cache key, which is returned as its history_id;
+    a reused result is not this proposal's own and is not kept"""
+    if similarity is not None:
+        return None
+    key = research_cache_key(proposal)
+    history.record("research", key, proposal, parsed_result, fresh=bool(timings.attempts))
+    return key
+
+def cached_research(proposal, refresh=False, deadline=None, timings=None, on_stage=None, on_messages=None, check_cancelled=None):
+    """Research the proposal once per cache entry: (result, similarity) as from cached_result.
+    on_messages only sees the agent's messages, and check_cancelled is only polled, if this call runs it"""
+    deadline = deadline or Deadline(RESEARCH_DEADLINE)
+    return cached_result(
+            research_cache_key(proposal),
+            research_scope(),
+            proposal,
+            lambda: run_research_agent(proposal, on_stage=on_stage, deadline=deadline, timings=timings, on_messages=on_messages,
+                                       check_cancelled=check_cancelled),
+            refresh=refresh,
+            deadline=deadline
+            )
+
+def research_view(response, args):
+    """The parts of a /research response a request asked for: the ?fields= paths (e.g.
+    parsed_result.final_answer,search_links), else all but RESEARCH_OMITTED_FIELDS"""
+    fields = parse_fields(args.get('fields'))
+    if fields is None:
+        return {key: value for key, value in response.items() if key not in RESEARCH_OMITTED_FIELDS}
+    return project(response, fields, fallback="parsed_result")
+
+@app.route('/research', methods=['POST'])
+def research():
+    """Research a proposal. As Server-Sent Events, the agent's steps and the links it finds are
+    sent as they happen, then the final answer; otherwise one document holds the whole run"""
+    start_time = time.time()
+    data = request.json
+
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+
+    # Cached and reused results are served while the Space is down; only a miss waits for it
+    deadline = request_deadline(RESEARCH_DEADLINE)
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return _research_event_stream(prepare(data['proposal']), _cache_bypassed(), deadline, start_time)
+
+    timings = research_timings()
+    outcome = "error"
+    try:
+        print(f"Processing research request for proposal: {data['proposal'][:50]}...")
+        prepared = prepare(data['proposal'])
+
+        # Parsed as the agent's messages arrive, so only the last is left once it finishes
+        parser = AgentResponseParser()
+        result, similarity = cached_research(prepared.text, refresh=_cache_bypassed(), deadline=deadline, timings=timings,
+                                             on_messages=parser.update)
 
         # Calculate execution time
         end_time = time.time()
         execution_time = end_time - start_time
 
-        # Parse the result using the response parser
-        parsed_result = parse_agent_response(result)
-
-        # Save the parsed result as markdown (optional)
-        report_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_report.md")
-        save_as_markdown(parsed_result, report_path)
-        print(f"Analysis report saved to: {report_path}")
+        response = build_research_response(result, execution_time, timings, similarity, parser)
+        response["proposal_tokens"] = prepared.stats
+        response["history_id"] = record_research(prepared.text, response["parsed_result"], timings, similarity)
+        store_artifacts(response)
+        outcome = result_outcome(timings, similarity)
+        return json_response(research_view(response, request.args))
 
-        # Format response with both raw and parsed results
-        response = {
-                "execution_time": f"{execution_time:.2f} seconds",
-                "raw_result": result,
-                "parsed_result": parsed_result
-                }
+    except (CircuitOpen, DeadlineExceeded, SpaceUnavailable) as e:
+        # Answered by their error handlers with 503 / 504
+        outcome = outcome_of(e)
+        raise
+    except JobCancelled as e:
+        # The research job this request was coalesced onto was cancelled, as a cancelled job's result is
+        outcome = outcome_of(e)
+        return jsonify({"error": "The research this request was waiting on was cancelled"}), 409
+    except ResearchStepError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        print(f"Unhandled error in research route: {str(e)}")
+        return jsonify({"error": f"Error during research: {str(e)}"}), 500
+    finally:
+        timings.finish(outcome)
+
+def _research_event_stream(prepared, refresh, deadline, start_time):
+    """Run the research in the pipeline pool and stream its progress as Server-Sent Events: stage,
+    then step, detail and links events as the agent's messages arrive, final_answer and done"""
+    timings = research_timings()
+    parser = AgentResponseParser()
+    events = queue.Queue()
+
+    def on_messages(messages):
+        for event in parser.update(messages):
+            events.put(event)
+
+    future = pipeline_executor.submit(
+            cached_research,
+            prepared.text,
+            refresh=refresh,
+            deadline=deadline,
+            timings=timings,
+            on_stage=lambda stage: events.put(("stage", {"stage": stage})),
+            on_messages=on_messages
+            )
+    future.add_done_callback(lambda _: events.put(None))
 
-        # Save result to file for debugging
+    def generate():
+        # Left as is if the client goes away; the run still finishes and is cached
+        outcome = "disconnected"
         try:
-            with open('last_research_result.json', 'w', encoding='utf-8') as f:
-                json.dump(response, f, ensure_ascii=False, indent=2)
-            print("Saved result to last_research_result.json")
+            while (event := events.get()) is not None:
+                yield _sse(*event)
+            result, similarity = future.result()
+            # A cached or reused result arrives whole, a fresh one with only its last message unread
+            for event in parse_research_events(result, timings, parser):
+                yield _sse(*event)
+            outcome = result_outcome(timings, similarity)
+            document = {"execution_time": f"{time.time() - start_time:.2f} seconds", "cached": not timings.attempts,
+                        "reused": reuse_info(similarity), "proposal_tokens": prepared.stats,
+                        "history_id": record_research(prepared.text, parser.result, timings, similarity),
+                        "parsed_result": parser.result}
+            store_artifacts(document)
+            # The parsed result went out as events already
+            yield _sse("done", {key: value for key, value in document.items() if key != "parsed_result"})
         except Exception as e:
-            print(f"Error saving result: {str(e)}")
+            print(f"Failed research stream: {type(e).__name__} - {str(e)}")
+            outcome = outcome_of(e)
+            yield _sse("error", {"message": f"{type(e).__name__}: {str(e)}"})
+        finally:
+            timings.finish(outcome)
 
-        return jsonify(response)
+    return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
+def run_research_job(payload, job):
+    """JobQueue runner: the /research pipeline with progress stages and cancellation points"""
+    start_time = time.time()
+
+    proposal = payload['proposal']
+    print(f"Processing research job {job.id} for proposal: {proposal[:50]}...")
+    timings = research_timings()
+    try:
+        prepared = prepare(proposal)
+        parser = AgentResponseParser()
+        result, similarity = cached_research(prepared.text, deadline=Deadline(RESEARCH_JOB_DEADLINE), timings=timings,
+                                             on_stage=job.progress, on_messages=parser.update, check_cancelled=job.check)
+        job.progress("parsing")
+        response = build_research_response(result, time.time() - start_time, timings, similarity, parser)
+        response["proposal_tokens"] = prepared.stats
+        response["history_id"] = record_research(prepared.text, response["parsed_result"], timings, similarity)
+        store_artifacts(response, job.id)
     except Exception as e:
-        print(f"Unhandled error in research route: {str(e)}")
-        return jsonify({"error": f"Error during research: {str(e)}"}), 500
+        timings.finish(outcome_of(e), retries=job.attempt - 1)
+        raise
+    # A job's retries are the times it was requeued after its worker died
+    timings.finish(result_outcome(timings, similarity), retries=job.attempt - 1)
+    return response
+
+# Background research jobs; state lives on disk so any worker can answer status requests
+research_jobs = JobQueue(
+        JobStore(os.getenv("RESEARCH_JOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs"))),
+        run_research_job,
+        max_workers=int(os.getenv("RESEARCH_JOB_WORKERS", 2)),
+        max_queued=int(os.getenv("RESEARCH_JOB_QUEUE", 50))
+        )
+research_jobs.recover()
+
+@app.route('/research/jobs', methods=['POST'])
+def submit_research_job():
+    data = request.json
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+
+    space_breaker.check()
+    if space.get(SPACE_READY_TIMEOUT) is None:
+        return jsonify({"error": "Gradio client not initialized. Check server logs for details.", "research": space.status()}), 503
+
+    try:
+        job = research_jobs.submit({"proposal": data['proposal']})
+    except QueueFull as e:
+        return jsonify({"error": f"Research queue is full: {str(e)}"}), 429
+
+    response = public_view(job)
+    response["status_url"] = f"/research/jobs/{job['id']}"
+    response["result_url"] = f"/research/jobs/{job['id']}/result"
+    return jsonify(response), 202, {"Location": response["status_url"]}
+
+@app.route('/research/jobs/<job_id>', methods=['GET'])
+def research_job_status(job_id):
+    job = research_jobs.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(public_view(job)), 200
+
+@app.route('/research/jobs/<job_id>/result', methods=['GET'])
+def research_job_result(job_id):
+    job = research_jobs.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == SUCCEEDED:
+        result = research_jobs.store.get_result(job_id)
+        if result is None:
+            # Pruned, or lost, after the job finished
+            return jsonify({**public_view(job), "error": "The job's result is no longer available"}), 410
+        return json_response(research_view(result, request.args))
+    if job["status"] == FAILED:
+        return jsonify({**public_view(job), "error": job["error"]}), 500
+    if job["status"] == CANCELLED:
+        return jsonify(public_view(job)), 409
+    # Still queued or running
+    return jsonify(public_view(job)), 202
+
+@app.route('/research/jobs/<job_id>', methods=['DELETE'])
+def cancel_research_job(job_id):
+    job = research_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(public_view(job)), 200
+
+@app.route('/research/reports/<request_id>', methods=['GET'])
+def research_report(request_id):
+    """The Markdown report of a /research call or job, by the request_id in its response, rendered as it is sent"""
+    report = research_artifacts.get_report(request_id)
+    if report is None:
+        return jsonify({"error": "Unknown or expired report"}), 404
+    return Response(render_markdown(report), mimetype='text/markdown')
+
+@app.route('/research/reports/<request_id>/response', methods=['GET'])
+def research_report_response(request_id):
+    """The whole response of a /research call or job, raw_result included, as it was stored"""
+    data = research_artifacts.get_response(request_id)
+    if data is None:
+        return jsonify({"error": "Unknown or expired report"}), 404
+    body, headers = gzip_body(data, request.headers.get('Accept-Encoding', ''))
+    return Response(body, mimetype='application/json', headers=headers)
+
+def research_summary(result, timings, parser=None):
+    """The parsed research result with its novelty score, as /pipeline returns it"""
+    parsed_result = parse_research(result, timings, parser)
+    return {"novelty_score": extract_novelty_score(parsed_result["final_answer"]), **parsed_result}
+
+def research_document(prepared, refresh=False, deadline=None):
+    """The research branch of /pipeline: cached research of a prepared proposal, parsed, without the raw messages"""
+    timings = research_timings()
+    try:
+        parser = AgentResponseParser()
+        result, similarity = cached_research(prepared.text, refresh=refresh, deadline=deadline, timings=timings,
+                                             on_messages=parser.update)
+        document = research_summary(result, timings, parser)
+    except Exception as e:
+        timings.finish(outcome_of(e))
+        raise
+    timings.finish(result_outcome(timings, similarity))
+    document["reused"] = reuse_info(similarity)
+    document["proposal_tokens"] = prepared.stats
+    document["history_id"] = record_research(prepared.text, document, timings, similarity)
+    return document
+
+pipeline_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+
+def start_pipeline(proposal, refresh, mode, evaluate_deadline, research_deadline):
+    """Start evaluating and researching the proposal side by side; returns {branch: future}"""
+    prepared = prepare(proposal)
+    return {
+            "evaluation": pipeline_executor.submit(evaluate_proposal, prepared, refresh, evaluate_deadline, mode),
+            "research": pipeline_executor.submit(research_document, prepared, refresh, research_deadline)
+            }
+
+def pipeline_results(branches):
+    """Yield (branch, document, error) for each branch as it finishes"""
+    names = {future: name for name, future in branches.items()}
+    for future in concurrent.futures.as_completed(names):
+        try:
+            yield names[future], future.result(), None
+        except Exception as e:
+            print(f"Pipeline {names[future]} failed: {type(e).__name__} - {str(e)}")
+            yield names[future], None, f"{type(e).__name__}: {str(e)}"
+
+@app.route('/pipeline', methods=['POST'])
+def pipeline():
+    """Evaluate and research a proposal concurrently. As Server-Sent Events, each branch's
+    document is sent as it finishes; otherwise one document holds both"""
+    start_time = time.time()
+    data = request.json
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+    mode = evaluation_mode()
+    if mode not in EVALUATION_MODES:
+        return unknown_mode(mode)
+
+    branches = start_pipeline(
+            data['proposal'],
+            _cache_bypassed(),
+            mode,
+            request_deadline(EVALUATE_DEADLINE),
+            request_deadline(RESEARCH_DEADLINE)
+            )
+
+    if request.accept_mimetypes.best == 'text/event-stream':
+        def generate():
+            errors = {}
+            for name, document, error in pipeline_results(branches):
+                if error is None:
+                    yield _sse(name, document)
+                else:
+                    errors[name] = error
+                    yield _sse("error", {"branch": name, "message": error})
+            yield _sse("done", {"errors": errors, "execution_time": f"{time.time() - start_time:.2f} seconds"})
+
+        return Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    response = {"evaluation": None, "research": None, "errors": {}}
+    for name, document, error in pipeline_results(branches):
+        response[name] = document
+        if error is not None:
+            response["errors"][name] = error
+    response["execution_time"] = f"{time.time() - start_time:.2f} seconds"
+    return jsonify(response), 502 if len(response["errors"]) == len(branches) else 200
+
+def history_params(args):
+    """(kind, before, limit) of a history listing from the query string; kind None means all kinds.
+    Raises ValueError for an unknown kind"""
+    kind = args.get('kind')
+    if kind is not None and kind not in HISTORY_KINDS:
+        raise ValueError(f"Unknown kind '{kind}', expected one of: {', '.join(HISTORY_KINDS)}")
+    limit = max(1, min(args.get('limit', HISTORY_PAGE_SIZE, type=int), HISTORY_MAX_PAGE_SIZE))
+    return kind, args.get('before', type=int), limit
+
+@app.route('/history', methods=['GET'])
+def history_results():
+    """Stored results, newest first; pass `next` back as ?before= for the following page"""
+    try:
+        kind, before, limit = history_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    results, next_page = history.recent(kind, before, limit)
+    return jsonify({"results": results, "next": next_page}), 200
+
+@app.route('/history/search', methods=['GET'])
+def search_history():
+    """Stored results whose proposal, reasoning or report match ?q= (FTS5 query syntax), newest first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing 'q' in request"}), 400
+    try:
+        kind, before, limit = history_params(request.args)
+        results, next_page = history.search(query, kind, before, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": results, "next": next_page}), 200
+
+@app.route('/history/scores', methods=['GET'])
+def history_scores():
+    """How many stored results got each score, per criterion and for novelty"""
+    return jsonify(history.score_distribution()), 200
+
+@app.route('/history/<result_id>', methods=['GET'])
+def history_result(result_id):
+    """A stored result by the history_id in its response"""
+    result = history.get(result_id)
+    if result is None:
+        return jsonify({"error": "Unknown result"}), 404
+    return jsonify(result), 200
 
 def test_hf_connection():
     """Test the Hugging Face connection and print diagnostic information"""
@@ -469,8 +1640,8 @@ def test_hf_connection():
         print(f"Error testing HF connection: {str(e)}")
 
 if __name__ == "__main__":
-    # Test the Hugging Face connection before starting the server
-    test_hf_connection()
+    # Test the Hugging Face connection in the background so the server binds immediately
+    threading.Thread(target=test_hf_connection, daemon=True).start()
 
     port = int(os.getenv("PORT", 10000))
     print(f"Starting server on port {port}...")
@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from response_encoding import dumps
+from response_parser import prepare_report
+from result_cache import PruneSchedule, atomic_write, prune_directory, remove_file
+
+# Artifacts are stored under the request id of the /research call (or job) that produced them
+ARTIFACT_ID = re.compile(r"[0-9a-f]{32}")
+
+class ArtifactStore:
+    """The report and response of each /research call, gzip-compressed in a directory shared by all workers.
+
+    put() only queues them; a background thread per process prepares the
+    report (steps deduplicated, links cleaned) once, compresses both and
+    writes them, dropping artifacts rather than block when max_queued are
+    waiting. Artifacts expire ttl seconds after they are written, and the
+    oldest are dropped beyond max_bytes on disk.
+    """
+
+    def __init__(self, directory, ttl=3 * 24 * 3600, max_bytes=256 * 1024 * 1024, max_queued=1000, compresslevel=6):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self._queue = queue.Queue(max_queued)
+        self._lock = threading.Lock()
+        self._writer_pid = None
+        self._prune_schedule = PruneSchedule()
+        self._counters = {"queued": 0, "dropped": 0, "stores": 0, "bytes_stored": 0, "evictions": 0, "errors": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, artifact_id, parsed_result, response):
+        """Queue the artifacts of one call: its parsed result, rendered on request as the report, and
+        its whole response. Neither may be changed afterwards. Never blocks"""
+        self._start_writer()
+        try:
+            self._queue.put_nowait((artifact_id, parsed_result, response))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("queued")
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written; False on timeout"""
+        self._start_writer()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def get_report(self, artifact_id):
+        """The prepared report, for render_markdown, or None"""
+        data = self._read(artifact_id, "report")
+        return json.loads(gzip.decompress(data)) if data is not None else None
+
+    def get_response(self, artifact_id):
+        """The response as stored (gzip bytes of its JSON), e.g. to send with Content-Encoding: gzip, or None"""
+        return self._read(artifact_id, "response")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["waiting"] = self._queue.qsize()
+        return stats
+
+    def _path(self, artifact_id, kind):
+        return os.path.join(self.directory, artifact_id[:2], f"{artifact_id}.{kind}.json.gz")
+
+    def _read(self, artifact_id, kind):
+        if not ARTIFACT_ID.fullmatch(artifact_id or ""):
+            return None
+        path = self._path(artifact_id, kind)
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                self._remove(path)
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _start_writer(self):
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True, name="artifact-writer").start()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if isinstance(entry, threading.Event):
+                entry.set()
+                continue
+            artifact_id, parsed_result, response = entry
+            try:
+                self._write(artifact_id, "response", response)
+                self._write(artifact_id, "report", prepare_report(parsed_result))
+                if self._prune_schedule.due():
+                    # Oldest first: artifacts are not touched when read
+                    self._count("evictions", prune_directory(self.directory, self.ttl, self.max_bytes, '.gz'))
+            except Exception as e:
+                # Skip just this entry: an exception escaping here would end the writer and leave flush() waiting
+                print(f"[WARN] Failed to store research artifacts {artifact_id[:12]}: {type(e).__name__} - {str(e)}")
+                self._count("errors")
+
+    def _write(self, artifact_id, kind, document):
+        path = self._path(artifact_id, kind)
+        with atomic_write(path) as f, gzip.GzipFile(fileobj=f, mode='wb', compresslevel=self.compresslevel, mtime=0) as gz:
+            gz.write(dumps(document))
+        with self._lock:
+            self._counters["stores"] += 1
+            self._counters["bytes_stored"] += os.path.getsize(path)
+
+    def _remove(self, path):
+        if remove_file(path):
+            self._count("evictions")
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
@@ -0,0 +1,810 @@
+"""Async serving mode: the routes of app.py on Quart.
+
+Each in-flight DeepSeek stream or Space job is a coroutine rather than a worker
+thread, so one worker holds hundreds of long-lived upstream calls. Prompts,
+caching, rate limiting, memory budgets and response shapes are shared with the
+Flask app in app.py.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 10000
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+import uuid
+
+import httpx
+from openai import AsyncOpenAI
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+
+import app as common
+from admission import ASGIAdmission
+from batch import BatchError, parse_batch_items, run_batch_async
+from criteria_parser import CriteriaStreamParser
+from jobs import CANCELLED, FAILED, SUCCEEDED, QueueFull, public_view
+from memory_budget import BudgetExceeded, MemoryPressure, SpillBuffer
+from resilience import CircuitOpen, Deadline, DeadlineExceeded
+from metrics import evaluate_timings, research_timings, outcome_of, render as render_metrics
+from response_parser import AgentResponseParser, render_markdown
+
+app = cors(Quart(__name__))
+app.asgi_app = ASGIAdmission(app.asgi_app, common.admission, common.request_lane)
+
+# Connection pool for concurrent DeepSeek streams held by this worker, per upstream target
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 500))
+
+# Computations in flight in this worker, so concurrent identical requests share one upstream call
+_in_flight = {}
+
+def _observe_response(limiter):
+    async def hook(response):
+        # A 429 or an exhausted budget writes the shared state file, under its file lock
+        await asyncio.to_thread(limiter.observe_response, response)
+    return hook
+
+@app.before_serving
+async def open_clients():
+    """One AsyncOpenAI client per upstream target, bound to this worker's event loop"""
+    for target in common.deepseek_pool.targets:
+        target.async_client = AsyncOpenAI(
+                base_url=target.base_url,
+                api_key=target.api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    timeout=300.0,
+                    transport=httpx.AsyncHTTPTransport(
+                        limits=httpx.Limits(max_keepalive_connections=ASYNC_MAX_CONNECTIONS, max_connections=ASYNC_MAX_CONNECTIONS)
+                        ),
+                    event_hooks={"response": [_observe_response(target.rate_limiter)]}
+                    )
+                )
+
+@app.after_serving
+async def close_clients():
+    for target in common.deepseek_pool.targets:
+        await target.async_client.close()
+
+async def open_completion(target, proposal, deadline, timings, criterion=None):
+    """open_completion from app.py on the target's AsyncOpenAI client"""
+    timings.attempts += 1
+    kwargs, tokens = common.completion_request(proposal, criterion)
+    timings.add("rate_limit_wait", await target.rate_limiter.acquire_async(tokens, deadline))
+    deadline.check("DeepSeek evaluation")
+    timings.begin_attempt()
+    return await target.async_client.chat.completions.create(**kwargs, timeout=common.attempt_timeout(deadline))
+
+async def iter_completion_deltas(completion, deadline, timings):
+    """iter_completion_deltas from app.py for an async stream; iterate it under
+    contextlib.aclosing so the response is closed when the caller stops early"""
+    try:
+        async for chunk in completion:
+            deadline.check("DeepSeek evaluation")
+            for kind, text in common.chunk_deltas(chunk):
+                timings.first(f"first_{kind}_token")
+                yield kind, text
+    finally:
+        await completion.response.aclose()
+
+@common.upstream_retry
+async def evaluate_criteria(proposal, deadline, timings, criterion=None, trace_id=None):
+    """Run one evaluation, of all criteria or just `criterion`, storing its reasoning under trace_id;
+    pass deadline by keyword so upstream_retry can see it"""
+    try:
+        with common.deepseek_pool.lease() as target, \
+                await common.memory_governor.admit_async(common.REQUEST_MEMORY_RESERVE) as admission, \
+                SpillBuffer(common.REASONING_MEMORY_BYTES, common.REASONING_MAX_BYTES, "reasoning") as reasoning_text, \
+                SpillBuffer(common.CONTENT_MEMORY_BYTES, common.CONTENT_MAX_BYTES, "content") as response_text:
+            timings.add("queue_wait", admission.waited)
+            completion = await open_completion(target, proposal, deadline, timings, criterion)
+            async with contextlib.aclosing(iter_completion_deltas(completion, deadline, timings)) as deltas:
+                async for kind, text in deltas:
+                    if kind == "reasoning":
+                        reasoning_text.append(text)
+                    else:
+                        response_text.append(text)
+            # Settling the token reservation locks the rate limiter's state file
+            final_response = await asyncio.to_thread(common.assemble_response, target, reasoning_text, response_text, timings, criterion)
+            await asyncio.to_thread(common.store_reasoning, trace_id, reasoning_text)
+            return final_response
+    except Exception as e:
+        print(f"Failed request: {type(e).__name__} - {str(e)}")
+        raise
+
+async def evaluate_criterion(proposal, criterion, refresh, deadline, timings):
+    """evaluate_criterion from app.py: one criterion of a parallel evaluation, cached on its own"""
+    key = common.criterion_cache_key(proposal, criterion)
+    if not refresh:
+        value = await asyncio.to_thread(common.result_cache.get, key)
+        if value is not None:
+            return value
+    value = common.checked_criterion(
+            await evaluate_criteria(proposal, deadline=deadline, timings=timings, criterion=criterion, trace_id=key),
+            criterion
+            )
+    await asyncio.to_thread(common.result_cache.set, key, value)
+    return value
+
+async def evaluate_in_parallel(proposal, refresh, deadline, timings):
+    """Evaluate every criterion in its own concurrent request and merge the answers"""
+    children = {n: evaluate_timings() for n in range(1, common.CRITERIA_COUNT + 1)}
+    results = await asyncio.gather(
+            *(evaluate_criterion(proposal, n, refresh, deadline, child) for n, child in children.items()),
+            return_exceptions=True
+            )
+    for child in children.values():
+        timings.absorb(child)
+    text = common.merge_criteria(dict(zip(children, results)))
+    await asyncio.to_thread(
+            common.reasoning_traces.join,
+            common.evaluation_cache_key(proposal, "parallel"),
+            [(f"Criteria {n}:", common.criterion_cache_key(proposal, n)) for n in children]
+            )
+    return text
+
+class _Shared:
+    """A computation in flight and the number of requests waiting on it"""
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+async def cached(key, scope, proposal, compute, refresh=False, deadline=None):
+    """Async counterpart of cached_result in app.py, (value, similarity); coalesces within this worker only"""
+    if not refresh:
+        value = await asyncio.to_thread(common.result_cache.get, key)
+        if value is not None:
+            return value, None
+        if key in _in_flight:
+            return await _join(_in_flight[key], deadline), None
+        value, similarity = await asyncio.to_thread(common.similar_result, scope, proposal)
+        if value is not None:
+            return value, similarity
+
+    async def compute_and_store():
+        value = await compute()
+        await asyncio.to_thread(common.store_result, scope, proposal, key, value)
+        return value
+
+    shared = _in_flight[key] = _Shared(asyncio.ensure_future(compute_and_store()))
+    shared.task.add_done_callback(lambda _: _in_flight.pop(key) if _in_flight.get(key) is shared else None)
+    # The computation is bounded by this request's own deadline
+    return await _join(shared, None), None
+
+async def _join(shared, deadline):
+    """Wait for a shared computation until deadline. It runs as its own task, so a request that is
+    cancelled (e.g. its client left) does not cancel it for the others; once none are left it stops"""
+    shared.waiters += 1
+    try:
+        return await asyncio.wait_for(asyncio.shield(shared.task), deadline.remaining() if deadline else None)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Waiting for a coalesced request exceeded its {deadline.seconds:g}s deadline")
+    finally:
+        shared.waiters -= 1
+        if not shared.waiters:
+            shared.task.cancel()
+
+def _cache_bypassed():
+    return 'no-cache' in request.headers.get('Cache-Control', '')
+
+def request_deadline(default):
+    return Deadline.from_header(request.headers.get('X-Request-Timeout'), default)
+
+async def follow_job(job, deadline, on_output):
+    """follow_job from app.py, awaiting the job between checks for new outputs"""
+    future = asyncio.wrap_future(job)
+    seen = 0
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=deadline.timeout(common.SPACE_OUTPUT_POLL))
+        outputs = job.outputs()
+        if len(outputs) > seen:
+            seen = len(outputs)
+            on_output(outputs[-1])
+        if done:
+            return future.result()
+        if deadline.remaining() <= 0:
+            raise asyncio.TimeoutError()
+
+async def call_space(gradio_client, deadline, timings, on_output=None, **kwargs):
+    """call_space from app.py, awaiting the job instead of blocking on it"""
+    with timings.stage(kwargs["api_name"].lstrip("/")), common.space_breaker.call():
+        with common.space_api_checked(kwargs["api_name"], submitting=True):
+            job = gradio_client.submit(**kwargs)
+        try:
+            with common.space_api_checked(kwargs["api_name"]):
+                if on_output is not None:
+                    return await follow_job(job, deadline, on_output)
+                return await asyncio.wait_for(asyncio.wrap_future(job), deadline.remaining())
+        except asyncio.TimeoutError:
+            job.cancel()
+            raise DeadlineExceeded(f"Research step {kwargs['api_name']} exceeded its {deadline.seconds:g}s deadline")
+
+async def run_research_agent(proposal, deadline, timings, on_stage=None, on_messages=None):
+    """run_research_agent from app.py with the Space calls awaited as jobs"""
+    timings.attempts += 1
+    session_id = str(uuid.uuid4())
+    message_id = str(uuid.uuid4())
+
+    common.space_breaker.check()
+    gradio_client = await asyncio.to_thread(common.space.get, deadline.timeout(common.SPACE_READY_TIMEOUT))
+    if gradio_client is None:
+        raise common.SpaceUnavailable(f"Gradio client not initialized: {common.space.error or common.space.state}")
+
+    if on_stage:
+        on_stage("log_user_message")
+    print("Logging user message...")
+    try:
+        log_result = await call_space(
+                gradio_client,
+                deadline,
+                timings,
+                text_input=common.build_research_prompt(proposal),
+                api_name="/log_user_message"
+                )
+        print(f"Log result completed: {len(log_result) if isinstance(log_result, str) else 'Not a string'} characters")
+    except (CircuitOpen, DeadlineExceeded):
+        raise
+    except Exception as e:
+        print(f"Error during message logging: {str(e)}")
+        raise common.ResearchStepError(f"Error logging message: {str(e)}") from e
+
+    if on_stage:
+        on_stage("interact_with_agent")
+    print("Interacting with agent...")
+    try:
+        result = await call_space(
+                gradio_client,
+                deadline,
+                timings,
+                on_output=on_messages,
+                messages=[{
+                    "role": "user",
+                    "content": log_result,
+                    "metadata": {
+                        "id": message_id,
+                        "parent_id": session_id
+                        }
+                    }],
+                api_name="/interact_with_agent_1"
+                )
+        print(f"Agent interaction completed: {type(result)}")
+    except (CircuitOpen, DeadlineExceeded):
+        raise
+    except Exception as e:
+        print(f"Error during agent interaction: {str(e)}")
+        raise common.ResearchStepError(f"Error during agent interaction: {str(e)}") from e
+    return result
+
+@app.errorhandler(MemoryPressure)
+async def memory_pressure(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(BudgetExceeded)
+async def budget_exceeded(e):
+    return jsonify({"error": f"Upstream response too large: {str(e)}"}), 502
+
+@app.errorhandler(CircuitOpen)
+async def circuit_open(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(DeadlineExceeded)
+async def deadline_exceeded(e):
+    return jsonify({"error": str(e)}), 504
+
+@app.errorhandler(common.SpaceUnavailable)
+async def space_unavailable(e):
+    return jsonify({"error": "Gradio client not initialized. Check server logs for details.", "research": common.space.status()}), 503
+
+@app.route('/', methods=['GET'])
+async def index():
+    return jsonify({"status": "ok"}), 200
+
+@app.route('/ready', methods=['GET'])
+async def ready():
+    status = common.readiness()
+    all_ready = all(service["ready"] for service in status.values())
+    return jsonify(status), 200 if all_ready else 503
+
+@app.route('/ready/<service>', methods=['GET'])
+async def ready_service(service):
+    status = common.readiness().get(service)
+    if status is None:
+        return jsonify({"error": f"Unknown service '{service}'"}), 404
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/stats', methods=['GET'])
+async def stats():
+    return jsonify(await asyncio.to_thread(common.service_stats)), 200
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/breakers', methods=['GET'])
+async def breakers():
+    return jsonify({"deepseek": common.deepseek_pool.breaker_stats(), "research": common.space_breaker.stats()}), 200
+
+def _evaluation_mode():
+    """The requested mode, or None after an unknown one"""
+    mode = request.args.get('mode', common.EVALUATION_MODE)
+    return mode if mode in common.EVALUATION_MODES else None
+
+def _unknown_mode():
+    return jsonify({"error": f"Unknown mode '{request.args['mode']}', expected one of: {', '.join(common.EVALUATION_MODES)}"}), 400
+
+async def evaluate_document(prepared, refresh, deadline, mode, include_reasoning=False):
+    """evaluate_proposal from app.py: the /evaluate response for a prepared proposal"""
+    proposal = prepared.text
+    timings = evaluate_timings()
+    key = common.evaluation_cache_key(proposal, mode)
+    if mode == "parallel":
+        compute = lambda: evaluate_in_parallel(proposal, refresh, deadline, timings)
+    else:
+        compute = lambda: evaluate_criteria(proposal, deadline=deadline, timings=timings, trace_id=key)
+    failures = []
+    try:
+        try:
+            final_response, similarity = await cached(
+                    key,
+                    common.evaluation_scope(mode),
+                    proposal,
+                    compute,
+                    refresh=refresh,
+                    deadline=deadline
+                    )
+        except common.PartialEvaluation as e:
+            final_response, similarity, failures = e.text, None, e.failures
+        with timings.stage("parse"):
+            extracted_data, parse_errors = common.parse_criteria_output(final_response)
+    except Exception as e:
+        timings.finish(outcome_of(e))
+        raise
+    timings.finish("partial" if failures else common.result_outcome(timings, similarity))
+    parse_errors = failures + parse_errors
+    if parse_errors:
+        print(f"[WARN] Malformed evaluation output: {parse_errors}")
+    extracted_data["parse_errors"] = parse_errors
+    extracted_data["reused"] = common.reuse_info(similarity)
+    reasoning_id = key if similarity is None and not failures else None
+    await asyncio.to_thread(common.reasoning_fields, extracted_data, reasoning_id, include_reasoning)
+    extracted_data["proposal_tokens"] = prepared.stats
+    extracted_data["history_id"] = reasoning_id
+    if reasoning_id is not None:
+        common.history.record("evaluation", reasoning_id, proposal, extracted_data, fresh=bool(timings.attempts))
+    return extracted_data
+
+async def json_response(document, status=200):
+    """json_response from app.py, encoded and compressed off the event loop"""
+    body, headers = await asyncio.to_thread(common.response_encoder.encode, document, request.headers.get('Accept-Encoding', ''))
+    return Response(body, status=status, mimetype='application/json', headers=headers)
+
+@app.route('/evaluate', methods=['POST'])
+async def evaluate():
+    data = await request.get_json()
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return await _evaluate_event_stream(await asyncio.to_thread(common.prepare, data['proposal']))
+
+    mode = _evaluation_mode()
+    if mode is None:
+        return _unknown_mode()
+    return await json_response(await evaluate_document(
+            await asyncio.to_thread(common.prepare, data['proposal']),
+            _cache_bypassed(),
+            request_deadline(common.EVALUATE_DEADLINE),
+            mode,
+            include_reasoning=request.args.get('reasoning', '').lower() in ('1', 'true', 'yes')
+            ))
+
+@app.route('/evaluate/<reasoning_id>/reasoning', methods=['GET'])
+async def evaluation_reasoning(reasoning_id):
+    data = await asyncio.to_thread(common.reasoning_traces.get_compressed, reasoning_id)
+    if data is None:
+        return jsonify({"error": "Unknown or expired reasoning trace"}), 404
+    body, headers = common.gzip_body(data, request.headers.get('Accept-Encoding', ''))
+    return Response(body, mimetype='text/plain', headers=headers)
+
+@app.route('/evaluate/stream', methods=['POST'])
+async def evaluate_stream():
+    data = await request.get_json()
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+
+    return await _evaluate_event_stream(await asyncio.to_thread(common.prepare, data['proposal']))
+
+@app.route('/evaluate/batch', methods=['POST'])
+async def evaluate_batch():
+    """/evaluate/batch from app.py, with the proposals as tasks on this worker's event loop"""
+    ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+    try:
+        items, invalid = parse_batch_items(await request.get_data(as_text=True), ndjson=ndjson, max_items=common.BATCH_MAX_ITEMS)
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+
+    concurrency = min(request.args.get('concurrency', common.BATCH_CONCURRENCY, type=int), common.BATCH_MAX_CONCURRENCY)
+    refresh = _cache_bypassed()
+    mode = _evaluation_mode()
+    if mode is None:
+        return _unknown_mode()
+
+    async def evaluate_item(proposal):
+        return await evaluate_document(await asyncio.to_thread(common.prepare, proposal), refresh, Deadline(common.EVALUATE_DEADLINE), mode)
+
+    async def generate():
+        yield json.dumps({"type": "started", "total": len(items) + len(invalid), "concurrency": concurrency}) + "\n"
+        async with contextlib.aclosing(run_batch_async(items, evaluate_item, concurrency, invalid)) as records:
+            async for record in records:
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    response = Response(generate(), mimetype='application/x-ndjson', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+async def _evaluate_event_stream(prepared):
+    """_evaluate_event_stream from app.py, streaming from the target's AsyncOpenAI client"""
+    proposal = prepared.text
+    key = common.evaluation_cache_key(proposal)
+    cached_text, similarity = None, None
+    if not _cache_bypassed():
+        cached_text = await asyncio.to_thread(common.result_cache.get, key)
+        if cached_text is None:
+            cached_text, similarity = await asyncio.to_thread(common.similar_result, common.evaluation_scope(), proposal)
+    deadline = request_deadline(common.EVALUATE_DEADLINE)
+    # Refuse before the 200 status line is sent if DeepSeek is down or this worker has no memory to spare
+    if cached_text is None:
+        common.deepseek_pool.check()
+    admission = await common.memory_governor.admit_async(common.REQUEST_MEMORY_RESERVE) if cached_text is None else None
+    timings = evaluate_timings()
+    if admission is not None:
+        timings.add("queue_wait", admission.waited)
+
+    def record(fresh):
+        common.history.record("evaluation", key, proposal, {**parser.results, "parse_errors": parser.errors, "reused": None,
+                       "reasoning_id": key, "proposal_tokens": prepared.stats, "history_id": key}, fresh)
+
+    parser = CriteriaStreamParser()
+
+    async def generate():
+        outcome = "disconnected"
+        try:
+            if cached_text is not None:
+                for key_, value in parser.feed(cached_text) + parser.close():
+                    yield _sse(*common.field_event(key_, value))
+                outcome = "cached" if similarity is None else "reused"
+                if similarity is None:
+                    record(fresh=False)
+                yield _sse("done", {"parse_errors": parser.errors, "cached": True, "reused": common.reuse_info(similarity),
+                                    "reasoning_id": key if similarity is None else None, "proposal_tokens": prepared.stats,
+                                    "history_id": key if similarity is None else None})
+                return
+
+            with common.deepseek_pool.lease() as target, \
+                    SpillBuffer(common.REASONING_MEMORY_BYTES, common.REASONING_MAX_BYTES, "reasoning") as reasoning_text, \
+                    SpillBuffer(common.CONTENT_MEMORY_BYTES, common.CONTENT_MAX_BYTES, "content") as response_text:
+                completion = await common.upstream_retry(open_completion)(target, proposal, deadline=deadline, timings=timings)
+                async with contextlib.aclosing(iter_completion_deltas(completion, deadline, timings)) as deltas:
+                    async for kind, text in deltas:
+                        yield _sse(kind, {"text": text})
+                        if kind != "content":
+                            reasoning_text.append(text)
+                            continue
+                        response_text.append(text)
+                        for key_, value in parser.feed(text):
+                            yield _sse(*common.field_event(key_, value))
+                for key_, value in parser.close():
+                    yield _sse(*common.field_event(key_, value))
+                final_response = await asyncio.to_thread(common.assemble_response, target, reasoning_text, response_text, timings)
+                await asyncio.to_thread(common.store_result, common.evaluation_scope(), proposal, key, final_response)
+                await asyncio.to_thread(common.store_reasoning, key, reasoning_text)
+            record(fresh=True)
+            outcome = "ok"
+            yield _sse("done", {"parse_errors": parser.errors, "cached": False, "reused": None, "reasoning_id": key,
+                                "proposal_tokens": prepared.stats, "history_id": key})
+        except Exception as e:
+            print(f"Failed streaming request: {type(e).__name__} - {str(e)}")
+            outcome = outcome_of(e)
+            yield _sse("error", {"message": f"{type(e).__name__}: {str(e)}"})
+        finally:
+            timings.finish(outcome)
+            if admission is not None:
+                admission.release()
+
+    response = Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+@app.route('/research', methods=['POST'])
+async def research():
+    """/research from app.py; as Server-Sent Events the agent's progress is sent as it happens"""
+    start_time = time.time()
+    data = await request.get_json()
+
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+
+    # Cached and reused results are served while the Space is down; only a miss waits for it
+    deadline = request_deadline(common.RESEARCH_DEADLINE)
+    if request.accept_mimetypes.best == 'text/event-stream':
+        prepared = await asyncio.to_thread(common.prepare, data['proposal'])
+        return _research_event_stream(prepared, _cache_bypassed(), deadline, start_time)
+
+    timings = research_timings()
+    outcome = "error"
+    try:
+        print(f"Processing research request for proposal: {data['proposal'][:50]}...")
+        prepared = await asyncio.to_thread(common.prepare, data['proposal'])
+        parser = AgentResponseParser()
+        result, similarity = await cached(
+                common.research_cache_key(prepared.text),
+                common.research_scope(),
+                prepared.text,
+                lambda: run_research_agent(prepared.text, deadline, timings, on_messages=parser.update),
+                refresh=_cache_bypassed(),
+                deadline=deadline
+                )
+        response = await asyncio.to_thread(common.build_research_response, result, time.time() - start_time, timings, similarity, parser)
+        response["proposal_tokens"] = prepared.stats
+        response["history_id"] = common.record_research(prepared.text, response["parsed_result"], timings, similarity)
+        common.store_artifacts(response)
+        outcome = common.result_outcome(timings, similarity)
+        return await json_response(common.research_view(response, request.args))
+
+    except (CircuitOpen, DeadlineExceeded, common.SpaceUnavailable) as e:
+        outcome = outcome_of(e)
+        raise
+    except common.ResearchStepError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        print(f"Unhandled error in research route: {str(e)}")
+        return jsonify({"error": f"Error during research: {str(e)}"}), 500
+    finally:
+        timings.finish(outcome)
+
+def _research_event_stream(prepared, refresh, deadline, start_time):
+    """_research_event_stream from app.py, with the research run as a task on this worker's event loop"""
+    timings = research_timings()
+    parser = AgentResponseParser()
+    events = asyncio.Queue()
+
+    def on_messages(messages):
+        for event in parser.update(messages):
+            events.put_nowait(event)
+
+    def finished(task):
+        events.put_nowait(None)
+        # Marked retrieved in case the client left before it was awaited
+        if not task.cancelled():
+            task.exception()
+
+    task = asyncio.ensure_future(cached(
+            common.research_cache_key(prepared.text),
+            common.research_scope(),
+            prepared.text,
+            lambda: run_research_agent(prepared.text, deadline, timings, on_messages=on_messages,
+                                       on_stage=lambda stage: events.put_nowait(("stage", {"stage": stage}))),
+            refresh=refresh,
+            deadline=deadline
+            ))
+    task.add_done_callback(finished)
+
+    async def generate():
+        outcome = "disconnected"
+        try:
+            while (event := await events.get()) is not None:
+                yield _sse(*event)
+            result, similarity = await task
+            for event in await asyncio.to_thread(common.parse_research_events, result, timings, parser):
+                yield _sse(*event)
+            outcome = common.result_outcome(timings, similarity)
+            document = {"execution_time": f"{time.time() - start_time:.2f} seconds", "cached": not timings.attempts,
+                        "reused": common.reuse_info(similarity), "proposal_tokens": prepared.stats,
+                        "history_id": common.record_research(prepared.text, parser.result, timings, similarity),
+                        "parsed_result": parser.result}
+            common.store_artifacts(document)
+            yield _sse("done", {key: value for key, value in document.items() if key != "parsed_result"})
+        except Exception as e:
+            print(f"Failed research stream: {type(e).__name__} - {str(e)}")
+            outcome = outcome_of(e)
+            yield _sse("error", {"message": f"{type(e).__name__}: {str(e)}"})
+        finally:
+            timings.finish(outcome)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+@app.route('/research/jobs', methods=['POST'])
+async def submit_research_job():
+    """Research jobs run on the thread pool of app.py's research_jobs queue, shared with the Flask app's job store"""
+    data = await request.get_json()
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+
+    common.space_breaker.check()
+    if await asyncio.to_thread(common.space.get, common.SPACE_READY_TIMEOUT) is None:
+        return jsonify({"error": "Gradio client not initialized. Check server logs for details.", "research": common.space.status()}), 503
+
+    try:
+        job = await asyncio.to_thread(common.research_jobs.submit, {"proposal": data['proposal']})
+    except QueueFull as e:
+        return jsonify({"error": f"Research queue is full: {str(e)}"}), 429
+
+    response = public_view(job)
+    response["status_url"] = f"/research/jobs/{job['id']}"
+    response["result_url"] = f"/research/jobs/{job['id']}/result"
+    return jsonify(response), 202, {"Location": response["status_url"]}
+
+@app.route('/research/jobs/<job_id>', methods=['GET'])
+async def research_job_status(job_id):
+    job = await asyncio.to_thread(common.research_jobs.store.get, job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(public_view(job)), 200
+
+@app.route('/research/jobs/<job_id>/result', methods=['GET'])
+async def research_job_result(job_id):
+    job = await asyncio.to_thread(common.research_jobs.store.get, job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == SUCCEEDED:
+        result = await asyncio.to_thread(common.research_jobs.store.get_result, job_id)
+        if result is None:
+            return jsonify({**public_view(job), "error": "The job's result is no longer available"}), 410
+        return await json_response(common.research_view(result, request.args))
+    if job["status"] == FAILED:
+        return jsonify({**public_view(job), "error": job["error"]}), 500
+    if job["status"] == CANCELLED:
+        return jsonify(public_view(job)), 409
+    # Still queued or running
+    return jsonify(public_view(job)), 202
+
+@app.route('/research/jobs/<job_id>', methods=['DELETE'])
+async def cancel_research_job(job_id):
+    job = await asyncio.to_thread(common.research_jobs.cancel, job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(public_view(job)), 200
+
+@app.route('/research/reports/<request_id>', methods=['GET'])
+async def research_report(request_id):
+    report = await asyncio.to_thread(common.research_artifacts.get_report, request_id)
+    if report is None:
+        return jsonify({"error": "Unknown or expired report"}), 404
+    return Response(render_markdown(report), mimetype='text/markdown')
+
+@app.route('/research/reports/<request_id>/response', methods=['GET'])
+async def research_report_response(request_id):
+    data = await asyncio.to_thread(common.research_artifacts.get_response, request_id)
+    if data is None:
+        return jsonify({"error": "Unknown or expired report"}), 404
+    body, headers = common.gzip_body(data, request.headers.get('Accept-Encoding', ''))
+    return Response(body, mimetype='application/json', headers=headers)
+
+async def research_document(prepared, refresh, deadline):
+    """research_document from app.py: the research branch of /pipeline"""
+    proposal = prepared.text
+    timings = research_timings()
+    parser = AgentResponseParser()
+    try:
+        result, similarity = await cached(
+                common.research_cache_key(proposal),
+                common.research_scope(),
+                proposal,
+                lambda: run_research_agent(proposal, deadline, timings, on_messages=parser.update),
+                refresh=refresh,
+                deadline=deadline
+                )
+        document = await asyncio.to_thread(common.research_summary, result, timings, parser)
+    except Exception as e:
+        timings.finish(outcome_of(e))
+        raise
+    timings.finish(common.result_outcome(timings, similarity))
+    document["reused"] = common.reuse_info(similarity)
+    document["proposal_tokens"] = prepared.stats
+    document["history_id"] = common.record_research(proposal, document, timings, similarity)
+    return document
+
+@app.route('/history', methods=['GET'])
+async def history_results():
+    try:
+        kind, before, limit = common.history_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    results, next_page = await asyncio.to_thread(common.history.recent, kind, before, limit)
+    return jsonify({"results": results, "next": next_page}), 200
+
+@app.route('/history/search', methods=['GET'])
+async def search_history():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing 'q' in request"}), 400
+    try:
+        kind, before, limit = common.history_params(request.args)
+        results, next_page = await asyncio.to_thread(common.history.search, query, kind, before, limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": results, "next": next_page}), 200
+
+@app.route('/history/scores', methods=['GET'])
+async def history_scores():
+    return jsonify(await asyncio.to_thread(common.history.score_distribution)), 200
+
+@app.route('/history/<result_id>', methods=['GET'])
+async def history_result(result_id):
+    result = await asyncio.to_thread(common.history.get, result_id)
+    if result is None:
+        return jsonify({"error": "Unknown result"}), 404
+    return jsonify(result), 200
+
+async def _branch(name, coroutine):
+    try:
+        return name, await coroutine, None
+    except Exception as e:
+        print(f"Pipeline {name} failed: {type(e).__name__} - {str(e)}")
+        return name, None, f"{type(e).__name__}: {str(e)}"
+
+async def pipeline_results(branches):
+    """Yield (branch, document, error) for each branch as it finishes; a branch
+    still running when the caller stops (e.g. the client left) is cancelled"""
+    tasks = [asyncio.ensure_future(_branch(name, coroutine)) for name, coroutine in branches.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/pipeline', methods=['POST'])
+async def pipeline():
+    """/pipeline from app.py, with both branches as tasks on this worker's event loop"""
+    start_time = time.time()
+    data = await request.get_json()
+    if 'proposal' not in data:
+        return jsonify({"error": "Missing 'proposal' in request"}), 400
+    mode = _evaluation_mode()
+    if mode is None:
+        return _unknown_mode()
+
+    prepared = await asyncio.to_thread(common.prepare, data['proposal'])
+    refresh = _cache_bypassed()
+    branches = {
+            "evaluation": evaluate_document(prepared, refresh, request_deadline(common.EVALUATE_DEADLINE), mode),
+            "research": research_document(prepared, refresh, request_deadline(common.RESEARCH_DEADLINE))
+            }
+
+    if request.accept_mimetypes.best == 'text/event-stream':
+        async def generate():
+            errors = {}
+            async for name, document, error in pipeline_results(branches):
+                if error is None:
+                    yield _sse(name, document)
+                else:
+                    errors[name] = error
+                    yield _sse("error", {"branch": name, "message": error})
+            yield _sse("done", {"errors": errors, "execution_time": f"{time.time() - start_time:.2f} seconds"})
+
+        response = Response(generate(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        response.timeout = None
+        return response
+
+    response = {"evaluation": None, "research": None, "errors": {}}
+    async for name, document, error in pipeline_results(branches):
+        response[name] = document
+        if error is not None:
+            response["errors"][name] = error
+    response["execution_time"] = f"{time.time() - start_time:.2f} seconds"
+    return jsonify(response), 502 if len(response["errors"]) == len(branches) else 200
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(os.getenv("PORT", 10000))
+    print(f"Starting async server on port {port}...")
+    uvicorn.run(app, host="0.0.0.0", port=port)
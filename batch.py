@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+class BatchError(ValueError):
+    """The batch request itself is malformed (as opposed to a single bad item)"""
+
+def parse_batch_items(body, ndjson=False, max_items=1000):
+    """Read proposals from a JSON body ({"proposals": [...]}) or NDJSON lines.
+
+    Each item is either a proposal string or an object with "proposal" and an
+    optional "id" (defaults to the item's position). Returns (items, invalid):
+    items are {"index", "id", "proposal"} dicts, invalid are per-item error
+    records so one bad line does not reject the whole batch.
+    """
+    if ndjson:
+        raw_items = []
+        for line_number, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                raw_items.append(json.loads(line))
+            except ValueError as e:
+                raw_items.append(BatchError(f"Invalid JSON on line {line_number + 1}: {str(e)}"))
+    else:
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise BatchError(f"Invalid JSON body: {str(e)}")
+        raw_items = data.get("proposals") if isinstance(data, dict) else None
+        if not isinstance(raw_items, list):
+            raise BatchError("Missing 'proposals' list in request")
+
+    if len(raw_items) > max_items:
+        raise BatchError(f"Batch has {len(raw_items)} items; the limit is {max_items}")
+
+    items = []
+    invalid = []
+    for index, raw in enumerate(raw_items):
+        item_id = raw.get("id", index) if isinstance(raw, dict) else index
+        if isinstance(raw, BatchError):
+            invalid.append({"index": index, "id": item_id, "error": str(raw)})
+        elif isinstance(raw, str):
+            items.append({"index": index, "id": item_id, "proposal": raw})
+        elif isinstance(raw, dict) and isinstance(raw.get("proposal"), str):
+            items.append({"index": index, "id": item_id, "proposal": raw["proposal"]})
+        else:
+            invalid.append({"index": index, "id": item_id, "error": "Missing 'proposal' in item"})
+    return items, invalid
+
+def run_batch(items, worker, concurrency, invalid=()):
+    """Run worker(proposal) for every item on at most `concurrency` threads.
+
+    Yields one record per item in completion order, each carrying the item's id,
+    its own result or error, and the running progress counters. Pending items are
+    cancelled if the consumer stops iterating (e.g. the client disconnects).
+    """
+    progress, record = _recorder(len(items) + len(invalid))
+    start = time.time()
+
+    for item in invalid:
+        yield record(item, ok=False, error=item["error"])
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="batch")
+    try:
+        pending = {}
+        queue = iter(items)
+        # Submit lazily so at most `concurrency` proposals are in flight at once
+        for item in queue:
+            pending[executor.submit(_timed, worker, item["proposal"])] = item
+            if len(pending) >= concurrency:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    yield record(item, ok=False, error=f"{type(e).__name__}: {str(e)}")
+                else:
+                    yield record(item, ok=True, seconds=round(seconds, 3), result=result)
+                next_item = next(queue, None)
+                if next_item is not None:
+                    pending[executor.submit(_timed, worker, next_item["proposal"])] = next_item
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    yield {"type": "summary", **progress, "seconds": round(time.time() - start, 3)}
+
+async def run_batch_async(items, worker, concurrency, invalid=()):
+    """run_batch for the event loop: worker(proposal) is a coroutine function, run as
+    at most `concurrency` tasks at once. Pending tasks are cancelled if the consumer
+    stops iterating.
+    """
+    progress, record = _recorder(len(items) + len(invalid))
+    start = time.time()
+
+    for item in invalid:
+        yield record(item, ok=False, error=item["error"])
+
+    pending = {}
+    try:
+        queue = iter(items)
+        for item in queue:
+            pending[asyncio.ensure_future(_timed_async(worker, item["proposal"]))] = item
+            if len(pending) >= concurrency:
+                break
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item = pending.pop(task)
+                try:
+                    result, seconds = task.result()
+                except Exception as e:
+                    yield record(item, ok=False, error=f"{type(e).__name__}: {str(e)}")
+                else:
+                    yield record(item, ok=True, seconds=round(seconds, 3), result=result)
+                next_item = next(queue, None)
+                if next_item is not None:
+                    pending[asyncio.ensure_future(_timed_async(worker, next_item["proposal"]))] = next_item
+    finally:
+        for task in pending:
+            task.cancel()
+
+    yield {"type": "summary", **progress, "seconds": round(time.time() - start, 3)}
+
+def _recorder(total):
+    """The running progress counters and a function turning an item's outcome into its record"""
+    progress = {"completed": 0, "failed": 0, "total": total}
+
+    def record(item, **fields):
+        progress["completed"] += 1
+        if not fields.get("ok"):
+            progress["failed"] += 1
+        return {"type": "result", "id": item["id"], "index": item["index"], **fields, **progress}
+
+    return progress, record
+
+def _timed(worker, proposal):
+    start = time.time()
+    return worker(proposal), time.time() - start
+
+async def _timed_async(worker, proposal):
+    start = time.time()
+    return await worker(proposal), time.time() - start
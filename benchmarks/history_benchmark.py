@@ -0,0 +1,105 @@
+"""Result history: write throughput and query latency at millions of rows.
+
+Records --rows synthetic results (five evaluations to one research result)
+into a throwaway HistoryStore through record(), flushing every --chunk, then
+times the queries behind the /history endpoints: fetch by id, the newest and
+a deep page of the listing, full-text search for a rare and a common term
+(with and without a kind filter), and the score distributions. Reports the
+cost of record() on the request path, rows written per second, p50/p99 per
+query and the database size.
+
+Usage:
+    python benchmarks/history_benchmark.py [--rows 1000000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import HistoryStore
+
+def percentile_ms(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunk", type=int, default=10000, help="results recorded between flushes")
+    parser.add_argument("--words", type=int, default=120, help="words of reasoning or report per result")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = [f"term{n}" for n in range(20000)]
+
+    def text(n):
+        # Every result mentions "market"; one in 100000 mentions its own rare word
+        words = rng.choices(vocabulary, k=args.words) + ["market"]
+        if n % 100000 == 0:
+            words.append(f"unicorn{n}")
+        return " ".join(words)
+
+    def result(n):
+        if n % 6 == 5:
+            return "research", {"novelty_score": rng.randint(0, 100), "final_answer": text(n),
+                                "execution_steps": [{"title": f"Step {n % 7}", "details": [text(n)]}], "search_links": []}
+        document = {f"score_criteria{c}": rng.randint(0, 100) for c in range(1, 7)}
+        document.update({f"detailed_reasoning_criteria{c}": text(n) for c in range(1, 3)})
+        return "evaluation", document
+
+    directory = tempfile.mkdtemp(prefix="history-bench-")
+    try:
+        history = HistoryStore(os.path.join(directory, "history.db"), max_queued=args.chunk + 1)
+        ids, recording = [], []
+        start = time.perf_counter()
+        for n in range(args.rows):
+            kind, document = result(n)
+            result_id = f"{n:064x}"
+            if n % max(1, args.rows // args.queries) == 0:
+                ids.append(result_id)
+            t = time.perf_counter()
+            history.record(kind, result_id, f"Proposal {n}: {text(n)[:200]}", document, fresh=True)
+            recording.append(time.perf_counter() - t)
+            if (n + 1) % args.chunk == 0:
+                history.flush()
+        history.flush()
+        write_seconds = time.perf_counter() - start
+
+        def timed(query):
+            times = []
+            for n in range(args.queries):
+                t = time.perf_counter()
+                query(n)
+                times.append(time.perf_counter() - t)
+            return times
+
+        middle = args.rows // 2
+        queries = {
+                "get by id": lambda n: history.get(ids[n % len(ids)]),
+                "newest page": lambda n: history.recent(limit=50),
+                "deep page": lambda n: history.recent(before=middle - n, limit=50),
+                "newest research page": lambda n: history.recent("research", limit=50),
+                "search rare term": lambda n: history.search(f"unicorn{(n % max(1, args.rows // 100000)) * 100000}"),
+                "search common term": lambda n: history.search("market"),
+                "search two terms": lambda n: history.search(f"market {vocabulary[n]}"),
+                "search research only": lambda n: history.search("market", kind="research"),
+                "score distribution": lambda n: history.score_distribution()
+                }
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 1024 / 1024
+        stats = history.stats()
+        print(f"{args.rows} results: record() p50 {percentile_ms(recording, 50) * 1000:.1f} us p99 {percentile_ms(recording, 99) * 1000:.1f} us, "
+              f"{stats['written'] / write_seconds:.0f} rows/s written in {stats['batches']} batches, {size:.0f} MB on disk")
+        for name, query in queries.items():
+            times = timed(query)
+            print(f"{name:22} p50 {percentile_ms(times, 50):8.3f} ms   p99 {percentile_ms(times, 99):8.3f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Offline load test: replay a proposal corpus against /evaluate and /research.
+
+Starts the DeepSeek stub (stub_upstreams.py), the Space stub (stub_space.py)
+and the app (sync gunicorn or async uvicorn, as in serving_benchmark.py) on
+this machine, with throwaway cache and state directories, so nothing leaves
+the host. Each endpoint is driven in turn by --concurrency clients sending
+--requests proposals taken round-robin from --corpus (a JSON-lines file with a
+"proposal" field), with Cache-Control: no-cache unless --use-cache is given.
+
+Reported per endpoint: requests/s, p50/p95/p99 latency of successful requests,
+error rate and errors by kind, and the peak RSS of every worker process. Stub
+behaviour (token rate, sizes, injected faults) is passed through with
+--deepseek-args and --space-args.
+
+--evaluation-mode parallel sends /evaluate requests with ?mode=parallel, one
+upstream request per criterion, to compare latency with the default single mode.
+
+--keys spreads DeepSeek calls over that many API keys (DEEPSEEK_API_KEYS); with
+--deepseek-args "--max-streams-per-key N" it shows throughput scaling with keys.
+
+--json writes the report to a file. --max-p95, --max-error-rate and
+--max-worker-rss-mb make the run exit with status 1 when exceeded, for use as a
+regression check in CI.
+
+Usage:
+    python benchmarks/load_test.py [--server async] [--workers 1] [--concurrency 50] [--requests 200]
+    python benchmarks/load_test.py --endpoints evaluate --deepseek-args "--tokens-per-second 400 --error-rate 0.05"
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import psutil
+
+from serving_benchmark import APP_PORT, ROOT, STUB_PORT, isolated_env, percentile, server_commands, stop, wait_until_up
+
+SPACE_PORT = 8102
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as f:
+        proposals = [json.loads(line)["proposal"] for line in f if line.strip()]
+    if not proposals:
+        raise ValueError(f"{path} has no proposals")
+    return proposals
+
+def valid_response(endpoint, body):
+    if endpoint == "evaluate":
+        return body.get("score_criteria1") is not None
+    return bool(body.get("parsed_result", {}).get("final_answer"))
+
+class RssSampler(threading.Thread):
+    """Samples the RSS of the server's worker processes until stopped; keeps the peak per process"""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.server = psutil.Process(pid)
+        self.interval = interval
+        self.peaks = {}
+        self._stopped = threading.Event()
+
+    def workers(self):
+        # gunicorn and multi-worker uvicorn serve from children; a single uvicorn worker is the process itself
+        return self.server.children(recursive=True) or [self.server]
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                for process in self.workers():
+                    rss = process.memory_info().rss
+                    self.peaks[process.pid] = max(self.peaks.get(process.pid, 0), rss)
+            except psutil.Error:
+                pass
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return {pid: round(rss / 1024 / 1024, 1) for pid, rss in sorted(self.peaks.items())}
+
+async def drive(endpoint, proposals, concurrency, total, use_cache, request_timeout, evaluation_mode):
+    latencies = []
+    errors = {}
+    counter = iter(range(total))
+    headers = {} if use_cache else {"Cache-Control": "no-cache"}
+    params = {"mode": evaluation_mode} if endpoint == "evaluate" else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=request_timeout, limits=limits) as http:
+        async def client():
+            for n in counter:
+                start = time.perf_counter()
+                try:
+                    response = await http.post(f"/{endpoint}", json={"proposal": proposals[n % len(proposals)]},
+                                               params=params, headers=headers)
+                    response.raise_for_status()
+                    if not valid_response(endpoint, response.json()):
+                        raise ValueError("unparsed response")
+                except Exception as e:
+                    name = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+                    errors[name] = errors.get(name, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+def run_endpoint(endpoint, server, args, proposals):
+    sampler = RssSampler(server.pid)
+    sampler.start()
+    try:
+        latencies, errors, elapsed = asyncio.run(
+                drive(endpoint, proposals, args.concurrency, args.requests, args.use_cache, args.request_timeout, args.evaluation_mode)
+                )
+    finally:
+        worker_rss = sampler.stop()
+    return {
+            "requests": args.requests,
+            "succeeded": len(latencies),
+            "requests_per_second": round(len(latencies) / elapsed, 2),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "error_rate": round(sum(errors.values()) / args.requests, 4),
+            "errors": errors,
+            "worker_peak_rss_mb": worker_rss
+            }
+
+def regressions(report, args):
+    found = []
+    for endpoint, result in report["endpoints"].items():
+        if args.max_p95 is not None and not result["p95"] <= args.max_p95:
+            found.append(f"{endpoint}: p95 {result['p95']}s > {args.max_p95}s")
+        if args.max_error_rate is not None and result["error_rate"] > args.max_error_rate:
+            found.append(f"{endpoint}: error rate {result['error_rate']} > {args.max_error_rate}")
+        if args.max_worker_rss_mb is not None:
+            for pid, rss in result["worker_peak_rss_mb"].items():
+                if rss > args.max_worker_rss_mb:
+                    found.append(f"{endpoint}: worker {pid} peaked at {rss} MB > {args.max_worker_rss_mb} MB")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["sync", "async"], default="async")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--endpoints", default="evaluate,research")
+    parser.add_argument("--evaluation-mode", choices=["single", "parallel"], default="single")
+    parser.add_argument("--keys", type=int, default=1, help="DeepSeek API keys in the upstream pool")
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "proposals.jsonl"))
+    parser.add_argument("--use-cache", action="store_true", help="let repeated proposals hit the result cache")
+    parser.add_argument("--request-timeout", type=float, default=900)
+    parser.add_argument("--deepseek-args", default="", help="extra arguments for stub_upstreams.py")
+    parser.add_argument("--space-args", default="", help="extra arguments for stub_space.py")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--max-p95", type=float, help="fail if any endpoint's p95 latency exceeds this many seconds")
+    parser.add_argument("--max-error-rate", type=float, help="fail if any endpoint's error rate exceeds this fraction")
+    parser.add_argument("--max-worker-rss-mb", type=float, help="fail if any worker's peak RSS exceeds this")
+    args = parser.parse_args()
+
+    proposals = load_corpus(args.corpus)
+    endpoints = args.endpoints.split(",")
+    stubs = [subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "stub_upstreams.py"), "--port", str(STUB_PORT),
+                               *shlex.split(args.deepseek_args)])]
+    if "research" in endpoints:
+        stubs.append(subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "stub_space.py"), "--port", str(SPACE_PORT),
+                                       *shlex.split(args.space_args)]))
+    state_dir = tempfile.mkdtemp(prefix="load-test-")
+    server = None
+    try:
+        wait_until_up(f"http://127.0.0.1:{STUB_PORT}/stats", stubs[0])
+        if "research" in endpoints:
+            wait_until_up(f"http://127.0.0.1:{SPACE_PORT}/config", stubs[1])
+        env = isolated_env(state_dir,
+                           DEEPSEEK_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+                           DEEPSEEK_API_KEYS=",".join(f"load-test-{n}" for n in range(1, args.keys + 1)),
+                           DEEPSEEK_RPS="0",
+                           DEEPSEEK_TPM="0",
+                           HF_SPACE=f"http://127.0.0.1:{SPACE_PORT}/",
+                           HF_TOKEN="load-test",
+                           SPACE_READY_TIMEOUT="60",
+                           WEB_CONCURRENCY=str(args.workers))
+        server = subprocess.Popen(server_commands(args.workers)[args.server], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        wait_until_up(f"http://127.0.0.1:{APP_PORT}/", server)
+
+        report = {
+                "server": args.server,
+                "workers": args.workers,
+                "keys": args.keys,
+                "evaluation_mode": args.evaluation_mode,
+                "concurrency": args.concurrency,
+                "corpus": os.path.basename(args.corpus),
+                "deepseek_args": args.deepseek_args,
+                "space_args": args.space_args,
+                "endpoints": {}
+                }
+        print(f"{args.server} server, {args.workers} worker(s), {args.keys} key(s), {args.concurrency} concurrent clients, "
+              f"{args.requests} requests per endpoint, {len(proposals)} proposals in corpus")
+        for endpoint in endpoints:
+            result = run_endpoint(endpoint, server, args, proposals)
+            report["endpoints"][endpoint] = result
+            rss = ", ".join(f"{pid}: {mb} MB" for pid, mb in result["worker_peak_rss_mb"].items())
+            print(f"/{endpoint:<9} {result['requests_per_second']:8.2f} req/s   p50 {result['p50']:7.2f}s   "
+                  f"p95 {result['p95']:7.2f}s   p99 {result['p99']:7.2f}s   "
+                  f"errors {result['error_rate']:.1%} {result['errors'] or ''}   peak worker RSS {rss}")
+    finally:
+        if server is not None:
+            stop(server)
+        for stub in stubs:
+            stop(stub)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    found = regressions(report, args)
+    for line in found:
+        print(f"[REGRESSION] {line}")
+    sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""Parser scaling: time and peak memory of the response parsers from 1KB to 10MB of input.
+
+Generates reasoner outputs and agent transcripts of each --sizes size, well
+formed and malformed, and measures each parser on them:
+
+  extract_key_elements_as_variables, extract_think_parts
+      evaluations as the reasoner writes them; without the
+      "--- Evaluation Details End ---" marker; with <chain_of_thought> or
+      <think> never closed
+  parse_agent_response
+      transcripts of many steps; one huge step without its "### 3" section
+  _extract_final_answer
+      a {'novelty_score': ..., 'report': '...'} answer with a huge report; the
+      report never closed; braces that are opened and never closed
+  clean_links (save_as_markdown's link cleaning)
+      the links of a research run; one link ending in a long run of dots
+
+Reports the fastest time of each run (repeated for at least --min-seconds),
+throughput and the peak memory allocated, and fits the scaling exponent of
+time over size (1 is linear). A case is flagged when its exponent is over
+--max-exponent, or when a run takes over --max-seconds (a regex backtracking
+blowup); sizes a flagged case would need too long for are skipped.
+
+--compare runs the same cases on the parsers of a git ref (in a temporary
+worktree) and then on this tree, and flags any case more than --time-tolerance
+and --time-floor slower, using more than --memory-tolerance more memory, or
+scaling worse by --exponent-tolerance. Times are only comparable on the same
+machine, so both sides run on this one. --save-baseline writes the results to a JSON file and
+--baseline compares against one instead. Exits 1 if anything is flagged.
+
+Usage:
+    python benchmarks/parser_benchmark.py [--sizes 1K,10K,100K,1M,10M] [--only final_answer] [--save-baseline parsers.json | --baseline parsers.json]
+    python benchmarks/parser_benchmark.py --compare main
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from criteria_parser import extract_key_elements_as_variables, extract_think_parts
+from response_parser import _extract_final_answer, clean_links, parse_agent_response
+
+UNITS = {"K": 1024, "M": 1024 * 1024}
+# Sizes under this are left out of the exponent fit: fixed costs dominate them
+MIN_FIT_BYTES = 10 * 1024
+
+def parse_size(value):
+    value = value.strip().upper()
+    return int(float(value[:-1]) * UNITS[value[-1]]) if value[-1] in UNITS else int(value)
+
+def format_size(size):
+    for unit, factor in (("M", UNITS["M"]), ("K", UNITS["K"])):
+        if size >= factor:
+            return f"{size / factor:.{0 if size % factor == 0 else 1}f}{unit}B"
+    return f"{size}B"
+
+def prose(rng, size):
+    """size characters of word-like text"""
+    words = []
+    length = 0
+    while length < size:
+        word = "".join(rng.choices("etaoinshrdlucmfwypvbg", k=rng.randint(2, 9)))
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+def evaluation(size, rng, end_marker=True, close_cot=True):
+    """A reasoner answer of about size characters in the format the evaluation prompt asks for"""
+    filler = prose(rng, max(1, size // 40))
+    lines = []
+    for n in range(1, 7):
+        lines += [
+                f"The score of criteria{n}: {40 + 5 * n} ",
+                f"Detailed reasoning{n}: {filler} ",
+                f"Summary reasoning criteria{n}: {filler} ",
+                f"Improvement suggestion criteria{n}: {filler} "
+                ]
+    if end_marker:
+        lines += ["", "--- Evaluation Details End ---", ""]
+    lines.append("<chain_of_thought>")
+    for part in ["introduction"] + [f"criteria{n}" for n in range(1, 7)] + ["conclusion"]:
+        lines.append(f"    <{part}>{filler}" + (f"</{part}>" if close_cot else ""))
+    if close_cot:
+        lines.append("</chain_of_thought>")
+    return "\n".join(lines)
+
+def unterminated_think(size, rng):
+    return "<think>" + prose(rng, size // 2) + "\n" + evaluation(size // 2, rng)
+
+def step_messages(step, rng, page):
+    return [
+            {"role": "assistant", "content": f"**Step {step}**", "metadata": {}},
+            {"role": "assistant", "content": "Execution logs:\n" + "\n".join(
+                f"https://example.org/{step}/{n}?q={rng.getrandbits(24):x}" for n in range(5)) + "\n" + page,
+             "metadata": {"title": "📝 Execution Logs"}},
+            {"role": "assistant", "content": (
+                "### 1. Task outcome (short version):\nDone.\n\n### 2. Task outcome (extremely detailed version):\n**Findings.** "
+                + page[:len(page) // 4] + "\n\n### 3. Additional context (if relevant):\nNone."
+                ), "metadata": {}}
+            ]
+
+def transcript(size, rng):
+    """An agent transcript of about size characters, in steps of about 8KB"""
+    page = prose(rng, 6 * 1024)
+    messages = [{"role": "user", "content": "There is a startup idea: ...", "metadata": {}}]
+    for step in range(1, max(1, size // (8 * 1024)) + 1):
+        messages += step_messages(step, rng, page)
+    messages.append({"role": "assistant", "content": "**Final answer:** {'novelty_score': 70, 'report': 'Partly novel.'}", "metadata": {}})
+    return messages
+
+def huge_step(size, rng):
+    """One step whose task outcome is the whole transcript, with no "### 3" section after it"""
+    return [
+            {"role": "assistant", "content": "**Step 1**", "metadata": {}},
+            {"role": "assistant", "content": "### 2. Task outcome (extremely detailed version):\n" + prose(rng, size), "metadata": {}}
+            ]
+
+def report_answer(size, rng):
+    report = prose(rng, size).replace(" ", "\\n", size // 200)
+    return f"**Final answer:** {{'novelty_score': 72, 'report': '{report}'}}"
+
+def unterminated_report(size, rng):
+    return f"**Final answer:** {{'novelty_score': 72, 'report': '{prose(rng, size)}"
+
+def open_braces(size, rng):
+    """Braces the agent opened in its answer and never closed"""
+    return "Final answer: " + " ".join("{" + word for word in prose(rng, size).split())
+
+def links(size, rng):
+    """The search links of a research run, in the shapes the agent writes them"""
+    shapes = ["https://example.org/{0}", "https://example.org/{0}?utm_source=x", "https://example.org/{0}).", "[{0}](https://example.org/{0})",
+              "https://example.org/{0}...", "https://example.org/{0}\\n"]
+    found = []
+    length = 0
+    while length < size:
+        link = rng.choice(shapes).format(rng.getrandbits(32))
+        found.append(link)
+        length += len(link)
+    return found
+
+def dotted_link(size, rng):
+    """A link ending in a long run of dots, as when the agent's log elides text"""
+    return ["https://example.org/a" + "." * size + "x"]
+
+CASES = {
+        "key_elements": [(name, extract_key_elements_as_variables, corpus) for name, corpus in (
+                ("evaluation", evaluation),
+                ("no end marker", lambda size, rng: evaluation(size, rng, end_marker=False)),
+                ("unterminated cot", lambda size, rng: evaluation(size, rng, close_cot=False))
+                )],
+        "think_parts": [(name, extract_think_parts, corpus) for name, corpus in (
+                ("evaluation", evaluation),
+                ("unterminated cot", lambda size, rng: evaluation(size, rng, close_cot=False)),
+                ("unterminated think", unterminated_think)
+                )],
+        "agent_response": [
+                ("transcript", parse_agent_response, transcript),
+                ("huge step", parse_agent_response, huge_step)
+                ],
+        "final_answer": [
+                ("report", _extract_final_answer, report_answer),
+                ("unterminated report", _extract_final_answer, unterminated_report),
+                ("open braces", _extract_final_answer, open_braces)
+                ],
+        "links": [
+                ("links", clean_links, links),
+                ("dotted link", clean_links, dotted_link)
+                ]
+        }
+
+def timed(function, value, min_seconds):
+    """Fastest of as many runs as fit in min_seconds (at least one), with the garbage
+    collector off as timeit does, so collections of earlier cases' objects are not timed"""
+    best = math.inf
+    spent = 0.0
+    gc.collect()
+    gc.disable()
+    try:
+        while spent < min_seconds or best == math.inf:
+            start = time.perf_counter()
+            function(value)
+            elapsed = time.perf_counter() - start
+            best = min(best, elapsed)
+            spent += elapsed
+    finally:
+        gc.enable()
+    return best
+
+def peak_memory(function, value):
+    """Peak bytes allocated by one run, beyond its input"""
+    tracemalloc.start()
+    try:
+        function(value)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def exponent(points):
+    """Least-squares slope of log(seconds) over log(size)"""
+    points = [(math.log(size), math.log(max(seconds, 1e-9))) for size, seconds in points if size >= MIN_FIT_BYTES]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else None
+
+def run_case(function, corpus, sizes, args):
+    """{"runs": {size: {seconds, peak_bytes}}, "exponent", "skipped"} of one case"""
+    runs = {}
+    skipped = []
+    rng = random.Random(1)
+    for size in sizes:
+        if runs:
+            # Skip a size the case would need too long for, from its worst scaling so far
+            last_size, last = max((int(s), run) for s, run in runs.items())
+            slope = max(1.0, exponent([(int(s), run["seconds"]) for s, run in runs.items()]) or 1.0)
+            if last["seconds"] * (size / last_size) ** slope > args.max_seconds:
+                skipped.append(size)
+                continue
+        value = corpus(size, rng)
+        seconds = timed(function, value, args.min_seconds)
+        runs[str(size)] = {"seconds": seconds, "peak_bytes": peak_memory(function, value) if size <= args.max_traced_bytes else None}
+        del value
+        if seconds > args.max_seconds:
+            skipped.extend(larger for larger in sizes if larger > size)
+            break
+    return {"runs": runs, "exponent": exponent([(int(size), run["seconds"]) for size, run in runs.items()]), "skipped": skipped}
+
+def flags(results, args):
+    """What in the results is superlinear or slow enough to be a backtracking blowup"""
+    found = []
+    for name, result in results.items():
+        if result["exponent"] is not None and result["exponent"] > args.max_exponent:
+            found.append(f"{name}: time grows as size^{result['exponent']:.2f} (over {args.max_exponent})")
+        for size, run in result["runs"].items():
+            if run["seconds"] > args.max_seconds:
+                found.append(f"{name}: {run['seconds']:.1f}s on {format_size(int(size))} (over {args.max_seconds:g}s)")
+        if result["skipped"]:
+            found.append(f"{name}: skipped {', '.join(format_size(size) for size in result['skipped'])}, projected over {args.max_seconds:g}s")
+    return found
+
+def regressions(results, baseline, args):
+    """What in the results is worse than the baseline by more than the tolerances"""
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["exponent"] is not None and before["exponent"] is not None and \
+                result["exponent"] > before["exponent"] + args.exponent_tolerance:
+            found.append(f"{name}: scales as size^{result['exponent']:.2f}, was size^{before['exponent']:.2f}")
+        for size, run in result["runs"].items():
+            was = before["runs"].get(size)
+            if was is None:
+                continue
+            if run["seconds"] > was["seconds"] * (1 + args.time_tolerance) and run["seconds"] - was["seconds"] > args.time_floor:
+                found.append(f"{name} at {format_size(int(size))}: {run['seconds'] * 1000:.2f} ms, was {was['seconds'] * 1000:.2f} ms")
+            if run["peak_bytes"] and was["peak_bytes"] and run["peak_bytes"] > was["peak_bytes"] * (1 + args.memory_tolerance) \
+                    and run["peak_bytes"] - was["peak_bytes"] > 64 * 1024:
+                found.append(f"{name} at {format_size(int(size))}: peak {format_size(run['peak_bytes'])}, was {format_size(was['peak_bytes'])}")
+    return found
+
+def results_at(ref, args):
+    """The results of this benchmark on the parsers as of git ref"""
+    with tempfile.TemporaryDirectory() as directory:
+        tree = os.path.join(directory, "tree")
+        subprocess.run(["git", "worktree", "add", "--detach", "--quiet", tree, ref], cwd=ROOT, check=True)
+        try:
+            # This version of the benchmark, so both sides run the same cases
+            script = os.path.join(tree, "benchmarks", os.path.basename(__file__))
+            os.makedirs(os.path.dirname(script), exist_ok=True)
+            shutil.copy(os.path.abspath(__file__), script)
+            output = os.path.join(directory, "results.json")
+            command = [sys.executable, script, "--save-baseline", output, "--sizes", args.sizes,
+                       "--min-seconds", str(args.min_seconds), "--max-seconds", str(args.max_seconds),
+                       "--max-exponent", str(args.max_exponent), "--max-traced-bytes", str(args.max_traced_bytes)]
+            # Flags in the ref's own run are not this tree's to report
+            subprocess.run(command + (["--only", args.only] if args.only else []))
+            if not os.path.exists(output):
+                sys.exit(f"The benchmark did not run on {ref}")
+            with open(output, encoding="utf-8") as f:
+                return json.load(f)["results"]
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=ROOT, check=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1K,10K,100K,1M,10M", help="comma-separated input sizes")
+    parser.add_argument("--only", help="comma-separated parsers to run, of: " + ", ".join(CASES))
+    parser.add_argument("--min-seconds", type=float, default=0.2, help="time spent repeating each run")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="flag a run taking longer than this")
+    parser.add_argument("--max-exponent", type=float, default=1.3, help="flag time growing faster than size to this power")
+    parser.add_argument("--max-traced-bytes", type=parse_size, default=UNITS["M"] * 10,
+                        help="largest input to measure peak memory on (tracing is slow)")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    against = parser.add_mutually_exclusive_group()
+    against.add_argument("--baseline", help="compare against the results in this JSON file")
+    against.add_argument("--compare", metavar="REF", help="compare against the parsers at this git ref, run first on this machine")
+    # Separate processes of the same code differ by up to about 2x on this harness
+    parser.add_argument("--time-tolerance", type=float, default=1.5, help="flag runs slower than the baseline by this fraction")
+    parser.add_argument("--time-floor", type=float, default=0.01, help="and by more than this many seconds")
+    parser.add_argument("--memory-tolerance", type=float, default=0.5, help="flag runs using this fraction more memory than the baseline")
+    parser.add_argument("--exponent-tolerance", type=float, default=0.25, help="flag exponents this much over the baseline's")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        print(f"Parsers at {args.compare}:")
+        baseline = results_at(args.compare, args)
+        print("\nThis tree:")
+    elif args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    sizes = sorted(parse_size(size) for size in args.sizes.split(","))
+    selected = args.only.split(",") if args.only else list(CASES)
+    results = {}
+    for group in selected:
+        for case, function, corpus in CASES[group]:
+            name = f"{group}/{case}"
+            result = run_case(function, corpus, sizes, args)
+            results[name] = result
+            cells = []
+            for size, run in result["runs"].items():
+                peak = format_size(run["peak_bytes"]) if run["peak_bytes"] is not None else "-"
+                cells.append(f"{format_size(int(size))}: {run['seconds'] * 1000:.2f} ms ({int(size) / run['seconds'] / UNITS['M']:.0f} MB/s, peak {peak})")
+            scaling = f"size^{result['exponent']:.2f}" if result["exponent"] is not None else "-"
+            print(f"{name:34} {scaling:10} " + "   ".join(cells))
+
+    found = flags(results, args)
+    if baseline is not None:
+        found += regressions(results, baseline, args)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"sizes": sizes, "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+    for line in found:
+        print(f"[REGRESSION] {line}")
+    sys.exit(1 if found else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Proposal preprocessing: tokens saved and time taken per proposal.
+
+Runs prepare_proposal over the proposals in --corpus and over pasted
+applications built from them (--copies of each, with the form's question
+headers, repeated answers, stray whitespace and zero-width characters that
+copying from a web form or PDF leaves behind), reporting tokens before and
+after normalization and deduplication, after truncation to --max-tokens, and
+p50/p99 preprocessing time per proposal.
+
+Token counts use the --tokenizer encoding if tiktoken can load it, else the
+built-in estimate.
+
+Usage:
+    python benchmarks/preprocess_benchmark.py [--corpus benchmarks/proposals.jsonl] [--max-tokens 8000] [--tokenizer cl100k_base]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proposal_text import TokenCounter, prepare_proposal
+
+QUESTIONS = [
+        "1. Describe the problem you are solving and who has it. (Max 500 words)",
+        "2. What is your solution and why is it better than existing alternatives? (Max 500 words)",
+        "3. Who is on your team and what relevant experience do they have? (Max 300 words)",
+        "4. How will you make money, and how large is the market? (Max 300 words)"
+        ]
+
+def pasted_application(proposal, rng):
+    """The proposal as pasted from an application form: one answer per question, some answers
+    repeated under later questions, with padding and invisible characters"""
+    paragraphs = [p for p in proposal.split("\n\n") if p.strip()]
+    blocks = []
+    for n, question in enumerate(QUESTIONS):
+        answer = paragraphs[n % len(paragraphs)]
+        if n and rng.random() < 0.5:
+            # "See above": the applicant pasted the same long answer again
+            answer = paragraphs[0] + "\n" + answer
+        blocks.append(f"{question}\r\n\u200b   {answer.replace(' ', '  ', 5)}   \r\n")
+    return "\r\n\r\n\r\n".join(blocks) + "\r\n" + " " * 40
+
+def percentile_ms(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000 if len(values) > 1 else values[0] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "proposals.jsonl"))
+    parser.add_argument("--copies", type=int, default=20, help="pasted applications built from each proposal")
+    parser.add_argument("--max-tokens", type=int, default=8000)
+    parser.add_argument("--tokenizer", default="cl100k_base")
+    args = parser.parse_args()
+
+    counter = TokenCounter(args.tokenizer)
+    counter.start()
+    with open(args.corpus, encoding="utf-8") as f:
+        proposals = [json.loads(line)["proposal"] for line in f if line.strip()]
+    rng = random.Random(1)
+    inputs = {
+            "corpus": proposals,
+            "pasted": [pasted_application(p, rng) for p in proposals for _ in range(args.copies)],
+            # Long enough that the budget applies: the corpus many times over, every paragraph distinct
+            "oversized": ["\n\n".join(f"Part {n}: {paragraph}" for n, paragraph in enumerate(
+                    paragraph for p in proposals * args.copies for paragraph in p.split("\n\n")))]
+            }
+    print(f"tokenizer {counter.name}, budget {args.max_tokens} tokens")
+    for name, texts in inputs.items():
+        times, stats = [], []
+        for text in texts:
+            start = time.perf_counter()
+            prepared = prepare_proposal(text, counter, args.max_tokens)
+            times.append(time.perf_counter() - start)
+            stats.append(prepared.stats)
+        original = sum(s["original_tokens"] for s in stats)
+        normalized = sum(s["normalized_tokens"] for s in stats)
+        sent = sum(s["tokens"] for s in stats)
+        print(f"{name:10} {len(texts):4} x {original / len(texts):8.0f} tokens: normalized and deduplicated {1 - normalized / original:6.1%} fewer, "
+              f"sent {1 - sent / original:6.1%} fewer; {sum(s['duplicates_removed'] for s in stats)} duplicates removed, "
+              f"{sum(s['truncated_blocks'] for s in stats)} blocks cut; p50 {percentile_ms(times, 50):.2f} ms p99 {percentile_ms(times, 99):.2f} ms")
+
+if __name__ == "__main__":
+    main()
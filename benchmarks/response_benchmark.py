@@ -0,0 +1,109 @@
+"""/research response size and encoding time, before and after slimming.
+
+Builds agent transcripts like the deep-research Space's (--steps steps, each
+a step marker, execution logs with the code the agent ran and the pages it
+read, and a task outcome, then a long final report), parses them into the
+/research response, and reports bytes and encoding time per response for:
+
+  jsonify       the full response with Flask's JSON provider, uncompressed (before)
+  full          the full response with the app's encoder
+  default       raw_result left out, as /research now answers by default
+  default gzip  the same, gzip-compressed
+  default br    the same, brotli-compressed (needs the brotli package)
+  projected     ?fields=parsed_result.final_answer,search_links, brotli-compressed
+
+Usage:
+    python benchmarks/response_benchmark.py [--steps 5,20,60] [--page-kb 16] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from response_encoding import ResponseEncoder, brotli, dumps, orjson, project
+from response_parser import parse_agent_response
+
+# A vocabulary about the size of a page's, with Zipf-like word frequencies, so the text compresses like prose
+VOCABULARY = ["".join(random.Random(n).choices("etaoinshrdlucmfwypvbgkqjxz", k=random.Random(-n).randint(2, 11))) for n in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+def sentences(rng, n):
+    return " ".join(" ".join(rng.choices(VOCABULARY, WEIGHTS, k=rng.randint(8, 20))).capitalize() + "." for _ in range(n))
+
+def transcript(steps, page_kb, rng):
+    """Chatbot messages of one research run, as /interact_with_agent_1 returns them"""
+    messages = [{"role": "user", "content": "There is a startup idea: ...", "metadata": {}}]
+    for step in range(1, steps + 1):
+        links = [f"https://example.org/{rng.choice(VOCABULARY)}/{step}-{n}?utm_source=search&ref={rng.getrandbits(32):x}" for n in range(5)]
+        code = f"results = web_search(query=\"{' '.join(rng.choices(VOCABULARY, k=4))}\")\nprint(results)"
+        page = sentences(rng, page_kb * 1024 // 90)
+        messages += [
+                {"role": "assistant", "content": f"**Step {step}**", "metadata": {}},
+                {"role": "assistant", "content": f"```python\n{code}\n```", "metadata": {"title": "🛠️ Used tool python_interpreter"}},
+                {"role": "assistant", "content": "Execution logs:\n" + "\n".join(f"[{n}] {link}\n{page[n::5][:400]}" for n, link in enumerate(links))
+                 + "\n" + page, "metadata": {"title": "📝 Execution Logs"}},
+                {"role": "assistant", "content": (
+                    "### 1. Task outcome (short version):\n" + sentences(rng, 2)
+                    + "\n\n### 2. Task outcome (extremely detailed version):\n**Findings.** " + sentences(rng, 25)
+                    + "\n\n### 3. Additional context (if relevant):\n" + sentences(rng, 3)
+                    ), "metadata": {}},
+                {"role": "assistant", "content": f'<span style="color: #bbbbc2; font-size: 12px;">Step {step} | Input tokens: 12,345 | Output tokens: 678</span>',
+                 "metadata": {}}
+                ]
+    report = "\\n\\n".join(f"## Section {n}\\n{sentences(rng, 30)}" for n in range(8))
+    messages.append({"role": "assistant", "content": f"**Final answer:** {{'novelty_score': 64, 'report': '{report}'}}", "metadata": {}})
+    return messages
+
+def timed(encode, repeat):
+    """(bytes, seconds) of the fastest of repeat runs"""
+    best, size = None, 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(encode())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", default="5,20,60", help="comma-separated agent steps per transcript")
+    parser.add_argument("--page-kb", type=int, default=16, help="KB of page text per execution log")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    flask_json = Flask(__name__).json
+    encoder = ResponseEncoder()
+    rng = random.Random(1)
+    print(f"encoder: {'orjson' if orjson is not None else 'json'}, brotli: {'yes' if brotli is not None else 'no'}")
+    for steps in (int(n) for n in args.steps.split(",")):
+        messages = transcript(steps, args.page_kb, rng)
+        response = {
+                "execution_time": "312.45 seconds",
+                "raw_result": messages,
+                "parsed_result": parse_agent_response(messages),
+                "reused": None
+                }
+        default = {key: value for key, value in response.items() if key != "raw_result"}
+        projected = project(response, ["parsed_result.final_answer", "search_links"], fallback="parsed_result")
+        variants = {
+                "jsonify": lambda: flask_json.dumps(response).encode("utf-8"),
+                "full": lambda: dumps(response),
+                "default": lambda: dumps(default),
+                "default gzip": lambda: encoder.compress(dumps(default), "gzip")
+                }
+        if brotli is not None:
+            variants["default br"] = lambda: encoder.compress(dumps(default), "br")
+        variants["projected"] = lambda: encoder.compress(dumps(projected), "br" if brotli is not None else "gzip")
+        results = {name: timed(encode, args.repeat) for name, encode in variants.items()}
+        before_size, before_time = results["jsonify"]
+        print(f"\n{steps} steps, {len(messages)} messages")
+        for name, (size, seconds) in results.items():
+            print(f"  {name:13} {size / 1024:9.1f} KB ({size / before_size:6.1%})  {seconds * 1000:8.2f} ms ({seconds / before_time:6.1%})")
+
+if __name__ == "__main__":
+    main()
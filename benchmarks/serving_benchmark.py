@@ -0,0 +1,148 @@
+"""Compare the sync Flask deployment with the async (ASGI) serving mode.
+
+Both servers run on this machine with the same number of worker processes and
+talk to the local DeepSeek stub (stub_upstreams.py), so the only difference is
+how a worker waits on upstream streams:
+
+  sync     gunicorn app:app (sync workers, one request per worker at a time)
+  async    uvicorn asgi_app:app (every request is a coroutine)
+
+Each run sends --requests POST /evaluate calls with unique proposals (no cache
+hits) from --concurrency concurrent clients and reports throughput, latency
+percentiles and the peak number of upstream streams the stub saw at once.
+
+Usage:
+    python benchmarks/serving_benchmark.py [--workers 1] [--concurrency 200] [--requests 400]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_PORT = 8100
+APP_PORT = 8101
+
+def server_commands(workers):
+    return {
+            "sync": [sys.executable, "-m", "gunicorn", "app:app", "-w", str(workers), "-b", f"127.0.0.1:{APP_PORT}",
+                     "--timeout", "600", "--backlog", "4096", "--log-level", "warning"],
+            "async": [sys.executable, "-m", "uvicorn", "asgi_app:app", "--workers", str(workers), "--host", "127.0.0.1",
+                      "--port", str(APP_PORT), "--backlog", "4096", "--timeout-keep-alive", "75", "--log-level", "warning"]
+            }
+
+def isolated_env(state_dir, **overrides):
+    """os.environ for a spawned server with every file the app writes (caches, indexes,
+    history, artifacts, job and rate-limit state) under state_dir, plus the overrides"""
+    return dict(os.environ,
+                RESULT_CACHE_DIR=os.path.join(state_dir, "results"),
+                RATE_LIMIT_STATE=os.path.join(state_dir, "rate_limit.json"),
+                RESEARCH_JOB_DIR=os.path.join(state_dir, "jobs"),
+                SPACE_CONFIG_CACHE=os.path.join(state_dir, "space_config.json"),
+                REASONING_TRACE_DIR=os.path.join(state_dir, "reasoning"),
+                SIMILARITY_INDEX_PATH=os.path.join(state_dir, "similar_proposals.db"),
+                HISTORY_DB_PATH=os.path.join(state_dir, "history.db"),
+                ARTIFACT_DIR=os.path.join(state_dir, "artifacts"),
+                **overrides)
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+async def drive(concurrency, total, run_id):
+    latencies = []
+    errors = {}
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=600, limits=limits) as http:
+        async def client():
+            for n in counter:
+                start = time.perf_counter()
+                try:
+                    response = await http.post("/evaluate", json={"proposal": f"Benchmark proposal {run_id}-{n}"})
+                    response.raise_for_status()
+                    if response.json().get("score_criteria1") is None:
+                        raise ValueError("unparsed response")
+                except Exception as e:
+                    name = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+                    errors[name] = errors.get(name, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for both servers")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--chunks", type=int, default=60, help="stub chunks per completion")
+    parser.add_argument("--delay", type=float, default=0.05, help="stub seconds between chunks")
+    parser.add_argument("--modes", default="sync,async")
+    args = parser.parse_args()
+
+    stub = subprocess.Popen([sys.executable, os.path.join(ROOT, "benchmarks", "stub_upstreams.py"), "--port", str(STUB_PORT),
+                             "--chunks", str(args.chunks), "--delay", str(args.delay)])
+    try:
+        wait_until_up(f"http://127.0.0.1:{STUB_PORT}/stats", stub)
+        print(f"{args.workers} worker(s), {args.concurrency} concurrent clients, {args.requests} requests, "
+              f"upstream stream ~{args.chunks * args.delay:.1f}s")
+        for mode in args.modes.split(","):
+            state_dir = tempfile.mkdtemp(prefix=f"serving-bench-{mode}-")
+            env = isolated_env(state_dir,
+                               DEEPSEEK_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+                               DEEPSEEK_API_KEY="benchmark",
+                               DEEPSEEK_RPS="0",
+                               DEEPSEEK_TPM="0",
+                               WEB_CONCURRENCY=str(args.workers),
+                               HF_TOKEN="")
+            server = subprocess.Popen(server_commands(args.workers)[mode], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+            try:
+                wait_until_up(f"http://127.0.0.1:{APP_PORT}/", server)
+                before = httpx.get(f"http://127.0.0.1:{STUB_PORT}/stats").json()
+                latencies, errors, elapsed = asyncio.run(drive(args.concurrency, args.requests, f"{mode}-{time.time()}"))
+                after = httpx.get(f"http://127.0.0.1:{STUB_PORT}/stats").json()
+            finally:
+                stop(server)
+                shutil.rmtree(state_dir, ignore_errors=True)
+            print(f"{mode:<6} {len(latencies) / elapsed:8.1f} req/s   p50 {percentile(latencies, 50):7.2f}s   "
+                  f"p95 {percentile(latencies, 95):7.2f}s   p99 {percentile(latencies, 99):7.2f}s   "
+                  f"errors {sum(errors.values())} {errors or ''}   upstream streams {after['total'] - before['total']} (peak concurrent {after['peak']})")
+            # Reset the peak between modes
+            httpx.post(f"http://127.0.0.1:{STUB_PORT}/stats/reset")
+    finally:
+        stop(stub)
+
+if __name__ == "__main__":
+    main()
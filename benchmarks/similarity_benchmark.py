@@ -0,0 +1,85 @@
+"""Near-duplicate index: insert rate, lookup latency and match quality at scale.
+
+Fills a throwaway SimilarityIndex with --entries synthetic proposals, then
+times --lookups lookups of unrelated proposals (the common case: a miss) and
+of lightly edited copies of stored ones, reporting p50/p99 latency with and
+without computing the query's signature, the share of edited copies found
+and the share of unrelated proposals wrongly matched.
+
+Usage:
+    python benchmarks/similarity_benchmark.py [--entries 100000] [--lookups 1000] [--threshold 0.85]
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity_index import SimilarityIndex, signature
+
+def percentile_ms(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=250, help="words per proposal")
+    parser.add_argument("--edit-every", type=int, default=50, help="edited copies change one word in this many")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = [f"word{n}" for n in range(20000)]
+
+    def proposal():
+        return " ".join(rng.choice(vocabulary) for _ in range(args.words))
+
+    directory = tempfile.mkdtemp(prefix="similarity-bench-")
+    try:
+        index = SimilarityIndex(os.path.join(directory, "index.db"), max_entries=args.entries + args.lookups)
+        stored = []
+        start = time.perf_counter()
+        for n in range(args.entries):
+            text = proposal()
+            index.add("bench", text, f"result-{n}")
+            if n < args.lookups:
+                stored.append((text, f"result-{n}"))
+        insert_seconds = time.perf_counter() - start
+
+        misses, hits, signing = [], [], []
+        false_matches = found = 0
+        for text, key in stored:
+            query = proposal()
+            start = time.perf_counter()
+            signature(query)
+            signing.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            false_matches += bool(index.lookup("bench", query, args.threshold))
+            misses.append(time.perf_counter() - start)
+
+            words = text.split()
+            for n in range(0, len(words), args.edit_every):
+                words[n] = rng.choice(vocabulary)
+            start = time.perf_counter()
+            matches = index.lookup("bench", " ".join(words), args.threshold)
+            hits.append(time.perf_counter() - start)
+            found += any(match.result_key == key for match in matches)
+
+        size = os.path.getsize(os.path.join(directory, "index.db")) / 1024 / 1024
+        print(f"{args.entries} entries of {args.words} words: {args.entries / insert_seconds:.0f} inserts/s, {size:.1f} MB on disk")
+        print(f"lookup, unrelated     p50 {percentile_ms(misses, 50):.3f} ms   p99 {percentile_ms(misses, 99):.3f} ms")
+        print(f"lookup, near-dup      p50 {percentile_ms(hits, 50):.3f} ms   p99 {percentile_ms(hits, 99):.3f} ms")
+        print(f"  of which signature  p50 {percentile_ms(signing, 50):.3f} ms")
+        print(f"near-duplicates found {found / len(stored):.1%} (1 word in {args.edit_every} changed), "
+              f"unrelated matched {false_matches / len(stored):.1%} at threshold {args.threshold}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare worker boot time of the old eager startup with the lazy Space connection.
+
+Each scenario runs in a fresh interpreter, as a gunicorn worker would:
+
+  eager        import the app's dependencies, then build gradio Client(...) synchronously
+               (what importing app.py used to do before the worker could bind)
+  lazy-cold    import app.py with no cached Space config
+  lazy-warm    import app.py with the Space config cached by a previous boot
+
+"bind" is the time until the module is imported and the worker can accept
+requests; "research ready" is the time until the Space client is usable.
+
+Usage:
+    HF_TOKEN=... python benchmarks/startup_benchmark.py [--runs 5] [--space NAME_OR_URL]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from serving_benchmark import ROOT, isolated_env
+
+EAGER = r"""
+import json, sys, time
+start = time.perf_counter()
+import flask, flask_cors, openai, httpx, tenacity, dotenv, psutil
+from gradio_client import Client
+sys.path.insert(0, ROOT)
+from hf_space import TOKEN_ARGUMENT
+try:
+    Client(SPACE, **{TOKEN_ARGUMENT: TOKEN})
+    ok = True
+except Exception as e:
+    ok = False
+ready = time.perf_counter() - start
+print(json.dumps({"bind": ready, "research_ready": ready if ok else None}))
+"""
+
+LAZY = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, ROOT)
+import app
+bind = time.perf_counter() - start
+app.space.get(timeout=120)
+ready = time.perf_counter() - start
+print(json.dumps({"bind": bind, "research_ready": ready if app.space.status()["ready"] else None, "from_cache": app.space.from_cache}))
+"""
+
+def run(snippet, env):
+    code = f"ROOT = {ROOT!r}\nSPACE = {env['BENCH_SPACE']!r}\nTOKEN = {env.get('HF_TOKEN')!r}\n" + snippet
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True, timeout=300)
+    lines = [line for line in out.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(lines[-1])
+
+def summarize(name, samples):
+    binds = [s["bind"] for s in samples]
+    readies = [s["research_ready"] for s in samples if s["research_ready"] is not None]
+    ready = f"{statistics.median(readies):8.3f}s" if readies else "  failed"
+    print(f"{name:<12} bind p50 {statistics.median(binds):8.3f}s   research ready p50 {ready}   ({len(readies)}/{len(samples)} connected)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--space", default="MaoShen/Moonshot_DeepResearch")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="startup-bench-")
+    env = isolated_env(cache_dir, BENCH_SPACE=args.space)
+    cache_path = env["SPACE_CONFIG_CACHE"]
+    env.setdefault("DEEPSEEK_API_KEY", "benchmark")
+
+    eager = [run(EAGER, env) for _ in range(args.runs)]
+    cold = []
+    for _ in range(args.runs):
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        cold.append(run(LAZY, env))
+    warm = [run(LAZY, env) for _ in range(args.runs)]
+
+    summarize("eager", eager)
+    summarize("lazy-cold", cold)
+    summarize("lazy-warm", warm)
+    if not any(s.get("from_cache") for s in warm):
+        print("note: no warm run used the cached config (the Space never connected, so nothing was cached)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Local stand-in for the Moonshot_DeepResearch Gradio Space, for load tests and benchmarks.
+
+Serves the two endpoints app.py calls through gradio_client:
+
+  /log_user_message       returns the prompt it was given, after --log-delay seconds
+  /interact_with_agent_1  streams a research run as chatbot messages (steps,
+                          execution logs with links, then a final answer in the
+                          format parse_agent_response expects), --steps steps of
+                          --step-delay seconds each
+
+--error-rate makes a call fail with a Space error, --stall-rate makes it take
+--stall-seconds longer. Needs the gradio package (see benchmarks/requirements.txt).
+
+Usage:
+    python benchmarks/stub_space.py [--port 8102] [--steps 3] [--step-delay 1.0]
+
+then point the app at it with HF_SPACE=http://127.0.0.1:8102/ and any HF_TOKEN.
+"""
+import argparse
+import random
+import threading
+import time
+from typing import Iterator
+
+import gradio as gr
+
+def agent_messages(prompt, steps, links_per_step=3):
+    """The chatbot messages of one research run, in the order the agent emits them"""
+    messages = [{"role": "user", "content": prompt, "metadata": {}}]
+    for step in range(1, steps + 1):
+        links = " ".join(f"https://example.org/paper/{step}-{n}" for n in range(links_per_step))
+        messages += [
+                {"role": "assistant", "content": f"**Step {step}**", "metadata": {}},
+                {"role": "assistant", "content": f"Searching for related work: {links}",
+                 "metadata": {"title": "📝 Execution Logs"}},
+                {"role": "assistant", "content": (
+                    "### 1. Task outcome (short version):\nRelated work found.\n\n"
+                    "### 2. Task outcome (extremely detailed version):\n"
+                    + "**Finding.** " + "Prior work covers part of the proposal. " * 20
+                    + "\n\n### 3. Additional context (if relevant):\nNone."
+                    ), "metadata": {}}
+                ]
+    report = "\\n".join(["## Summary", "The proposal is partly novel. " * 10, "## Related work", "See the links above."])
+    messages.append({"role": "assistant", "content": f"**Final answer:** {{'novelty_score': 72, 'report': '{report}'}}",
+                     "metadata": {}})
+    return messages
+
+class SpaceStub:
+    """The stub's endpoint functions plus the fault settings they share"""
+
+    def __init__(self, steps=3, step_delay=1.0, log_delay=0.1, error_rate=0.0, stall_rate=0.0, stall_seconds=30.0, seed=None):
+        self.steps = steps
+        self.step_delay = step_delay
+        self.log_delay = log_delay
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.random = random.Random(seed)
+        self.active = 0
+        self.peak = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def _begin(self):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.total += 1
+            fail = self.random.random() < self.error_rate
+            stall = self.random.random() < self.stall_rate
+        if stall:
+            time.sleep(self.stall_seconds)
+        if fail:
+            raise gr.Error("Injected Space failure")
+
+    def _end(self):
+        with self._lock:
+            self.active -= 1
+
+    def log_user_message(self, text_input: str) -> str:
+        try:
+            self._begin()
+            time.sleep(self.log_delay)
+            return text_input
+        finally:
+            self._end()
+
+    def interact_with_agent(self, messages: list) -> Iterator[list]:
+        try:
+            self._begin()
+            prompt = messages[-1]["content"] if messages else ""
+            transcript = agent_messages(prompt, self.steps)
+            # One update per step, like the chatbot streaming the agent's progress
+            per_step = (len(transcript) - 2) // max(1, self.steps)
+            for step in range(self.steps):
+                time.sleep(self.step_delay)
+                yield transcript[:1 + per_step * (step + 1)]
+            yield transcript
+        finally:
+            self._end()
+
+    def stats(self) -> dict:
+        return {"active": self.active, "peak": self.peak, "total": self.total}
+
+def build_demo(stub, concurrency_limit=None):
+    with gr.Blocks() as demo:
+        gr.api(stub.log_user_message, api_name="log_user_message", concurrency_limit=concurrency_limit)
+        gr.api(stub.interact_with_agent, api_name="interact_with_agent_1", concurrency_limit=concurrency_limit)
+        gr.api(stub.stats, api_name="stats")
+    return demo
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--steps", type=int, default=3, help="agent steps per research run")
+    parser.add_argument("--step-delay", type=float, default=1.0, help="seconds per agent step")
+    parser.add_argument("--log-delay", type=float, default=0.1, help="seconds /log_user_message takes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="fraction of calls that stall")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--concurrency", type=int, default=1000, help="calls each endpoint runs at once")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stub = SpaceStub(args.steps, args.step_delay, args.log_delay, args.error_rate, args.stall_rate, args.stall_seconds, args.seed)
+    demo = build_demo(stub, args.concurrency)
+    demo.queue(default_concurrency_limit=args.concurrency, max_size=None)
+    demo.launch(server_name=args.host, server_port=args.port, max_threads=args.concurrency, show_error=True, quiet=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Local stand-in for the DeepSeek chat completions API, for load tests and benchmarks.
+
+POST /chat/completions streams a well-formed evaluation as OpenAI-style SSE
+chunks: reasoning_content deltas first, then the criteria answer, with a fixed
+delay between chunks (or a delay sized to --tokens-per-second) so every request
+holds its connection like a real deepseek-reasoner stream. --words and
+--reasoning-words set how long the answer and the reasoning are. A request
+asking to "Evaluate only Criteria N" (the parallel evaluation mode) gets the
+same reasoning and an answer for that criterion alone.
+
+Faults are injected per request with the given probabilities:
+
+  --error-rate       500 before streaming
+  --rate-limit-rate  429 with Retry-After before streaming
+  --disconnect-rate  connection dropped halfway through the stream
+  --stall-rate       --stall-seconds of silence before the first chunk
+
+--max-streams-per-key answers 429 to a key that already has that many streams
+open, like a provider's per-key concurrency limit. GET /models serves health
+probes. GET /stats returns concurrent, peak and total streams, injected fault
+counts and streams per API key.
+
+Usage:
+    python benchmarks/stub_upstreams.py [--port 8100] [--chunks 60] [--delay 0.05]
+
+then point the app at it with DEEPSEEK_BASE_URL=http://127.0.0.1:8100.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+
+CRITERION_REQUEST = re.compile(rb"Evaluate only Criteria (\d)")
+
+def evaluation_text(words=40, criteria=range(1, 7)):
+    """An answer in the exact format the evaluation prompt asks for, covering the given criteria"""
+    filler = " ".join(["lorem"] * words)
+    lines = []
+    for n in criteria:
+        lines += [
+                f"The score of criteria{n}: {40 + 5 * n} ",
+                f"Detailed reasoning{n}: {filler} ",
+                f"Summary reasoning criteria{n}: {filler} ",
+                f"Improvement suggestion criteria{n}: {filler} "
+                ]
+    lines += ["", "--- Evaluation Details End ---", "", "<chain_of_thought>"]
+    for part in ["introduction"] + [f"criteria{n}" for n in criteria] + ["conclusion"]:
+        lines.append(f"    <{part}>{filler}</{part}>")
+    lines.append("</chain_of_thought>")
+    return "\n".join(lines)
+
+def split(text, parts):
+    size = max(1, -(-len(text) // parts))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def _chunk(completion_id, field, text):
+    return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": "deepseek-reasoner",
+            "choices": [{"index": 0, "delta": {field: text}, "finish_reason": None}]
+            }
+
+class InjectedDisconnect(Exception):
+    """Raised mid-stream so the server drops the connection"""
+
+class _QuietDisconnects(logging.Filter):
+    def filter(self, record):
+        return not (record.exc_info and isinstance(record.exc_info[1], InjectedDisconnect))
+
+class DeepSeekStub:
+    """ASGI app serving streamed completions; counts concurrent and total requests"""
+
+    def __init__(self, chunks=60, delay=0.05, reasoning_chunks=None, words=40, reasoning_words=80, tokens_per_second=None,
+                 error_rate=0.0, rate_limit_rate=0.0, disconnect_rate=0.0, stall_rate=0.0, stall_seconds=30.0, seed=None,
+                 max_streams_per_key=0):
+        self.delay = delay
+        self.tokens_per_second = tokens_per_second
+        reasoning_chunks = reasoning_chunks if reasoning_chunks is not None else chunks // 3
+        reasoning = "Thinking about the proposal. " * max(1, reasoning_words // 4)
+        self.reasoning = split(reasoning, reasoning_chunks) if reasoning_chunks else []
+        self.content = split(evaluation_text(words), max(1, chunks - reasoning_chunks))
+        self.criterion_content = {
+                n: split(evaluation_text(words, [n]), max(1, (chunks - reasoning_chunks) // 6))
+                for n in range(1, 7)
+                }
+        self.faults = [
+                ("error", error_rate),
+                ("rate_limit", rate_limit_rate),
+                ("disconnect", disconnect_rate),
+                ("stall", stall_rate)
+                ]
+        self.stall_seconds = stall_seconds
+        self.random = random.Random(seed)
+        self.injected = {name: 0 for name, _ in self.faults}
+        self.max_streams_per_key = max_streams_per_key
+        self.key_limited = 0
+        self.active_by_key = {}
+        self.total_by_key = {}
+        self.active = 0
+        self.peak = 0
+        self.total = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["path"].endswith("/stats/reset"):
+            self.peak = self.active
+        if "/stats" in scope["path"]:
+            await self._send_json(send, {"active": self.active, "peak": self.peak, "total": self.total, "faults": self.injected,
+                                         "key_limited": self.key_limited, "keys": self.total_by_key})
+            return
+        if scope["path"].endswith("/models"):
+            await self._send_json(send, {"object": "list", "data": [{"id": "deepseek-reasoner", "object": "model", "owned_by": "stub"}]})
+            return
+        if not scope["path"].endswith("/chat/completions"):
+            await self._send_json(send, {"error": "not found"}, status=404)
+            return
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+        criterion = CRITERION_REQUEST.search(body)
+        content = self.criterion_content[int(criterion.group(1))] if criterion else self.content
+        key = dict(scope["headers"]).get(b"authorization", b"").decode().removeprefix("Bearer ")
+        if self.max_streams_per_key and self.active_by_key.get(key, 0) >= self.max_streams_per_key:
+            self.key_limited += 1
+            await self._send_json(send, {"error": {"message": "Too many concurrent requests for this key", "type": "rate_limit_error"}},
+                                  status=429, headers=[(b"retry-after", b"1")])
+            return
+        fault = self._pick_fault()
+        if fault == "error":
+            await self._send_json(send, {"error": {"message": "Injected upstream error", "type": "server_error"}}, status=500)
+        elif fault == "rate_limit":
+            await self._send_json(send, {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}}, status=429,
+                                  headers=[(b"retry-after", b"1")])
+        else:
+            self.active_by_key[key] = self.active_by_key.get(key, 0) + 1
+            self.total_by_key[key] = self.total_by_key.get(key, 0) + 1
+            try:
+                await self._stream(send, content, fault)
+            finally:
+                self.active_by_key[key] -= 1
+
+    def _pick_fault(self):
+        roll = self.random.random()
+        for name, rate in self.faults:
+            if roll < rate:
+                self.injected[name] += 1
+                return name
+            roll -= rate
+        return None
+
+    def _chunk_delay(self, text):
+        if self.tokens_per_second:
+            # Roughly four characters per token
+            return max(1, len(text) / 4) / self.tokens_per_second
+        return self.delay
+
+    async def _stream(self, send, content, fault=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.total += 1
+        completion_id = f"stub-{self.total}"
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+                })
+            if fault == "stall":
+                await asyncio.sleep(self.stall_seconds)
+            pieces = [("reasoning_content", text) for text in self.reasoning] + [("content", text) for text in content]
+            for n, (field, text) in enumerate(pieces):
+                if fault == "disconnect" and n == len(pieces) // 2:
+                    raise InjectedDisconnect()
+                await asyncio.sleep(self._chunk_delay(text))
+                data = json.dumps(_chunk(completion_id, field, text))
+                await send({"type": "http.response.body", "body": f"data: {data}\n\n".encode(), "more_body": True})
+            await send({"type": "http.response.body", "body": b"data: [DONE]\n\n", "more_body": False})
+        finally:
+            self.active -= 1
+
+    async def _send_json(self, send, data, status=200, headers=()):
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json"), *headers]})
+        await send({"type": "http.response.body", "body": json.dumps(data).encode()})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chunks", type=int, default=60, help="chunks per completion")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between chunks")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="stream rate; overrides --delay")
+    parser.add_argument("--words", type=int, default=40, help="filler words per criterion field in the answer")
+    parser.add_argument("--reasoning-words", type=int, default=80, help="words of reasoning_content")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-streams-per-key", type=int, default=0, help="concurrent streams allowed per API key (0: no limit)")
+    args = parser.parse_args()
+
+    import uvicorn
+    stub = DeepSeekStub(
+            args.chunks,
+            args.delay,
+            words=args.words,
+            reasoning_words=args.reasoning_words,
+            tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            disconnect_rate=args.disconnect_rate,
+            stall_rate=args.stall_rate,
+            stall_seconds=args.stall_seconds,
+            seed=args.seed,
+            max_streams_per_key=args.max_streams_per_key
+            )
+    logging.getLogger("uvicorn.error").addFilter(_QuietDisconnects())
+    uvicorn.run(stub, host=args.host, port=args.port, log_level="warning", backlog=4096, timeout_keep_alive=75)
+
+if __name__ == "__main__":
+    main()
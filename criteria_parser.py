@@ -0,0 +1,290 @@
+import re
+
+CRITERIA_COUNT = 6
+THINK_SECTIONS = ['introduction', 'criteria1', 'criteria2', 'criteria3', 'criteria4', 'criteria5', 'criteria6', 'conclusion']
+
+# Key prefixes filled by each field label of the criteria block
+FIELD_LABELS = {
+        "the score of criteria": "score_criteria",
+        "detailed reasoning": "detailed_reasoning_criteria",
+        "summary reasoning criteria": "summary_reasoning_criteria",
+        "improvement suggestion criteria": "improvement_suggestion_criteria"
+        }
+
+# Text held back between feeds so a marker split across chunks is still found
+LOOKAHEAD = 40
+
+# Markers searched for in each parser state (labels are matched case-insensitively like the old regex)
+CRITERIA_MARKERS = re.compile(
+        r"\n(?i:(?P<label>the score of criteria|detailed reasoning|summary reasoning criteria|improvement suggestion criteria))"
+        r"|(?P<end>\n(?i:--- evaluation details end ---))"
+        r"|(?P<think><think>)"
+        r"|(?P<cot><chain_of_thought>)"
+        )
+THINK_MARKERS = re.compile(r"(?P<think_end></think>)")
+AFTER_END_MARKERS = re.compile(r"(?P<cot><chain_of_thought>)")
+COT_MARKERS = re.compile(
+        r"<(?P<section>" + "|".join(THINK_SECTIONS) + r")>"
+        r"|(?P<cot_end></chain_of_thought>)"
+        )
+SECTION_MARKERS = {
+        part: re.compile(rf"(?P<section_end></{part}>)|(?P<cot_end></chain_of_thought>)")
+        for part in THINK_SECTIONS
+        }
+
+# Suffixes that complete a field label: "<num>:" and, for scores, "<num>: <score>" (the score may
+# follow on a later line; without one the newline before the next label is left in place)
+SCORE_SUFFIX = re.compile(r"(\d+):(?:\s*+(\d++)|[ \t]*+)(?=\D)")
+FIELD_SUFFIX = re.compile(r"(\d+):[ \t]*")
+# A score label whose score may still be on its way
+SCORE_PENDING = re.compile(r"\d+:\s*\d*")
+
+class CriteriaStreamParser:
+    """Single-pass incremental parser for the criteria output format
+
+    Feed chunks as the stream produces them; each call returns the (key, value)
+    pairs completed by that chunk. Only LOOKAHEAD characters are held back
+    between calls. Missing or malformed sections are collected in `errors`.
+    """
+
+    def __init__(self):
+        self.results = {"think_section": None, "chain_of_thought": None}
+        self.results.update({part: None for part in THINK_SECTIONS})
+        self.errors = []
+        # The first label may open the text, so start as if after a newline
+        self._buffer = "\n"
+        self._state = "criteria"
+        self._key = None
+        self._value = []
+        self._section = None
+        self._cot = []
+        self._seen_end_marker = False
+        self._closed = False
+
+    def feed(self, text):
+        if self._closed:
+            raise ValueError("Parser already closed")
+        self._buffer += text
+        return self._process(final=False)
+
+    def close(self):
+        """Flush the remaining text and report anything missing or unterminated"""
+        if self._closed:
+            return []
+        self._buffer += "\n"
+        events = self._process(final=True)
+        events.extend(self._finish_field())
+        self._closed = True
+
+        if self._state == "think":
+            self.errors.append("Unterminated <think> section")
+        elif self._state == "section":
+            self.errors.append(f"Unterminated <{self._section}> section")
+            self.errors.append("Unterminated <chain_of_thought> section")
+        elif self._state == "cot":
+            self.errors.append("Unterminated <chain_of_thought> section")
+        if not self._seen_end_marker:
+            self.errors.append("Missing '--- Evaluation Details End ---' marker")
+
+        for num in range(1, CRITERIA_COUNT + 1):
+            for prefix in FIELD_LABELS.values():
+                if f"{prefix}{num}" not in self.results:
+                    self.errors.append(f"Missing {prefix}{num}")
+        if self.results["chain_of_thought"] is None and self._state in ("criteria", "after_end"):
+            self.errors.append("Missing <chain_of_thought> section")
+        elif self._state == "done":
+            for part in THINK_SECTIONS:
+                if self.results[part] is None:
+                    self.errors.append(f"Missing <{part}> section")
+        return events
+
+    def _process(self, final):
+        events = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            pattern = self._markers()
+            if pattern is None:
+                self._buffer = ""
+                return events
+            match = pattern.search(buffer, pos)
+            if not match:
+                keep = len(buffer) if final else max(pos, len(buffer) - LOOKAHEAD)
+                self._sink(buffer[pos:keep])
+                self._buffer = buffer[keep:]
+                return events
+            self._sink(buffer[pos:match.start()])
+            end = self._handle(match, events, final)
+            if end is None:
+                # The label suffix has not fully arrived yet
+                self._buffer = buffer[match.start():]
+                return events
+            pos = end
+
+    def _markers(self):
+        if self._state == "criteria":
+            return CRITERIA_MARKERS
+        if self._state == "think":
+            return THINK_MARKERS
+        if self._state == "after_end":
+            return AFTER_END_MARKERS
+        if self._state == "cot":
+            return COT_MARKERS
+        if self._state == "section":
+            return SECTION_MARKERS[self._section]
+        return None
+
+    def _sink(self, text):
+        if not text:
+            return
+        if self._state == "criteria" and self._key:
+            self._value.append(text)
+        elif self._state == "think":
+            self._value.append(text)
+        elif self._state == "cot":
+            self._cot.append(text)
+        elif self._state == "section":
+            self._cot.append(text)
+            self._value.append(text)
+
+    def _handle(self, match, events, final):
+        kind = match.lastgroup
+        if kind == "label":
+            return self._handle_label(match, events, final)
+
+        if kind == "end":
+            events.extend(self._finish_field())
+            self._seen_end_marker = True
+            self._state = "after_end"
+        elif kind == "think":
+            events.extend(self._finish_field())
+            self._state = "think"
+        elif kind == "think_end":
+            self._emit(events, "think_section", "".join(self._value).strip())
+            self._value = []
+            self._state = "criteria"
+        elif kind == "cot":
+            events.extend(self._finish_field())
+            self._state = "cot"
+        elif kind == "section":
+            self._cot.append(match.group(0))
+            self._section = match.group("section")
+            self._state = "section"
+        elif kind == "section_end":
+            self._cot.append(match.group(0))
+            if self.results[self._section] is not None:
+                self.errors.append(f"Duplicate <{self._section}> section")
+            else:
+                self._emit(events, self._section, "".join(self._value).strip())
+            self._value = []
+            self._section = None
+            self._state = "cot"
+        elif kind == "cot_end":
+            if self._state == "section":
+                self.errors.append(f"Unterminated <{self._section}> section")
+                self._value = []
+                self._section = None
+            self._emit(events, "chain_of_thought", "".join(self._cot).strip())
+            self._cot = []
+            self._state = "done"
+        return match.end()
+
+    def _handle_label(self, match, events, final):
+        prefix = FIELD_LABELS[match.group("label").lower()]
+        suffix_pattern = SCORE_SUFFIX if prefix == "score_criteria" else FIELD_SUFFIX
+        suffix = suffix_pattern.match(self._buffer, match.end())
+        rest = self._buffer[match.end():]
+        if not final and len(rest) < LOOKAHEAD and (
+                not suffix and "\n" not in rest
+                or prefix == "score_criteria" and SCORE_PENDING.fullmatch(rest)
+                ):
+            return None
+        if not suffix:
+            # Not a field label after all; keep the text in the current field
+            self._sink(match.group(0))
+            return match.end()
+
+        events.extend(self._finish_field())
+        num = suffix.group(1)
+        key = f"{prefix}{num}"
+        if key in self.results:
+            self.errors.append(f"Duplicate {key}")
+        elif prefix == "score_criteria":
+            if suffix.group(2):
+                self._emit(events, key, int(suffix.group(2)))
+            else:
+                self.errors.append(f"Invalid score for criteria{num}")
+        else:
+            self._key = key
+        return suffix.end()
+
+    def _finish_field(self):
+        if not self._key:
+            return []
+        events = []
+        value = "".join(self._value).strip()
+        if not value:
+            self.errors.append(f"Empty {self._key}")
+        self._emit(events, self._key, value)
+        self._key = None
+        self._value = []
+        return events
+
+    def _emit(self, events, key, value):
+        self.results[key] = value
+        events.append((key, value))
+
+def parse_criteria_output(text):
+    """Parse a complete criteria response in one pass, returning (results, errors)"""
+    parser = CriteriaStreamParser()
+    parser.feed(text)
+    parser.close()
+    return parser.results, parser.errors
+
+def extract_key_elements_as_variables(text: str) -> dict:
+    results, _ = parse_criteria_output(text)
+    extracted_variables = {key: value for key, value in results.items() if key not in THINK_SECTIONS}
+    return extracted_variables
+
+def extract_think_parts(text: str) -> dict:
+    results, _ = parse_criteria_output(text)
+    think_parts = {part: results[part] for part in ['chain_of_thought'] + THINK_SECTIONS}
+    return think_parts
+
+def merge_criteria_outputs(outputs):
+    """Rebuild one response in the full six-criteria format from single-criterion responses
+
+    outputs maps criterion numbers to the text of a response that evaluated that
+    criterion alone; numbers left out are reported as missing when the merged
+    text is parsed. The reasoning and conclusions are joined under a
+    "Criteria N:" heading each, and the introduction is the first response's.
+    """
+    think, fields, sections, conclusions = [], [], [], []
+    introduction = None
+    for num in sorted(outputs):
+        results, _ = parse_criteria_output(outputs[num])
+        if results["think_section"]:
+            think.append(f"Criteria {num}:\n{results['think_section']}")
+        for label, prefix in FIELD_LABELS.items():
+            value = results.get(f"{prefix}{num}")
+            if value is not None:
+                fields.append(f"{label.capitalize()}{num}: {value}")
+        section = results.get(f"criteria{num}")
+        if section is not None:
+            sections.append(f"<criteria{num}>{section}</criteria{num}>")
+        if introduction is None:
+            introduction = results["introduction"]
+        if results["conclusion"]:
+            conclusions.append(f"Criteria {num}: {results['conclusion']}")
+
+    cot = []
+    if introduction is not None:
+        cot.append(f"<introduction>{introduction}</introduction>")
+    cot.extend(sections)
+    if conclusions:
+        cot.append("<conclusion>" + "\n\n".join(conclusions) + "</conclusion>")
+    parts = ["<think>" + "\n\n".join(think) + "</think>"] if think else []
+    parts.extend(fields)
+    parts.append("\n--- Evaluation Details End ---\n")
+    parts.append("<chain_of_thought>\n" + "\n".join(cot) + "\n</chain_of_thought>")
+    return "\n".join(parts)
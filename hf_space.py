@@ -0,0 +1,232 @@
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+
+import gradio_client
+from gradio_client import Client
+from gradio_client.utils import APIInfoParseError, InvalidAPIEndpointError
+
+# gradio_client 1.x renamed the hf_token argument to token
+TOKEN_ARGUMENT = "token" if "token" in inspect.signature(Client.__init__).parameters else "hf_token"
+# Private Client methods CachedSpaceClient overrides (requirements.txt pins the gradio_client
+# version they are known to work with); checked at import, and if any is missing every
+# connection uses a plain Client without the config cache
+CACHED_METHODS = ("_space_name_to_src", "_get_space_state", "_get_config", "_get_api_info")
+MISSING_METHODS = [name for name in CACHED_METHODS if not callable(getattr(Client, name, None))]
+CONFIG_CACHE_SUPPORTED = not MISSING_METHODS
+if MISSING_METHODS:
+    print(f"[WARN] gradio_client {gradio_client.__version__} has no Client.{', Client.'.join(MISSING_METHODS)}; "
+          f"connecting to the Space without the config cache")
+# Config keys that describe the Space's API; a change in any of them makes a cached API info stale
+API_CONFIG_KEYS = ("version", "dependencies", "components")
+
+# What Client.submit() raises when it resolves a call against an out-of-date copy of the Space's
+# API, before anything is sent: ValueError from _infer_fn_index for an api_name the config no
+# longer has, KeyError for a function index missing from Client.endpoints, TypeError from
+# utils.construct_args for arguments that no longer bind to the endpoint's parameters
+SUBMIT_MISMATCH_ERRORS = (ValueError, KeyError, TypeError)
+# What a running job raises for the same reason: the endpoint it was called through is marked
+# invalid, or its cached API info no longer parses. Errors from the Space's own code (AppError),
+# bad values it returns and failures in our handling of its results are not among them
+JOB_MISMATCH_ERRORS = (InvalidAPIEndpointError, APIInfoParseError)
+
+def is_api_mismatch(error, submitting=False):
+    """Whether a Space call failed because the client's copy of the Space's API is stale;
+    submitting means the error came from Client.submit() itself rather than from its job"""
+    return isinstance(error, SUBMIT_MISMATCH_ERRORS if submitting else JOB_MISMATCH_ERRORS)
+
+def api_fingerprint(config):
+    return json.dumps([config.get(key) for key in API_CONFIG_KEYS], sort_keys=True, default=str)
+
+class CachedSpaceClient(Client):
+    """gradio Client that reuses the Space host and API info from a disk cache.
+
+    A cold Client resolves the Space through the Hub API, checks its runtime
+    state, then downloads the app config and API info before it can be used.
+    With a fresh cache entry only the config is downloaded, which also shows
+    the Space is up; if its API differs from the cached one the API info is
+    fetched again. The cache is written after each start that fetched it.
+    """
+
+    def __init__(self, src, cache_path, cache_ttl=24 * 3600, **kwargs):
+        self._cache_path = cache_path
+        self._cached = _load_cache(cache_path, cache_ttl, src)
+        # URL sources skip the Hub lookup, so the host is the source itself
+        self._fetched = {"src": src, "private": False}
+        super().__init__(src, **kwargs)
+        if not self._cached:
+            _save_cache(cache_path, src, self._fetched)
+
+    @property
+    def from_cache(self):
+        return bool(self._cached)
+
+    def _space_name_to_src(self, space):
+        if self._cached:
+            self._space_is_private = self._cached.get("private", False)
+            self._fetched["src"] = self._cached["src"]
+            self._fetched["private"] = self._space_is_private
+            return self._cached["src"]
+        src = super()._space_name_to_src(space)
+        self._fetched["src"] = src
+        self._fetched["private"] = self._space_is_private
+        return src
+
+    def _get_space_state(self):
+        # Skipped with a cached entry: the config request below reaches the Space itself
+        if self._cached:
+            return None
+        return super()._get_space_state()
+
+    def _get_config(self):
+        config = super()._get_config()
+        if self._cached and api_fingerprint(config) != api_fingerprint(self._cached["config"]):
+            print("[WARN] The Space's API changed since its config was cached; fetching its API info again")
+            self._cached = None
+        self._fetched["config"] = config
+        return config
+
+    def _get_api_info(self):
+        if self._cached:
+            return self._cached["api_info"]
+        info = super()._get_api_info()
+        self._fetched["api_info"] = info
+        return info
+
+def _load_cache(path, ttl, src):
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            return None
+        with open(path, encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Entries written by another gradio_client version may not match what this one expects
+    if entry.get("space") != src or entry.get("client_version") != gradio_client.__version__:
+        return None
+    if not all(key in entry for key in ("src", "config", "api_info")):
+        return None
+    return entry
+
+def _save_cache(path, src, fetched):
+    if not all(key in fetched for key in ("src", "config", "api_info")):
+        return
+    entry = {"space": src, "client_version": gradio_client.__version__, **fetched}
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"[WARN] Could not cache Space config: {str(e)}")
+
+def invalidate_cache(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class SpaceConnection:
+    """Connects the gradio client in a background thread and tracks its readiness.
+
+    States: "unconfigured" (no token), "idle", "connecting", "ready", "failed".
+    A failed connection is retried on demand, at most every retry_interval seconds.
+    reset() drops a client whose copy of the Space's API went stale.
+    """
+
+    def __init__(self, space, hf_token, cache_path, cache_ttl=24 * 3600, retry_interval=30.0, client_kwargs=None):
+        self.space = space
+        self.hf_token = hf_token
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.retry_interval = retry_interval
+        self.client_kwargs = client_kwargs or {}
+        self.state = "idle" if hf_token else "unconfigured"
+        self.error = None if hf_token else "HF_TOKEN environment variable not found"
+        self.client = None
+        self.from_cache = False
+        self.connect_seconds = None
+        self._attempted_at = 0.0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Begin connecting in the background unless already connecting or connected"""
+        with self._lock:
+            if self.state in ("unconfigured", "connecting", "ready"):
+                return
+            if self.state == "failed" and time.time() - self._attempted_at < self.retry_interval:
+                return
+            self.state = "connecting"
+            self._attempted_at = time.time()
+            self._ready.clear()
+        threading.Thread(target=self._connect, name="hf-space-connect", daemon=True).start()
+
+    def get(self, timeout=0.0):
+        """Return the connected client, waiting up to timeout seconds, or None if not ready"""
+        self.start()
+        if self.state == "connecting" and timeout:
+            self._ready.wait(timeout)
+        return self.client if self.state == "ready" else None
+
+    def reset(self, reason):
+        """Drop the client and the cached config, e.g. after a call failed because the Space was
+        redeployed with a different API; the next get() connects afresh"""
+        invalidate_cache(self.cache_path)
+        with self._lock:
+            if self.state != "ready":
+                return
+            client = self.client
+            self.client = None
+            self.state = "idle"
+            self.error = reason
+        print(f"[WARN] Reconnecting to the Space: {reason}")
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
+
+    def status(self):
+        return {
+                "ready": self.state == "ready",
+                "state": self.state,
+                "error": self.error,
+                "from_cache": self.from_cache,
+                "connect_seconds": self.connect_seconds
+                }
+
+    def _connect(self):
+        start = time.time()
+        print(f"Attempting to connect to Hugging Face space with token: {self.hf_token[:4]}...")
+        try:
+            if CONFIG_CACHE_SUPPORTED:
+                client = CachedSpaceClient(
+                        self.space,
+                        cache_path=self.cache_path,
+                        cache_ttl=self.cache_ttl,
+                        **{TOKEN_ARGUMENT: self.hf_token},
+                        **self.client_kwargs
+                        )
+            else:
+                client = Client(self.space, **{TOKEN_ARGUMENT: self.hf_token}, **self.client_kwargs)
+        except Exception as e:
+            print(f"Error initializing Gradio client: {type(e).__name__} - {str(e)}")
+            # A stale cache entry may be the cause; the next attempt starts cold
+            invalidate_cache(self.cache_path)
+            with self._lock:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {str(e)}"
+        else:
+            from_cache = getattr(client, "from_cache", False)
+            print(f"Successfully connected to Hugging Face space ({'cached API info' if from_cache else 'fetched config'})")
+            with self._lock:
+                self.client = client
+                self.from_cache = from_cache
+                self.state = "ready"
+                self.error = None
+        finally:
+            self.connect_seconds = round(time.time() - start, 3)
+            self._ready.set()
@@ -0,0 +1,266 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+from response_parser import extract_novelty_score
+
+KINDS = ("evaluation", "research")
+# Response fields not worth keeping: the reasoning trace has its own store
+OMITTED_FIELDS = ("think_section",)
+# Evaluation fields left out of the search index: the chain of thought repeats its sections, ids are not text
+NOT_SEARCHED = ("chain_of_thought", "reasoning_id", "history_id")
+EXCERPT_CHARS = 200
+
+def result_scores(kind, document):
+    """The scores a result contributes to the distributions: criteria1..6, or novelty"""
+    if kind == "research":
+        score = document.get("novelty_score")
+        if score is None:
+            score = extract_novelty_score(document.get("final_answer"))
+        return {"novelty": score} if isinstance(score, int) else {}
+    return {
+            key[len("score_"):]: value
+            for key, value in document.items()
+            if key.startswith("score_criteria") and isinstance(value, int)
+            }
+
+def search_text(kind, document):
+    """The text of a result that full-text search covers: the report, or the evaluation's reasoning"""
+    if kind == "research":
+        parts = [document.get("final_answer") or ""]
+        for step in document.get("execution_steps") or []:
+            parts.append(step.get("title", ""))
+            parts.extend(step.get("details", []))
+        return "\n".join(parts)
+    return "\n".join(value for key, value in document.items() if isinstance(value, str) and key not in NOT_SEARCHED)
+
+class HistoryStore:
+    """Every evaluation and research result served, in a SQLite file shared by all workers on the host.
+
+    Results are stored once under their content-addressed key, with a request
+    count, their scores and the response document compressed. record() only
+    queues the result; a background thread per process writes queued results
+    in batches, one transaction each, and drops results rather than block when
+    max_queued are waiting. Listing and search page by insertion order and
+    score distributions are kept as running counts, so no query scans the table.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=1.0, max_queued=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_queued)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writer_pid = None
+        self._counters = {"recorded": 0, "dropped": 0, "written": 0, "batches": 0, "errors": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._db() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS results (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    kind TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    requests INTEGER NOT NULL,
+                    scores TEXT NOT NULL,
+                    proposal TEXT NOT NULL,
+                    document BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS results_kind ON results (kind);
+                -- Contentless: the indexed text is rebuilt from the stored document when a result is replaced
+                CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5(
+                    proposal, body, content='', tokenize='porter unicode61'
+                );
+                CREATE TABLE IF NOT EXISTS score_counts (
+                    metric TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (metric, score)
+                ) WITHOUT ROWID;
+                """)
+
+    def _db(self):
+        """This thread's connection; a forked worker opens its own"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def record(self, kind, result_id, proposal, document, fresh):
+        """Queue a served result. A fresh one (just computed) replaces what is stored under
+        result_id; otherwise only its request count goes up. Never blocks"""
+        self._start_writer()
+        document = {key: value for key, value in document.items() if key not in OMITTED_FIELDS}
+        try:
+            self._queue.put_nowait((kind, result_id, proposal, document, fresh, time.time()))
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("recorded")
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written; False on timeout"""
+        self._start_writer()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def get(self, result_id):
+        """The stored result with its response document, or None"""
+        row = self._db().execute(
+                "SELECT seq, id, kind, created_at, updated_at, requests, scores, substr(proposal, 1, ?), document "
+                "FROM results WHERE id = ?",
+                (EXCERPT_CHARS, result_id)
+                ).fetchone()
+        if row is None:
+            return None
+        result = self._summary(row)
+        result["document"] = json.loads(zlib.decompress(row[8]))
+        return result
+
+    def recent(self, kind=None, before=None, limit=50):
+        """Summaries of stored results, newest first, and the `before` cursor of the next page"""
+        rows = self._db().execute(
+                "SELECT seq, id, kind, created_at, updated_at, requests, scores, substr(proposal, 1, ?) FROM results "
+                "WHERE (? IS NULL OR kind = ?) AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (EXCERPT_CHARS, kind, kind, before or 2 ** 63 - 1, limit)
+                ).fetchall()
+        return self._page(rows, limit)
+
+    def search(self, query, kind=None, before=None, limit=50):
+        """Summaries of results whose proposal, reasoning or report match an FTS5 query, newest first.
+        Raises ValueError for a malformed query"""
+        try:
+            rows = self._db().execute(
+                    # Newest first rather than by rank: FTS5 reads matches in rowid order and stops at the
+                    # limit, where ranking would score every match of a common term
+                    "SELECT r.seq, r.id, r.kind, r.created_at, r.updated_at, r.requests, r.scores, substr(r.proposal, 1, ?) "
+                    "FROM results_fts f CROSS JOIN results r ON r.seq = f.rowid "
+                    "WHERE results_fts MATCH ? AND f.rowid < ? AND (? IS NULL OR r.kind = ?) ORDER BY f.rowid DESC LIMIT ?",
+                    (EXCERPT_CHARS, query, before or 2 ** 63 - 1, kind, kind, limit)
+                    ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Short of a busy or failing database, the error is FTS5 rejecting the query
+            if "locked" in str(e) or "I/O" in str(e):
+                raise
+            raise ValueError(f"Invalid search query: {str(e)}") from e
+        return self._page(rows, limit)
+
+    def score_distribution(self):
+        """Per criterion (and novelty): how many results scored each value, their count and mean"""
+        distribution = {}
+        for metric, score, count in self._db().execute(
+                "SELECT metric, score, count FROM score_counts WHERE count > 0 ORDER BY metric, score"):
+            entry = distribution.setdefault(metric, {"count": 0, "mean": 0.0, "scores": {}})
+            entry["scores"][score] = count
+            entry["count"] += count
+            entry["mean"] += score * count
+        for entry in distribution.values():
+            entry["mean"] = round(entry["mean"] / entry["count"], 2)
+        return distribution
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _summary(self, row):
+        seq, result_id, kind, created_at, updated_at, requests, scores, proposal = row[:8]
+        return {
+                "id": result_id,
+                "kind": kind,
+                "created_at": created_at,
+                "updated_at": updated_at,
+                "requests": requests,
+                "scores": json.loads(scores),
+                "proposal": proposal
+                }
+
+    def _page(self, rows, limit):
+        return [self._summary(row) for row in rows], rows[-1][0] if len(rows) == limit else None
+
+    def _start_writer(self):
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                threading.Thread(target=self._run, daemon=True, name="history-writer").start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not isinstance(batch[-1], threading.Event):
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._write([entry for entry in batch if not isinstance(entry, threading.Event)])
+            for entry in batch:
+                if isinstance(entry, threading.Event):
+                    entry.set()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            with self._db() as db:
+                # Take the write lock up front: a read-then-write transaction cannot wait for another worker's
+                db.execute("BEGIN IMMEDIATE")
+                for entry in batch:
+                    self._apply(db, *entry)
+        except Exception as e:
+            # Counted and dropped: the writer thread has to outlive any one bad batch, or flush() waits forever
+            print(f"[WARN] History write of {len(batch)} results failed: {type(e).__name__} - {str(e)}")
+            self._count("errors")
+            return
+        with self._lock:
+            self._counters["written"] += len(batch)
+            self._counters["batches"] += 1
+
+    def _apply(self, db, kind, result_id, proposal, document, fresh, at):
+        row = db.execute("SELECT seq, kind, proposal, document FROM results WHERE id = ?", (result_id,)).fetchone()
+        if row is not None and not fresh:
+            db.execute("UPDATE results SET requests = requests + 1, updated_at = ? WHERE seq = ?", (at, row[0]))
+            return
+        scores = result_scores(kind, document)
+        blob = zlib.compress(json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        if row is None:
+            seq = db.execute(
+                    "INSERT INTO results (id, kind, created_at, updated_at, requests, scores, proposal, document) "
+                    "VALUES (?, ?, ?, ?, 1, ?, ?, ?)",
+                    (result_id, kind, at, at, json.dumps(scores), proposal, blob)
+                    ).lastrowid
+        else:
+            seq, old_kind, old_proposal, old_blob = row
+            old_document = json.loads(zlib.decompress(old_blob))
+            db.execute("INSERT INTO results_fts (results_fts, rowid, proposal, body) VALUES ('delete', ?, ?, ?)",
+                       (seq, old_proposal, search_text(old_kind, old_document)))
+            self._add_scores(db, result_scores(old_kind, old_document), -1)
+            db.execute("UPDATE results SET updated_at = ?, requests = requests + 1, scores = ?, proposal = ?, document = ? WHERE seq = ?",
+                       (at, json.dumps(scores), proposal, blob, seq))
+        db.execute("INSERT INTO results_fts (rowid, proposal, body) VALUES (?, ?, ?)", (seq, proposal, search_text(kind, document)))
+        self._add_scores(db, scores, 1)
+
+    def _add_scores(self, db, scores, delta):
+        db.executemany(
+                "INSERT INTO score_counts (metric, score, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (metric, score) DO UPDATE SET count = count + excluded.count",
+                [(metric, score, delta) for metric, score in scores.items()]
+                )
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
@@ -0,0 +1,255 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from result_cache import FileLock, PruneSchedule, atomic_write
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised from a progress callback once cancellation of the job was requested"""
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when this worker already holds max_queued pending jobs"""
+
+def _owner():
+    """Identify this process in a way that survives pid reuse after a restart"""
+    process = psutil.Process()
+    return {"pid": process.pid, "started": process.create_time()}
+
+def _owner_alive(owner):
+    if not owner:
+        return False
+    try:
+        return psutil.Process(owner["pid"]).create_time() == owner["started"]
+    except (psutil.Error, KeyError, TypeError):
+        return False
+
+class JobStore:
+    """Small persistent job state: one JSON status file per job plus a separate result file.
+
+    Every gunicorn worker reads the same directory, so status, result and cancel
+    requests can be served by any worker, not only the one running the job.
+    """
+
+    def __init__(self, directory, ttl=7 * 24 * 3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, payload):
+        job = {
+                "id": uuid.uuid4().hex,
+                "status": QUEUED,
+                "stage": None,
+                "payload": payload,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "attempts": 0,
+                "cancel_requested": False,
+                "error": None,
+                "owner": _owner()
+                }
+        self._write(self._path(job["id"]), job)
+        return job
+
+    def get(self, job_id):
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, job_id, expect=None, **changes):
+        """Read-modify-write the job under its lock; returns the updated job, or None if
+        it does not exist or its status is not `expect`"""
+        with self._lock(job_id):
+            job = self.get(job_id)
+            if job is None or (expect is not None and job["status"] != expect):
+                return None
+            job.update(changes)
+            self._write(self._path(job_id), job)
+            return job
+
+    def claim_orphan(self, job_id, max_attempts):
+        """Take over a job whose owner died: requeue it under this process, or fail it
+        once it has used up its attempts. Returns the claimed job, or None if another
+        worker got there first or the job is no longer pending."""
+        with self._lock(job_id):
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES or _owner_alive(job["owner"]):
+                return None
+            if job["attempts"] >= max_attempts:
+                job.update(status=FAILED, error="Interrupted by a worker restart", finished_at=time.time())
+            else:
+                job.update(status=QUEUED, stage=None, owner=_owner())
+            self._write(self._path(job_id), job)
+            return job
+
+    def get_result(self, job_id):
+        try:
+            with open(self._result_path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set_result(self, job_id, result):
+        self._write(self._result_path(job_id), result)
+
+    def jobs(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.job.json'):
+                job = self.get(name[:-len('.job.json')])
+                if job is not None:
+                    yield job
+
+    def prune(self):
+        """Remove finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl
+        for job in list(self.jobs()):
+            if job["status"] in FINISHED_STATES and (job["finished_at"] or 0) < cutoff:
+                for path in (self._path(job["id"]), self._result_path(job["id"]), self._lock_path(job["id"])):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{os.path.basename(job_id)}.job.json")
+
+    def _result_path(self, job_id):
+        return os.path.join(self.directory, f"{os.path.basename(job_id)}.result.json")
+
+    def _lock_path(self, job_id):
+        return os.path.join(self.directory, f"{os.path.basename(job_id)}.lock")
+
+    def _lock(self, job_id):
+        return FileLock(self._lock_path(job_id))
+
+    def _write(self, path, data):
+        with atomic_write(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+class JobHandle:
+    """What a runner sees of its job: progress reporting and cancellation"""
+
+    def __init__(self, store, job_id, attempt=1):
+        self.store = store
+        self.id = job_id
+        self.attempt = attempt
+
+    def progress(self, stage):
+        """Record the current stage; raises JobCancelled if cancellation was requested"""
+        job = self.store.update(self.id, stage=stage)
+        if job is None or job["cancel_requested"]:
+            raise JobCancelled(self.id)
+
+    def check(self):
+        """Raise JobCancelled if cancellation was requested, e.g. while waiting on a long call"""
+        job = self.store.get(self.id)
+        if job is None or job["cancel_requested"]:
+            raise JobCancelled(self.id)
+
+class JobQueue:
+    """Bounded worker pool running jobs off the request path.
+
+    runner(payload, handle) does the work and returns a JSON-serializable result;
+    it should call handle.progress(stage) between steps so progress is visible and
+    cancellation takes effect, and handle.check() while it waits on a long call.
+    """
+
+    def __init__(self, store, runner, max_workers=2, max_queued=50, max_attempts=2):
+        self.store = store
+        self.runner = runner
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._pending = 0
+        self._prune_schedule = PruneSchedule()
+        self._lock = threading.Lock()
+
+    def submit(self, payload):
+        with self._lock:
+            if self._pending >= self.max_queued:
+                raise QueueFull(f"{self._pending} jobs already pending in this worker")
+            self._pending += 1
+        job = self.store.create(payload)
+        self._executor.submit(self._run, job["id"])
+        return job
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs never start, running ones stop at their next stage or check"""
+        job = self.store.update(job_id, cancel_requested=True)
+        if job is None or job["status"] in FINISHED_STATES:
+            return job
+        cancelled = self.store.update(job_id, expect=QUEUED, status=CANCELLED, finished_at=time.time())
+        return cancelled or self.store.get(job_id)
+
+    def recover(self):
+        """Requeue jobs whose owning worker died (e.g. a gunicorn restart) before they finished"""
+        for job in list(self.store.jobs()):
+            if job["status"] in FINISHED_STATES or _owner_alive(job["owner"]):
+                continue
+            job = self.store.claim_orphan(job["id"], self.max_attempts)
+            if job is not None and job["status"] == QUEUED:
+                print(f"Requeueing research job {job['id']} after worker restart")
+                with self._lock:
+                    self._pending += 1
+                self._executor.submit(self._run, job["id"])
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, "max_queued": self.max_queued}
+
+    def _run(self, job_id):
+        try:
+            if self._prune_schedule.due():
+                # Here rather than in submit(), so no request waits on a scan of the job directory
+                self.store.prune()
+            job = self.store.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                return
+            if job["cancel_requested"]:
+                self.store.update(job_id, expect=QUEUED, status=CANCELLED, finished_at=time.time())
+                return
+            if self.store.update(job_id, expect=QUEUED, status=RUNNING, started_at=time.time(), attempts=job["attempts"] + 1) is None:
+                return
+            try:
+                result = self.runner(job["payload"], JobHandle(self.store, job_id, job["attempts"] + 1))
+            except JobCancelled:
+                print(f"Job {job_id} cancelled")
+                self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+                return
+            except Exception as e:
+                print(f"Job {job_id} failed: {type(e).__name__} - {str(e)}")
+                self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+                return
+            self.store.set_result(job_id, result)
+            self.store.update(job_id, status=SUCCEEDED, stage=None, finished_at=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+def public_view(job):
+    """The job fields returned to clients"""
+    return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "cancel_requested": job["cancel_requested"],
+            "error": job["error"]
+            }
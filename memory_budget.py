@@ -0,0 +1,204 @@
+import asyncio
+import tempfile
+import threading
+import time
+
+import psutil
+
+class BudgetExceeded(Exception):
+    """A streamed response grew past its hard byte budget"""
+
+class MemoryPressure(Exception):
+    """The process is too close to its memory limit to admit another request"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class SpillBuffer:
+    """Append-only text buffer that keeps up to memory_limit bytes in memory and
+    spills everything to an anonymous temporary file beyond that.
+
+    max_bytes (0 for no limit) is a hard cap: appending past it raises
+    BudgetExceeded instead of silently dropping text.
+    """
+
+    def __init__(self, memory_limit, max_bytes=0, name="buffer"):
+        self.memory_limit = memory_limit
+        self.max_bytes = max_bytes
+        self.name = name
+        self.size = 0
+        self._parts = []
+        self._memory_bytes = 0
+        self._file = None
+
+    @property
+    def spilled(self):
+        return self._file is not None
+
+    def append(self, text):
+        n = len(text.encode('utf-8'))
+        self.size += n
+        if self.max_bytes and self.size > self.max_bytes:
+            raise BudgetExceeded(f"{self.name} exceeded its budget of {self.max_bytes} bytes")
+        if self._file is not None:
+            self._file.write(text)
+            return
+        self._parts.append(text)
+        self._memory_bytes += n
+        if self._memory_bytes > self.memory_limit:
+            self._file = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self._file.write("".join(self._parts))
+            self._parts = []
+            self._memory_bytes = 0
+
+    def getvalue(self):
+        if self._file is None:
+            return "".join(self._parts)
+        self._file.flush()
+        self._file.seek(0)
+        value = self._file.read()
+        self._file.seek(0, 2)
+        return value
+
+    def chunks(self, size=64 * 1024):
+        """Yield the text in pieces, without holding a spilled buffer in memory at once"""
+        if self._file is None:
+            yield "".join(self._parts)
+            return
+        self._file.flush()
+        self._file.seek(0)
+        try:
+            while piece := self._file.read(size):
+                yield piece
+        finally:
+            self._file.seek(0, 2)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class _Admission:
+    """An admitted request's memory reservation; released once"""
+
+    def __init__(self, governor, reserve, waited=0.0):
+        self.governor = governor
+        self.reserve = reserve
+        # Seconds the request was queued before it was admitted
+        self.waited = waited
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.governor._release(self.reserve)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+class MemoryGovernor:
+    """Process-level admission control on resident memory.
+
+    A request is admitted when the process RSS plus the reservations of requests
+    already in flight stays under max_rss. Otherwise the caller is queued for up
+    to queue_timeout seconds and then refused with MemoryPressure, so in-progress
+    answers are never cut short. RSS is sampled at most every sample_interval
+    seconds, never in the streaming loop.
+    """
+
+    def __init__(self, max_rss, queue_timeout=5.0, sample_interval=0.5):
+        self.max_rss = max_rss
+        self.queue_timeout = queue_timeout
+        self.sample_interval = sample_interval
+        self._process = psutil.Process()
+        self._reserved = 0
+        self._rss = 0
+        self._sampled_at = 0.0
+        self._counters = {"admitted": 0, "queued": 0, "refused": 0}
+        self._cond = threading.Condition()
+
+    def admit(self, reserve):
+        """Reserve `reserve` bytes for a request, waiting briefly if memory is short"""
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        queued = False
+        with self._cond:
+            while not self._fits(reserve):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["refused"] += 1
+                    raise MemoryPressure(
+                            f"Worker memory above {self.max_rss // (1024 * 1024)} MB, try again later",
+                            retry_after=max(1, int(self.queue_timeout))
+                            )
+                if not queued:
+                    queued = True
+                    self._counters["queued"] += 1
+                self._cond.wait(min(remaining, self.sample_interval))
+            self._reserved += reserve
+            self._counters["admitted"] += 1
+        return _Admission(self, reserve, time.monotonic() - start)
+
+    async def admit_async(self, reserve):
+        """admit() for the event loop: polls with asyncio sleeps instead of blocking"""
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        queued = False
+        while True:
+            with self._cond:
+                if self._fits(reserve):
+                    self._reserved += reserve
+                    self._counters["admitted"] += 1
+                    return _Admission(self, reserve, time.monotonic() - start)
+                if time.monotonic() >= deadline:
+                    self._counters["refused"] += 1
+                    raise MemoryPressure(
+                            f"Worker memory above {self.max_rss // (1024 * 1024)} MB, try again later",
+                            retry_after=max(1, int(self.queue_timeout))
+                            )
+                if not queued:
+                    queued = True
+                    self._counters["queued"] += 1
+            await asyncio.sleep(self.sample_interval)
+
+    def stats(self):
+        with self._cond:
+            return {
+                    **self._counters,
+                    "rss_bytes": self._sample_rss(),
+                    "reserved_bytes": self._reserved,
+                    "max_rss_bytes": self.max_rss
+                    }
+
+    def _fits(self, reserve):
+        if not self.max_rss:
+            return True
+        # Always admit one request at a time so a large baseline cannot deadlock the worker
+        if self._reserved == 0:
+            return True
+        return self._sample_rss() + self._reserved + reserve <= self.max_rss
+
+    def _sample_rss(self):
+        now = time.monotonic()
+        if now - self._sampled_at >= self.sample_interval:
+            self._rss = self._process.memory_info().rss
+            self._sampled_at = now
+        return self._rss
+
+    def _release(self, reserve):
+        with self._cond:
+            self._reserved -= reserve
+            self._cond.notify_all()
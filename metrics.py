@@ -0,0 +1,160 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+
+from jobs import JobCancelled
+from memory_budget import BudgetExceeded, MemoryPressure
+from resilience import CircuitOpen, DeadlineExceeded
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+EVALUATE_STAGE_SECONDS = Histogram(
+        "moonshot_evaluate_stage_seconds",
+        "Seconds spent in each /evaluate stage: queue_wait, rate_limit_wait, first_reasoning_token, "
+        "first_content_token, parse and total",
+        ["stage", "outcome", "retries"],
+        buckets=LATENCY_BUCKETS
+        )
+EVALUATE_TOKENS = Histogram(
+        "moonshot_evaluate_tokens",
+        "Approximate reasoning and content tokens streamed per evaluation",
+        ["kind", "outcome", "retries"],
+        buckets=TOKEN_BUCKETS
+        )
+RESEARCH_STAGE_SECONDS = Histogram(
+        "moonshot_research_stage_seconds",
+        "Seconds spent in each /research stage: log_user_message, interact_with_agent_1, "
+        "parse_agent_response and total",
+        ["stage", "outcome", "retries"],
+        buckets=LATENCY_BUCKETS
+        )
+ADMISSION_WAIT_SECONDS = Histogram(
+        "moonshot_admission_wait_seconds",
+        "Seconds requests waited for an admission slot, by lane and outcome: admitted, timeout or queue_full",
+        ["lane", "outcome"],
+        buckets=LATENCY_BUCKETS
+        )
+# Summed over live workers when PROMETHEUS_MULTIPROC_DIR is set
+ADMISSION_QUEUE_DEPTH = Gauge(
+        "moonshot_admission_queue_depth",
+        "Requests waiting for an admission slot, by lane",
+        ["lane"],
+        multiprocess_mode="livesum"
+        )
+
+# Outcome labels for the exceptions that end a request; anything else is "error"
+OUTCOMES = (
+        (DeadlineExceeded, "deadline"),
+        (CircuitOpen, "circuit_open"),
+        (MemoryPressure, "memory_pressure"),
+        (BudgetExceeded, "budget_exceeded"),
+        (JobCancelled, "cancelled")
+        )
+
+def outcome_of(exc):
+    for exc_type, outcome in OUTCOMES:
+        if isinstance(exc, exc_type):
+            return outcome
+    return "error"
+
+class _Stage:
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+        return False
+
+class StageTimings:
+    """Stage durations and token counts for one request.
+
+    Nothing is observed until finish(outcome), so every sample carries the
+    request's final outcome and retry count. Waits accumulate over retries;
+    time-to-first-token is that of the last attempt.
+    """
+
+    def __init__(self, seconds_histogram, tokens_histogram=None):
+        self.seconds_histogram = seconds_histogram
+        self.tokens_histogram = tokens_histogram
+        self.attempts = 0
+        # Set by absorb() when the request fanned out, since attempts then count every sub-request
+        self.retries = None
+        self.seconds = {}
+        self.tokens = {}
+        self._start = time.perf_counter()
+        self._attempt_start = self._start
+        self._firsts = set()
+        self._finished = False
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def stage(self, name):
+        """Context manager timing a block as `name`"""
+        return _Stage(self, name)
+
+    def begin_attempt(self):
+        """Mark the upstream request as sent; time-to-first-token counts from here"""
+        self._attempt_start = time.perf_counter()
+        self._firsts = set()
+
+    def first(self, stage):
+        """Record `stage` as the time since begin_attempt(), once per attempt"""
+        if stage not in self._firsts:
+            self._firsts.add(stage)
+            self.seconds[stage] = time.perf_counter() - self._attempt_start
+
+    def count_tokens(self, kind, tokens):
+        self.tokens[kind] = tokens
+
+    def absorb(self, other):
+        """Fold in the timings of a concurrent sub-request: attempts and tokens add up,
+        waits keep the longest and first-token times the earliest"""
+        self.attempts += other.attempts
+        self.retries = max(self.retries or 0, other.attempts - 1)
+        for kind, tokens in other.tokens.items():
+            self.tokens[kind] = self.tokens.get(kind, 0) + tokens
+        for stage, seconds in other.seconds.items():
+            if stage not in self.seconds:
+                self.seconds[stage] = seconds
+            elif stage.startswith("first_"):
+                self.seconds[stage] = min(self.seconds[stage], seconds)
+            else:
+                self.seconds[stage] = max(self.seconds[stage], seconds)
+
+    def finish(self, outcome, retries=None):
+        """Observe everything recorded, labelled with the outcome and retries (default: attempts - 1)"""
+        if self._finished:
+            return
+        self._finished = True
+        if retries is None:
+            retries = self.retries if self.retries is not None else max(0, self.attempts - 1)
+        retries = str(retries)
+        self.seconds["total"] = time.perf_counter() - self._start
+        for stage, seconds in self.seconds.items():
+            self.seconds_histogram.labels(stage, outcome, retries).observe(seconds)
+        if self.tokens_histogram is not None:
+            for kind, tokens in self.tokens.items():
+                self.tokens_histogram.labels(kind, outcome, retries).observe(tokens)
+
+def evaluate_timings():
+    return StageTimings(EVALUATE_STAGE_SECONDS, EVALUATE_TOKENS)
+
+def research_timings():
+    return StageTimings(RESEARCH_STAGE_SECONDS)
+
+def render():
+    """Body and content type for /metrics; with PROMETHEUS_MULTIPROC_DIR set, all workers are aggregated"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
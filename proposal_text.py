@@ -0,0 +1,209 @@
+import re
+import threading
+import time
+import unicodedata
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to ESTIMATE_PIECE
+    tiktoken = None
+
+# Zero-width characters, the byte-order mark and soft hyphens: invisible, but each costs tokens
+INVISIBLE = re.compile("[\u00ad\u200b\u200c\u200d\u2060\ufeff]")
+HORIZONTAL_SPACE = re.compile(r"[^\S\n]+")
+BLANK_LINES = re.compile(r"\n{3,}")
+# Estimated tokens when no tokenizer is available: runs of up to four word characters and single
+# symbols, which slightly overcounts English prose, so a budget is never exceeded
+ESTIMATE_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+# Repeated lines and blocks of at least this many words are dropped; shorter ones ("N/A", "Yes",
+# list labels) repeat legitimately
+MIN_DUPLICATE_WORDS = 8
+# A block's first line is kept whole when truncating if it is at most this many words and more lines follow
+HEADING_WORDS = 15
+TRUNCATION_MARKER = " [...]"
+
+class TokenCounter:
+    """Token counts from a local tiktoken encoding, or an estimate while it is unavailable.
+
+    The encoding loads in the background (its BPE file is fetched once and
+    cached under TIKTOKEN_CACHE_DIR), so workers bind right away. Calls made
+    before it is ready wait for it up to ready_timeout seconds after start();
+    without tiktoken, or if the encoding cannot be loaded, counts are estimated.
+    """
+
+    def __init__(self, encoding="cl100k_base", ready_timeout=10.0):
+        self.encoding = encoding
+        self.ready_timeout = ready_timeout
+        self.error = None
+        self._encoder = None
+        self._ready = threading.Event()
+        self._started_at = time.monotonic()
+
+    def start(self):
+        self._started_at = time.monotonic()
+        if tiktoken is None or self.encoding == "estimate":
+            self.error = "tiktoken is not installed" if tiktoken is None else None
+            self._ready.set()
+            return
+        threading.Thread(target=self._load, daemon=True, name="tokenizer").start()
+
+    def _load(self):
+        try:
+            self._encoder = tiktoken.get_encoding(self.encoding)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {str(e)}"
+            print(f"[WARN] Tokenizer {self.encoding} unavailable, estimating token counts: {self.error}")
+        finally:
+            self._ready.set()
+
+    def _get(self):
+        if not self._ready.is_set():
+            self._ready.wait(max(0.0, self._started_at + self.ready_timeout - time.monotonic()))
+        return self._encoder
+
+    @property
+    def name(self):
+        return self.encoding if self._get() is not None else "estimate"
+
+    def count(self, text):
+        encoder = self._get()
+        if encoder is not None:
+            return len(encoder.encode(text, disallowed_special=()))
+        return len(ESTIMATE_PIECE.findall(text))
+
+    def prefix(self, text, tokens):
+        """The longest start of text that is at most `tokens` tokens"""
+        encoder = self._get()
+        if encoder is not None:
+            ids = encoder.encode(text, disallowed_special=())
+            if len(ids) <= tokens:
+                return text
+            # A cut inside a multi-byte character decodes to a replacement character
+            return encoder.decode(ids[:max(0, tokens)]).rstrip("\ufffd")
+        pieces = list(ESTIMATE_PIECE.finditer(text))
+        if len(pieces) <= tokens:
+            return text
+        return text[:pieces[max(0, tokens)].start()]
+
+class PreparedProposal:
+    """A proposal as sent upstream and keyed in the caches, with its token statistics"""
+
+    def __init__(self, text, stats):
+        self.text = text
+        self.stats = stats
+
+def normalize_text(text):
+    """Unicode-normalized text with single spaces, trimmed lines and at most one blank line in a row"""
+    text = unicodedata.normalize("NFKC", str(text))
+    text = INVISIBLE.sub("", text.replace("\r\n", "\n").replace("\r", "\n"))
+    lines = [HORIZONTAL_SPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+def _fingerprint(text):
+    return " ".join(text.casefold().split())
+
+def deduplicate_blocks(text):
+    """Drop repeated blocks (paragraphs) and repeated long lines, keeping the first occurrence.
+    Returns the text and the number of blocks and lines dropped"""
+    seen = set()
+    blocks = []
+    dropped = 0
+    for block in text.split("\n\n"):
+        block_fingerprint = _fingerprint(block)
+        if block_fingerprint in seen and len(block_fingerprint.split()) >= MIN_DUPLICATE_WORDS:
+            dropped += 1
+            continue
+        lines = []
+        for line in block.split("\n"):
+            fingerprint = _fingerprint(line)
+            if fingerprint in seen and len(fingerprint.split()) >= MIN_DUPLICATE_WORDS:
+                dropped += 1
+                continue
+            seen.add(fingerprint)
+            lines.append(line)
+        seen.add(block_fingerprint)
+        if lines:
+            blocks.append("\n".join(lines))
+    return "\n\n".join(blocks), dropped
+
+def _split_heading(block):
+    first, newline, rest = block.partition("\n")
+    if newline and len(first.split()) <= HEADING_WORDS:
+        return first + "\n", rest
+    return "", block
+
+def _cut(text, counter, tokens):
+    """At most `tokens` tokens from the start of text, ending on a sentence or word where that keeps most of it"""
+    head = counter.prefix(text, tokens)
+    if head == text:
+        return text
+    end = max(head.rfind(". "), head.rfind("? "), head.rfind("! "), head.rfind("\n"))
+    if end < len(head) // 2:
+        end = head.rfind(" ")
+    if end >= len(head) // 2:
+        head = head[:end + 1]
+    return head.rstrip()
+
+def truncate_blocks(text, counter, max_tokens):
+    """Cut text to at most max_tokens while keeping every block's opening, in order.
+
+    The longest blocks are cut first, all to the same length (the largest that
+    fits), so short sections survive whole; headings are kept whole and each
+    cut is marked with TRUNCATION_MARKER. Returns the text and the number of
+    blocks cut.
+    """
+    blocks = [_split_heading(block) for block in text.split("\n\n")]
+    marker = counter.count(TRUNCATION_MARKER)
+    bodies = [counter.count(body) for _, body in blocks]
+    # Headings and the blank lines between blocks are never cut
+    available = max_tokens - sum(counter.count(heading) for heading, _ in blocks) - 2 * (len(blocks) - 1)
+
+    def used(cap):
+        return sum(min(n, cap) + (marker if n > cap else 0) for n in bodies)
+
+    low, high = 0, max(bodies, default=0)
+    while low < high:
+        cap = (low + high + 1) // 2
+        if used(cap) <= available:
+            low = cap
+        else:
+            high = cap - 1
+
+    cut_blocks = 0
+    parts = []
+    for (heading, body), n in zip(blocks, bodies):
+        if n > low:
+            cut_blocks += 1
+            body = (_cut(body, counter, low) + TRUNCATION_MARKER).lstrip()
+        parts.append(heading + body)
+    result = "\n\n".join(parts)
+    # The counts above are per block; tokens can merge across the joins, and headings alone may not fit
+    if counter.count(result) > max_tokens:
+        result = _cut(result, counter, max(0, max_tokens - marker)) + TRUNCATION_MARKER
+        cut_blocks = max(cut_blocks, 1)
+    return result, cut_blocks
+
+def prepare_proposal(proposal, counter, max_tokens=0):
+    """Normalize, deduplicate and (if max_tokens is set) truncate a proposal.
+
+    The result's text is what the models see and, being deterministic, what
+    cache keys and the near-duplicate index are built from, so resubmits that
+    differ only in whitespace, invisible characters or repeated blocks share
+    their results. stats reports the token counts at each stage.
+    """
+    raw = str(proposal)
+    text, duplicates = deduplicate_blocks(normalize_text(raw))
+    normalized_tokens = counter.count(text)
+    tokens, truncated = normalized_tokens, 0
+    if max_tokens and normalized_tokens > max_tokens:
+        text, truncated = truncate_blocks(text, counter, max_tokens)
+        tokens = counter.count(text)
+    return PreparedProposal(text, {
+            "tokenizer": counter.name,
+            "original_tokens": counter.count(raw),
+            "normalized_tokens": normalized_tokens,
+            "tokens": tokens,
+            "max_tokens": max_tokens or None,
+            "duplicates_removed": duplicates,
+            "truncated_blocks": truncated
+            })
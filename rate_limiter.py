@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+
+from resilience import DeadlineExceeded
+from result_cache import FileLock
+
+# "1s", "6m0s", "250ms", "1h2m3.5s" as used by x-ratelimit-reset-* headers
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_duration(value):
+    """Parse a Retry-After / reset header into seconds, or None"""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+class RateLimiter:
+    """Token buckets for requests per second and tokens per minute, shared by every
+    process on the host through a small state file guarded by a file lock.
+
+    Callers reserve budget before each upstream call. While budget remains the
+    reservation is admitted immediately; otherwise the bucket goes into debt and
+    the caller sleeps exactly until its share refills, so waiting callers are
+    served in arrival order without polling. A limit of 0 disables that bucket.
+    A caller that would have to wait past its deadline gives its reservation back.
+    """
+
+    def __init__(self, path, requests_per_second=5.0, burst=None, tokens_per_minute=0):
+        self.path = path
+        self.requests_per_second = float(requests_per_second)
+        self.burst = float(burst if burst is not None else max(1.0, self.requests_per_second))
+        self.tokens_per_minute = float(tokens_per_minute)
+        self._lock = threading.Lock()
+        self._metrics = {
+                "acquired": 0,
+                "delayed": 0,
+                "wait_seconds_total": 0.0,
+                "wait_seconds_max": 0.0,
+                "refunded": 0,
+                "throttled_responses": 0
+                }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def reserve(self, tokens=0):
+        """Take one request and `tokens` tokens from the buckets; returns seconds to wait"""
+        with self._shared_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            waits = [state["blocked_until"] - now]
+            if self.requests_per_second > 0:
+                state["requests"] -= 1
+                waits.append(-state["requests"] / self.requests_per_second)
+            if self.tokens_per_minute > 0 and tokens:
+                state["tokens"] -= tokens
+                waits.append(-state["tokens"] / (self.tokens_per_minute / 60))
+            return max(0.0, *waits)
+
+    def refund(self, tokens=0):
+        """Give back a reservation whose call was never made"""
+        with self._shared_state() as state:
+            self._refill(state, time.time())
+            if self.requests_per_second > 0:
+                state["requests"] = min(self.burst, state["requests"] + 1)
+            if self.tokens_per_minute > 0 and tokens:
+                state["tokens"] = min(self.tokens_per_minute, state["tokens"] + tokens)
+        with self._lock:
+            self._metrics["refunded"] += 1
+
+    def acquire(self, tokens=0, deadline=None):
+        """Reserve budget and sleep until it is available; returns the time waited. Raises
+        DeadlineExceeded, refunding the reservation, if the wait would outlast the deadline"""
+        wait = self._reserve_within(tokens, deadline)
+        if wait > 0:
+            time.sleep(wait)
+        self._record_wait(wait)
+        return wait
+
+    async def acquire_async(self, tokens=0, deadline=None):
+        """acquire() for the event loop: the state file is locked in a worker thread,
+        the wait is an asyncio sleep, and a cancelled caller refunds its reservation"""
+        # Shielded so a reservation made after the caller was cancelled is still seen and refunded
+        reserving = asyncio.ensure_future(asyncio.to_thread(self._reserve_within, tokens, deadline))
+        try:
+            wait = await asyncio.shield(reserving)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            await asyncio.wait({reserving})
+            if reserving.exception() is None:
+                await asyncio.to_thread(self.refund, tokens)
+            raise
+        self._record_wait(wait)
+        return wait
+
+    def _reserve_within(self, tokens, deadline):
+        wait = self.reserve(tokens)
+        if deadline is not None and wait > deadline.remaining():
+            self.refund(tokens)
+            raise DeadlineExceeded(f"Rate limit wait of {wait:.2f}s exceeds the {deadline.seconds:g}s deadline")
+        return wait
+
+    def settle(self, reserved_tokens, used_tokens):
+        """Return (or charge) the difference between an estimate and the actual usage"""
+        if self.tokens_per_minute <= 0:
+            return
+        with self._shared_state() as state:
+            self._refill(state, time.time())
+            state["tokens"] = min(self.tokens_per_minute, state["tokens"] + reserved_tokens - used_tokens)
+
+    def observe_response(self, response):
+        """httpx response hook: back off on 429 and follow the upstream's rate-limit headers"""
+        headers = response.headers
+        block_for = None
+        if response.status_code == 429:
+            with self._lock:
+                self._metrics["throttled_responses"] += 1
+            block_for = parse_duration(headers.get("retry-after")) or 1.0
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and remaining.strip() == "0":
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    block_for = max(block_for or 0.0, reset)
+        if block_for:
+            self.block(block_for)
+
+    def block(self, seconds):
+        """Admit nothing for the next `seconds` seconds in any process"""
+        print(f"[WARN] Upstream rate limit reached, pausing requests for {seconds:.2f}s")
+        with self._shared_state() as state:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._metrics)
+        stats["wait_seconds_avg"] = round(stats["wait_seconds_total"] / stats["acquired"], 4) if stats["acquired"] else None
+        stats["requests_per_second"] = self.requests_per_second
+        stats["tokens_per_minute"] = self.tokens_per_minute
+        return stats
+
+    def _record_wait(self, wait):
+        with self._lock:
+            self._metrics["acquired"] += 1
+            if wait > 0:
+                self._metrics["delayed"] += 1
+                self._metrics["wait_seconds_total"] += wait
+                self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], wait)
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated"])
+        state["updated"] = now
+        if self.requests_per_second > 0:
+            state["requests"] = min(self.burst, state["requests"] + elapsed * self.requests_per_second)
+        if self.tokens_per_minute > 0:
+            state["tokens"] = min(self.tokens_per_minute, state["tokens"] + elapsed * self.tokens_per_minute / 60)
+
+    def _shared_state(self):
+        return _SharedState(self)
+
+class _SharedState:
+    """Locked read-modify-write of the bucket state file"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.lock = FileLock(limiter.path + ".lock")
+        self.state = None
+
+    def __enter__(self):
+        self.limiter._lock.acquire()
+        try:
+            self.lock.__enter__()
+        except BaseException:
+            # Otherwise every later reservation in this process would wait on the thread lock forever
+            self.limiter._lock.release()
+            raise
+        try:
+            with open(self.limiter.path, encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {
+                    "requests": self.limiter.burst,
+                    "tokens": self.limiter.tokens_per_minute,
+                    "updated": time.time(),
+                    "blocked_until": 0.0
+                    }
+        return self.state
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            if exc_type is None:
+                with open(self.limiter.path, 'w', encoding='utf-8') as f:
+                    json.dump(self.state, f)
+        finally:
+            self.lock.__exit__()
+            self.limiter._lock.release()
+        return False
@@ -0,0 +1,158 @@
+import threading
+import time
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before the upstream answered"""
+
+class Deadline:
+    """Absolute time budget for one request, passed down to every upstream call it makes.
+
+    Retries, waits and per-attempt timeouts are all cut to what is left, so a
+    request never runs much past the point where its client has given up.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_header(cls, value, default):
+        """A deadline of `default` seconds, shortened to a client's X-Request-Timeout if smaller"""
+        try:
+            requested = float(value)
+        except (TypeError, ValueError):
+            return cls(default)
+        return cls(min(default, requested)) if requested > 0 else cls(default)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap):
+        """`cap` seconds, or less if the deadline is closer"""
+        return min(cap, self.remaining())
+
+    def check(self, what="Request"):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"{what} exceeded its {self.seconds:g}s deadline")
+
+def stop_at_deadline(wait, min_attempt_seconds):
+    """tenacity stop condition: give up once the call's `deadline` keyword argument
+    cannot fit the next backoff `wait` plus one more attempt of min_attempt_seconds"""
+    def stop(retry_state):
+        deadline = retry_state.kwargs.get("deadline")
+        if deadline is None:
+            return False
+        return deadline.remaining() < wait(retry_state) + min_attempt_seconds
+    return stop
+
+class CircuitOpen(Exception):
+    """An upstream's breaker is open; the call was refused without being attempted"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is unavailable after repeated failures, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class _Call:
+    """One call through a breaker; records its outcome on exit"""
+
+    def __init__(self, breaker, trial):
+        self.breaker = breaker
+        self.trial = trial
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.breaker._record(self.trial, exc)
+        return False
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker.
+
+    "closed": calls go through; failure_threshold consecutive failures open it.
+    "open": calls fail fast with CircuitOpen until reset_timeout has passed.
+    "half_open": a single trial call goes through; success closes the breaker,
+    failure opens it again. Only failure_exceptions count as failures, so a
+    client error or an expired deadline says nothing about upstream health.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, failure_exceptions=(Exception,), ignored_exceptions=()):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self.ignored_exceptions = ignored_exceptions
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._last_error = None
+        self._counters = {"succeeded": 0, "failed": 0, "rejected": 0, "opened": 0}
+        self._lock = threading.Lock()
+
+    def call(self):
+        """Context manager around one upstream call; raises CircuitOpen instead of calling"""
+        with self._lock:
+            self._refresh()
+            if self.state == "open" or (self.state == "half_open" and self._trial_running):
+                self._counters["rejected"] += 1
+                raise CircuitOpen(self.name, self._retry_after())
+            trial = self.state == "half_open"
+            if trial:
+                self._trial_running = True
+        return _Call(self, trial)
+
+    def check(self):
+        """Raise CircuitOpen if a call would be refused right now, without making one"""
+        with self._lock:
+            self._refresh()
+            if self.state == "open":
+                self._counters["rejected"] += 1
+                raise CircuitOpen(self.name, self._retry_after())
+
+    def reset(self):
+        """Close the breaker, e.g. after an out-of-band health check has passed"""
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                    "state": self.state,
+                    "consecutive_failures": self._failures,
+                    "failure_threshold": self.failure_threshold,
+                    "retry_after": self._retry_after() if self.state == "open" else None,
+                    "last_error": self._last_error,
+                    **self._counters
+                    }
+
+    def _retry_after(self):
+        return max(1, int(self._opened_at + self.reset_timeout - time.monotonic() + 0.999))
+
+    def _refresh(self):
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._trial_running = False
+
+    def _record(self, trial, exc):
+        with self._lock:
+            if trial:
+                self._trial_running = False
+            if exc is None:
+                self._counters["succeeded"] += 1
+                self._failures = 0
+                self.state = "closed"
+            elif isinstance(exc, self.failure_exceptions) and not isinstance(exc, self.ignored_exceptions):
+                self._counters["failed"] += 1
+                self._failures += 1
+                self._last_error = f"{type(exc).__name__}: {str(exc)}"
+                if trial or self._failures >= self.failure_threshold:
+                    if self.state != "open":
+                        self._counters["opened"] += 1
+                        print(f"[WARN] Circuit for {self.name} opened after {self._failures} consecutive failures")
+                    self.state = "open"
+                    self._opened_at = time.monotonic()
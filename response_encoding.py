@@ -0,0 +1,115 @@
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # Responses are encoded with the json module instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Only gzip is offered
+    brotli = None
+
+def dumps(document):
+    """document as compact UTF-8 JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # Integers beyond 64 bits and other values orjson refuses
+            pass
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def parse_fields(value):
+    """The dotted paths listed in a ?fields= value, or None if there are none"""
+    fields = [field.strip() for field in (value or "").split(",") if field.strip()]
+    return fields or None
+
+def project(document, fields, fallback=None):
+    """A copy of document with only the dotted paths in fields, each kept at its place in the nesting.
+
+    A path whose first key is not in the document is looked up under the
+    `fallback` key instead (so "search_links" finds parsed_result.search_links);
+    paths that match nothing are left out.
+    """
+    paths = []
+    for field in fields:
+        keys = field.split(".")
+        if keys[0] not in document and isinstance(document.get(fallback), dict):
+            keys = [fallback] + keys
+        paths.append(keys)
+    projected = {}
+    included = set()
+    for keys in sorted(paths, key=len):
+        # Already sent whole as part of a shorter path
+        if any(tuple(keys[:n]) in included for n in range(1, len(keys) + 1)):
+            continue
+        value = document
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+            included.add(tuple(keys))
+    return projected
+
+def accepted_encodings(accept_encoding):
+    """The content codings an Accept-Encoding header allows, i.e. those without q=0"""
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding.strip():
+            accepted.add(coding.strip().lower())
+    return accepted
+
+class ResponseEncoder:
+    """JSON response bodies, brotli- or gzip-compressed for clients that accept it.
+
+    Bodies under min_bytes are sent as they are: compressing them saves less
+    than the headers cost. Brotli is preferred when the brotli package is
+    installed; both run at levels chosen for speed on multi-megabyte bodies
+    rather than for the smallest output.
+    """
+
+    def __init__(self, min_bytes=1024, gzip_level=5, brotli_quality=4):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def encoding(self, accept_encoding):
+        """The coding to send for an Accept-Encoding header: "br", "gzip" or None"""
+        accepted = accepted_encodings(accept_encoding)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=self.gzip_level)
+        return body
+
+    def encode(self, document, accept_encoding):
+        """(body, headers) of document as a JSON response for a client sending accept_encoding"""
+        body = dumps(document)
+        headers = {"Vary": "Accept-Encoding"}
+        encoding = self.encoding(accept_encoding) if len(body) >= self.min_bytes else None
+        if encoding is not None:
+            body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return body, headers
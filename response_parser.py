@@ -2,48 +2,87 @@ import re
 import json
 import os
 
-def parse_agent_response(response):
-    """Structurally parse the API response"""
-    result = {
-            "final_answer": "",
-            "execution_steps": [],
-            "search_links": []
-            }
-
-    current_step = {}
-    link_pattern = re.compile(r'https?://\S+')
-    # Add detailed result matching pattern
-    detail_pattern = re.compile(r'### 2\. Task outcome \(extremely detailed version\):(.+?)(?=### 3|\Z)', re.DOTALL)
-
-    for msg in response:
+LINK_PATTERN = re.compile(r'https?://\S+')
+# Add detailed result matching pattern
+DETAIL_PATTERN = re.compile(r'### 2\. Task outcome \(extremely detailed version\):(.+?)(?=### 3|\Z)', re.DOTALL)
+EXECUTION_LOGS_TITLE = '📝 Execution Logs'
+
+class AgentResponseParser:
+    """parse_agent_response for a message list that grows while the agent runs.
+
+    The Space sends the whole list each time it changes, adding messages or
+    rewriting the last one as it streams. update() reads only the messages it
+    has not read yet and leaves the last one until another follows it (or
+    final=True), so each message is parsed once. The current step and the
+    collected result are kept between calls; each call returns what it found
+    as (event, data) pairs: step, detail, links and final_answer.
+    """
+
+    def __init__(self):
+        self.result = {
+                "final_answer": "",
+                "execution_steps": [],
+                "search_links": []
+                }
+        self.current_step = {}
+        self.read = 0
+
+    def update(self, messages, final=False):
+        if not isinstance(messages, list):
+            return []
+        end = len(messages) if final else len(messages) - 1
+        events = []
+        for msg in messages[self.read:end]:
+            events.extend(self.feed(msg))
+        self.read = max(self.read, end)
+        return events
+
+    def feed(self, msg):
+        """Parse one message; returns the events it produced"""
+        events = []
         content = str(msg.get('content', ''))
-        metadata = msg.get('metadata', {})
+        metadata = msg.get('metadata') or {}
+        step = len(self.result["execution_steps"]) or None
 
         # Parse the final answer
         if "Final answer:" in content:
-            result["final_answer"] = _extract_final_answer(content)
+            self.result["final_answer"] = _extract_final_answer(content)
+            events.append(("final_answer", {
+                    "text": self.result["final_answer"],
+                    "novelty_score": extract_novelty_score(self.result["final_answer"])
+                    }))
 
         # Parse execution steps (only process assistant messages)
         if msg.get('role') == 'assistant' and content.startswith("**Step"):
-            current_step = {
+            self.current_step = {
                     "title": content.strip('* '),
                     "details": []
                     }
-            result["execution_steps"].append(current_step)
-        elif current_step and msg.get('role') == 'assistant':
+            self.result["execution_steps"].append(self.current_step)
+            step = len(self.result["execution_steps"])
+            events.append(("step", {"step": step, "title": self.current_step["title"]}))
+        elif self.current_step and msg.get('role') == 'assistant':
             # Precisely extract detailed analysis content
-            if (detail_match := detail_pattern.search(content)):
+            if (detail_match := DETAIL_PATTERN.search(content)):
                 cleaned_content = re.sub(r'\*{2,}|`{3,}', '',
                                          detail_match.group(1)).strip()
-                current_step["details"].append(cleaned_content)
+                self.current_step["details"].append(cleaned_content)
+                events.append(("detail", {"step": step, "text": cleaned_content}))
 
         # Extract links from execution logs
-        if metadata.get('title') == '📝 Execution Logs':
-            result["search_links"].extend(
-                    link_pattern.findall(content)
-                    )
+        if metadata.get('title') == EXECUTION_LOGS_TITLE:
+            links = LINK_PATTERN.findall(content)
+            self.result["search_links"].extend(links)
+            if links:
+                events.append(("links", {"step": step, "links": links}))
+
+        return events
 
-    return result
+def parse_agent_response(response):
+    """Structurally parse the API response"""
+    parser = AgentResponseParser()
+    parser.update(response, final=True)
+    return parser.result
 
 def _extract_final_answer(content):
     """Extract and clean the final answer, convert dictionary format to Markdown"""
@@ -52,9 +91,8 @@ def _extract_final_answer(content):
     # Remove asterisks and other markers
     answer = re.sub(r'\*{2,}', '', answer).strip()
 
-    # Check if the content is in dictionary format
-    dict_match = re.search(r'\{.*\}', answer, re.DOTALL)
-    if dict_match:
+    # Check if the content is in dictionary format (a "{" with a "}" after it)
+    if answer.rfind('}') > answer.find('{') >= 0:
         try:
             # Attempt to extract novelty_score and report
             score_match = re.search(r"'novelty_score':\s*(\d+)", answer)
@@ -77,49 +115,86 @@ def _extract_final_answer(content):
     # Return the original content if not in dictionary format or parsing fails
     return answer
 
+# "# Novelty Score: 72/100" as formatted above, or the score as the agent wrote it
+NOVELTY_SCORE_PATTERN = re.compile(r"novelty[ _]score'?\s*[:=]?\s*(\d{1,3})", re.IGNORECASE)
+
+def extract_novelty_score(final_answer):
+    """The novelty score out of 100 in a final answer from _extract_final_answer, or None"""
+    match = NOVELTY_SCORE_PATTERN.search(final_answer or "")
+    return int(match.group(1)) if match else None
+
+def unique_steps(steps):
+    """The execution steps without repeats, in order"""
+    seen_steps = set()
+    unique = []
+    for step in steps:
+        # Use title and details as uniqueness criteria
+        step_content = (step['title'], tuple(step['details']))
+        if step_content not in seen_steps:
+            seen_steps.add(step_content)
+            unique.append(step)
+    return unique
+
+def clean_link(raw_link):
+    """A search link without its URL parameters and the text the agent wrote after it"""
+    # 1. Remove URL parameters
+    link = raw_link.split('?')[0]
+    # 2. Handle extra content after links (including parentheses and newlines)
+    link = re.sub(r'\).*$', '', link)
+    # 3. Clean various special characters (backslashes, n's, whitespace and dots) from the end
+    end = len(link)
+    while end and (link[end - 1] in '\\n.' or link[end - 1].isspace()):
+        end -= 1
+    link = link[:end]
+    # 4. Handle Markdown format in links
+    link = re.sub(r'\]\(.*$', '', link)
+    return link
+
+def clean_links(raw_links):
+    """The distinct cleaned search links, in order"""
+    seen = set()
+    links = []
+    for raw_link in raw_links:
+        link = clean_link(raw_link)
+        if link and link.startswith('http') and link not in seen:
+            seen.add(link)
+            links.append(link)
+    return links
+
+def prepare_report(result):
+    """A parsed result ready to render: steps deduplicated, links cleaned and deduplicated"""
+    return {
+            "final_answer": result["final_answer"],
+            "execution_steps": unique_steps(result["execution_steps"]),
+            "search_links": clean_links(result["search_links"])
+            }
+
+# References rendered per chunk
+LINKS_PER_CHUNK = 256
+
+def render_markdown(report):
+    """Yield the Markdown of a report from prepare_report a section at a time"""
+    # Final answer section
+    yield "## MoonshotAI: Your Startup Novelty Deep Research Report\n"
+    yield report["final_answer"] + "\n"
+
+    # Research steps section
+    if report["execution_steps"]:
+        yield "\n### Execution Steps\n"
+        for step in report["execution_steps"]:
+            yield f"\n#### {step['title']}\n" + '\n'.join(step["details"]) + "\n"
+
+    # Search results section
+    links = report["search_links"]
+    if links:
+        yield "\n### Relevant References\n"
+        for start in range(0, len(links), LINKS_PER_CHUNK):
+            yield "".join(f"- {link}\n" for link in links[start:start + LINKS_PER_CHUNK])
+
 def save_as_markdown(result, filename):
     """Generate an optimized Markdown report"""
     with open(filename, 'w', encoding='utf-8') as f:
-        # Final answer section
-        f.write("## MoonshotAI: Your Startup Novelty Deep Research Report\n")
-        f.write(result["final_answer"] + "\n")
-
-        # Research steps section - Add step deduplication
-        if result["execution_steps"]:
-            f.write("\n### Execution Steps\n")
-            seen_steps = set()
-            unique_steps = []
-
-            for step in result["execution_steps"]:
-                # Use title and details as uniqueness criteria
-                step_content = (step['title'], tuple(step['details']))
-                if step_content not in seen_steps:
-                    seen_steps.add(step_content)
-                    unique_steps.append(step)
-
-            # Output deduplicated steps
-            for step in unique_steps:
-                f.write(f"\n#### {step['title']}\n")
-                f.write('\n'.join(step["details"]) + "\n")
-
-        # Search results section
-        if result["search_links"]:
-            f.write("\n### Relevant References\n")
-            seen = set()
-            for raw_link in result["search_links"]:
-                # More robust link cleaning logic
-                # 1. Remove URL parameters
-                link = raw_link.split('?')[0]
-                # 2. Handle extra content after links (including parentheses and newlines)
-                link = re.sub(r'\).*$', '', link)
-                # 3. Clean various special characters
-                link = re.sub(r'[\\n\s.]+$', '', link)
-                # 4. Handle Markdown format in links
-                link = re.sub(r'\]\(.*$', '', link)
-
-                if link and link.startswith('http') and link not in seen:
-                    seen.add(link)
-                    f.write(f"- {link}\n")
+        f.writelines(render_markdown(prepare_report(result)))
 
 if __name__ == "__main__":
     # Get the current script directory
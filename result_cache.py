@@ -0,0 +1,324 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from resilience import DeadlineExceeded
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process coalescing, the cache itself still works
+    fcntl = None
+
+# Writes per process between pruning passes of a store's directory
+PRUNE_EVERY = 50
+# A value larger than this share of the memory budget is only kept on disk
+MEMORY_VALUE_SHARE = 8
+# Polling interval bounds while waiting for a file lock held by another worker
+LOCK_POLL_MIN = 0.01
+LOCK_POLL_MAX = 0.25
+
+def normalize_proposal(proposal):
+    """Collapse whitespace so trivially different resubmits share a cache entry"""
+    return " ".join(str(proposal).split())
+
+def cache_key(*parts):
+    """Content-addressed key: SHA-256 over the JSON encoding of all parts"""
+    payload = json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class PruneSchedule:
+    """Counts a store's writes in this process: due() is true on the first write and every
+    PRUNE_EVERY writes after it, so the store's directory is scanned only that often"""
+
+    def __init__(self, every=PRUNE_EVERY):
+        self.every = every
+        self._writes = every
+        self._lock = threading.Lock()
+
+    def due(self):
+        with self._lock:
+            self._writes += 1
+            if self._writes < self.every:
+                return False
+            self._writes = 0
+            return True
+
+def prune_directory(directory, ttl, max_bytes, entry_suffix):
+    """Remove the files under directory untouched for ttl seconds, then the least recently
+    touched entries (files ending in entry_suffix) until they total at most max_bytes.
+    Returns the number of entries removed; stale lock and temp files go uncounted"""
+    now = time.time()
+    entries = []
+    total = 0
+    removed = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            is_entry = name.endswith(entry_suffix)
+            if st.st_mtime + ttl < now:
+                if remove_file(path) and is_entry:
+                    removed += 1
+                continue
+            if is_entry:
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+    if total <= max_bytes:
+        return removed
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if remove_file(path):
+            removed += 1
+        total -= size
+    return removed
+
+def remove_file(path):
+    """Delete path; False if it was already gone or could not be removed"""
+    try:
+        os.remove(path)
+    except OSError:
+        return False
+    return True
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb', **kwargs):
+    """A temporary file next to path, opened with mode, that replaces path once the block
+    completes, so readers never see a partial file; it is removed if the block fails"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+
+class _InFlight:
+    """A computation other threads of this process can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResultCache:
+    """Two-tier result cache: an in-memory LRU per process, bounded by the encoded size of
+    its values, and a size-bounded directory shared by all gunicorn workers on the host.
+
+    Identical concurrent lookups are coalesced so only one caller computes the
+    value: threads of the same process wait on an event, other processes wait
+    on a per-key file lock and then read the value the leader stored. Both
+    waits end at the caller's deadline.
+    """
+
+    def __init__(self, directory, ttl=7 * 24 * 3600, memory_bytes=64 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.memory_bytes = memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._prune_schedule = PruneSchedule()
+        self._counters = {
+                "memory_hits": 0,
+                "disk_hits": 0,
+                "misses": 0,
+                "coalesced": 0,
+                "stores": 0,
+                "evictions": 0,
+                "errors": 0
+                }
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                self._forget(key)
+
+        value, expires_at, size = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            # Back in memory until the entry's own expiry: reading it does not extend its lifetime
+            self._remember(key, value, expires_at, size)
+        return value
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        data = json.dumps({"expires_at": expires_at, "value": value}, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._remember(key, value, expires_at, len(data))
+            self._counters["stores"] += 1
+        try:
+            self._write_disk(key, data)
+        except OSError as e:
+            print(f"[WARN] Failed to write cache entry {key[:12]}: {str(e)}")
+            with self._lock:
+                self._counters["errors"] += 1
+
+    def get_or_compute(self, key, compute, checked=False, deadline=None):
+        """Return the cached value for key, computing and storing it on a miss;
+        checked means the caller has just missed on get(key), so it is not looked up again.
+        Waiting for another caller's computation raises DeadlineExceeded once deadline passes"""
+        value = None if checked else self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            if not inflight.done.wait(deadline.remaining() if deadline else None):
+                raise DeadlineExceeded(f"Waiting for a coalesced request exceeded its {deadline.seconds:g}s deadline")
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.value
+
+        try:
+            with self._file_lock(key, deadline):
+                # Another worker may have finished while we waited for the lock
+                value, expires_at, size = self._read_disk(key, time.time())
+                if value is None:
+                    value = compute()
+                    self.set(key, value)
+                else:
+                    with self._lock:
+                        self._counters["coalesced"] += 1
+                        self._remember(key, value, expires_at, size)
+            inflight.value = value
+            return value
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_size
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None
+        return stats
+
+    def _remember(self, key, value, expires_at, size):
+        """Keep value in memory, size being the bytes of its encoded entry; call with _lock held"""
+        self._forget(key)
+        if size > self.memory_bytes // MEMORY_VALUE_SHARE:
+            return
+        self._memory[key] = (expires_at, value, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (_, _, evicted) = self._memory.popitem(last=False)
+            self._memory_size -= evicted
+            self._counters["evictions"] += 1
+
+    def _forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= entry[2]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_disk(self, key, now):
+        """(value, expires_at, bytes of its entry), or (None, 0, 0)"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            entry = json.loads(data)
+        except (OSError, ValueError):
+            return None, 0, 0
+        expires_at = entry.get("expires_at", 0)
+        if expires_at <= now:
+            remove_file(path)
+            return None, 0, 0
+        try:
+            # Touch the entry so size-based eviction drops the least recently used first
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value"), expires_at, len(data)
+
+    def _write_disk(self, key, data):
+        with atomic_write(self._path(key)) as f:
+            f.write(data)
+        if self._prune_schedule.due():
+            # Entries are touched when read, so the least recently used go first
+            evicted = prune_directory(self.directory, self.ttl, self.max_disk_bytes, '.json')
+            with self._lock:
+                self._counters["evictions"] += evicted
+
+    def _file_lock(self, key, deadline=None):
+        return FileLock(os.path.join(self.directory, key[:2], f"{key}.lock"), deadline)
+
+class FileLock:
+    """Exclusive flock on a per-key lock file (a no-op where fcntl is unavailable).
+    With a deadline, waiting for it raises DeadlineExceeded once the deadline passes"""
+
+    def __init__(self, path, deadline=None):
+        self.path = path
+        self.deadline = deadline
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'a')
+        if self.deadline is None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            return self
+        delay = LOCK_POLL_MIN
+        while True:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except BlockingIOError:
+                remaining = self.deadline.remaining()
+                if remaining <= 0:
+                    self._file.close()
+                    self._file = None
+                    raise DeadlineExceeded(f"Waiting for a lock held by another worker exceeded its {self.deadline.seconds:g}s deadline")
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, LOCK_POLL_MAX)
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
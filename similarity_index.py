@@ -0,0 +1,209 @@
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+# One-permutation MinHash: each shingle hash lands in one of BINS bins, and each bin keeps its minimum
+BINS = 64
+# 8 bands of 8: pairs above ~0.85 similarity almost always share a band, unrelated ones almost never
+ROWS_PER_BAND = 8
+EMPTY = 0xFFFFFFFF
+MASK64 = (1 << 64) - 1
+WORD = re.compile(r"\w+")
+# Inserts per process between eviction passes
+EVICT_EVERY = 100
+
+def signature(text, shingle=3):
+    """MinHash signature of the text's word shingles, packed as BINS 32-bit values"""
+    words = [zlib.crc32(word.encode('utf-8')) for word in WORD.findall(str(text).lower())]
+    sig = [EMPTY] * BINS
+    for i in range(max(1, len(words) - shingle + 1)):
+        # Order-sensitive mix of the shingle's word hashes, then a splitmix64 finaliser
+        h = 0
+        for n, word in enumerate(words[i:i + shingle]):
+            h = (h ^ word * (0x9E3779B97F4A7C15 + 2 * n)) & MASK64
+        h ^= h >> 31
+        h = (h * 0xBF58476D1CE4E5B9) & MASK64
+        h ^= h >> 29
+        value = h >> 32
+        if value < sig[h % BINS]:
+            sig[h % BINS] = value
+    # Densify: an empty bin borrows from the next filled one, the same way in every signature
+    filled = [n for n, value in enumerate(sig) if value != EMPTY]
+    if filled:
+        for n in range(BINS):
+            if sig[n] == EMPTY:
+                sig[n] = sig[next((f for f in filled if f > n), filled[0])]
+    return struct.pack(f"<{BINS}I", *sig)
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(struct.unpack(f"<{BINS}I", a), struct.unpack(f"<{BINS}I", b))) / BINS
+
+def band_keys(scope, sig):
+    """LSH bucket keys: one signed 64-bit key per band of ROWS_PER_BAND values, salted with the scope"""
+    width = ROWS_PER_BAND * 4
+    keys = []
+    for band in range(BINS // ROWS_PER_BAND):
+        digest = zlib.crc32(sig[band * width:(band + 1) * width], zlib.crc32(f"{scope}:{band}".encode('utf-8')))
+        keys.append((band << 32) | digest)
+    return keys
+
+class Match:
+    def __init__(self, result_key, similarity):
+        self.result_key = result_key
+        self.similarity = similarity
+
+class SimilarityIndex:
+    """Near-duplicate index over past proposals, in a SQLite file shared by all workers on the host.
+
+    Each proposal is stored as a MinHash signature of its word 3-shingles under
+    the key of the result computed for it. Lookups only compare against
+    proposals sharing an LSH band with the query, so their cost does not grow
+    with the size of the index. Entries expire after ttl seconds unused, and the
+    least recently used are evicted beyond max_entries.
+    """
+
+    def __init__(self, path, max_entries=100000, ttl=7 * 24 * 3600, max_candidates=50):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_candidates = max_candidates
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"lookups": 0, "matches": 0, "inserts": 0, "evictions": 0, "errors": 0}
+        self._inserts_since_eviction = EVICT_EVERY
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._db() as db:
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS proposals (
+                    id INTEGER PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    result_key TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    used_at REAL NOT NULL,
+                    UNIQUE (scope, result_key)
+                );
+                CREATE INDEX IF NOT EXISTS proposals_used_at ON proposals (used_at);
+                CREATE TABLE IF NOT EXISTS bands (
+                    key INTEGER NOT NULL,
+                    proposal_id INTEGER NOT NULL,
+                    PRIMARY KEY (key, proposal_id)
+                ) WITHOUT ROWID;
+                """)
+
+    def _db(self):
+        """This thread's connection; a forked worker opens its own"""
+        if getattr(self._local, "pid", None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def lookup(self, scope, text, threshold):
+        """Stored proposals at least `threshold` similar to text, most similar first"""
+        self._count("lookups")
+        sig = signature(text)
+        keys = band_keys(scope, sig)
+        try:
+            rows = self._db().execute(
+                    # CROSS JOIN keeps the band lookup as the outer loop
+                    f"SELECT DISTINCT p.id, p.result_key, p.signature, p.used_at FROM bands b CROSS JOIN proposals p "
+                    f"ON p.id = b.proposal_id WHERE b.key IN ({','.join('?' * len(keys))}) AND p.scope = ? LIMIT ?",
+                    (*keys, scope, self.max_candidates)
+                    ).fetchall()
+        except sqlite3.Error as e:
+            self._error("lookup", e)
+            return []
+        now = time.time()
+        matches = []
+        for _, result_key, stored, used_at in rows:
+            score = similarity(sig, stored)
+            if score >= threshold and used_at + self.ttl > now:
+                matches.append(Match(result_key, round(score, 3)))
+        matches.sort(key=lambda match: match.similarity, reverse=True)
+        if matches:
+            self._count("matches")
+        return matches
+
+    def touch(self, scope, result_key):
+        """Mark an entry as used so eviction keeps it"""
+        try:
+            with self._db() as db:
+                db.execute("UPDATE proposals SET used_at = ? WHERE scope = ? AND result_key = ?", (time.time(), scope, result_key))
+        except sqlite3.Error as e:
+            self._error("touch", e)
+
+    def add(self, scope, text, result_key):
+        """Index text under result_key, replacing any earlier entry for that key"""
+        sig = signature(text)
+        try:
+            with self._db() as db:
+                self._delete(db, db.execute("SELECT id, scope, signature FROM proposals WHERE scope = ? AND result_key = ?",
+                                            (scope, result_key)).fetchall())
+                proposal_id = db.execute("INSERT INTO proposals (scope, result_key, signature, used_at) VALUES (?, ?, ?, ?)",
+                                         (scope, result_key, sig, time.time())).lastrowid
+                db.executemany("INSERT OR IGNORE INTO bands (key, proposal_id) VALUES (?, ?)",
+                               [(key, proposal_id) for key in band_keys(scope, sig)])
+                if self._eviction_due():
+                    self._evict(db)
+        except sqlite3.Error as e:
+            self._error("insert", e)
+            return
+        self._count("inserts")
+
+    def discard(self, scope, result_key):
+        """Drop the entry for result_key, e.g. once its result is gone from the cache"""
+        try:
+            with self._db() as db:
+                self._delete(db, db.execute("SELECT id, scope, signature FROM proposals WHERE scope = ? AND result_key = ?",
+                                            (scope, result_key)).fetchall())
+        except sqlite3.Error as e:
+            self._error("discard", e)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        try:
+            stats["entries"] = self._db().execute("SELECT COUNT(*) FROM proposals").fetchone()[0]
+        except sqlite3.Error:
+            stats["entries"] = None
+        return stats
+
+    def _eviction_due(self):
+        with self._lock:
+            self._inserts_since_eviction += 1
+            if self._inserts_since_eviction < EVICT_EVERY:
+                return False
+            self._inserts_since_eviction = 0
+            return True
+
+    def _evict(self, db):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        victims = db.execute("SELECT id, scope, signature FROM proposals WHERE used_at < ?", (time.time() - self.ttl,)).fetchall()
+        excess = db.execute("SELECT COUNT(*) FROM proposals").fetchone()[0] - len(victims) - self.max_entries
+        if excess > 0:
+            # Evict at least 1% at a time so a full index is not trimmed on every pass
+            victims += db.execute("SELECT id, scope, signature FROM proposals WHERE used_at >= ? ORDER BY used_at LIMIT ?",
+                                  (time.time() - self.ttl, max(excess, self.max_entries // 100))).fetchall()
+        self._delete(db, victims)
+        if victims:
+            self._count("evictions", len(victims))
+
+    def _delete(self, db, rows):
+        db.executemany("DELETE FROM bands WHERE key = ? AND proposal_id = ?",
+                       [(key, proposal_id) for proposal_id, scope, sig in rows for key in band_keys(scope, sig)])
+        db.executemany("DELETE FROM proposals WHERE id = ?", [(proposal_id,) for proposal_id, _, _ in rows])
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
+
+    def _error(self, action, e):
+        print(f"[WARN] Similarity index {action} failed: {str(e)}")
+        self._count("errors")
@@ -0,0 +1,105 @@
+import gzip
+import os
+import re
+import threading
+import time
+
+from result_cache import PruneSchedule, atomic_write, prune_directory, remove_file
+
+# Traces are stored under the content-addressed key of the result they belong to
+TRACE_ID = re.compile(r"[0-9a-f]{64}")
+
+class TraceStore:
+    """Reasoning traces, gzip-compressed in a directory shared by all workers on the host.
+
+    Traces are written once, next to the result they explain, and read back
+    only when a client asks for them. Entries expire ttl seconds after their
+    last use, and the least recently used are dropped beyond max_bytes on disk.
+    """
+
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_bytes=512 * 1024 * 1024, compresslevel=6):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self._lock = threading.Lock()
+        self._prune_schedule = PruneSchedule()
+        self._counters = {"stores": 0, "reads": 0, "misses": 0, "bytes_in": 0, "bytes_stored": 0, "evictions": 0, "errors": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, trace_id, chunks):
+        """Compress and store a trace given as a string or an iterable of strings, replacing any earlier one"""
+        if isinstance(chunks, str):
+            chunks = [chunks]
+        path = self._path(trace_id)
+        size = 0
+        try:
+            with atomic_write(path) as f, gzip.GzipFile(fileobj=f, mode='wb', compresslevel=self.compresslevel, mtime=0) as gz:
+                for chunk in chunks:
+                    data = chunk.encode('utf-8')
+                    size += len(data)
+                    gz.write(data)
+            stored = os.path.getsize(path)
+        except OSError as e:
+            print(f"[WARN] Failed to store reasoning trace {trace_id[:12]}: {str(e)}")
+            self._count("errors")
+            return False
+        with self._lock:
+            self._counters["stores"] += 1
+            self._counters["bytes_in"] += size
+            self._counters["bytes_stored"] += stored
+        if self._prune_schedule.due():
+            # Traces are touched when read, so the least recently used go first
+            self._count("evictions", prune_directory(self.directory, self.ttl, self.max_bytes, '.gz'))
+        return True
+
+    def join(self, trace_id, parts):
+        """Store one trace made of others: parts is a list of (heading, source trace id).
+        Sources that are missing are left out; returns False if all were"""
+        texts = [(heading, self.get(source_id)) for heading, source_id in parts]
+        chunks = [f"{heading}\n{text}" for heading, text in texts if text]
+        if not chunks:
+            return False
+        return self.put(trace_id, "\n\n".join(chunks))
+
+    def get(self, trace_id):
+        """The trace as text, or None"""
+        data = self.get_compressed(trace_id)
+        return gzip.decompress(data).decode('utf-8') if data is not None else None
+
+    def get_compressed(self, trace_id):
+        """The trace as stored (gzip bytes), e.g. to send with Content-Encoding: gzip, or None"""
+        if not TRACE_ID.fullmatch(trace_id or ""):
+            return None
+        path = self._path(trace_id)
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                self._remove(path)
+                self._count("misses")
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Touch the entry so pruning drops the least recently used first
+            os.utime(path)
+        except OSError:
+            self._count("misses")
+            return None
+        self._count("reads")
+        return data
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["compression_ratio"] = round(stats["bytes_in"] / stats["bytes_stored"], 2) if stats["bytes_stored"] else None
+        return stats
+
+    def _path(self, trace_id):
+        return os.path.join(self.directory, trace_id[:2], f"{trace_id}.txt.gz")
+
+    def _remove(self, path):
+        if remove_file(path):
+            self._count("evictions")
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            self._counters[counter] += n
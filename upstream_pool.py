@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+
+from resilience import CircuitOpen
+
+def target_specs(upstreams_json=None, api_keys=None, base_url=None):
+    """Settings for each upstream target.
+
+    upstreams_json is a JSON list of objects with "api_key" (or "api_key_env",
+    the name of a variable holding it) and optional "name", "base_url",
+    "weight", "max_connections", "rps" and "tpm". Without it there is one
+    target per comma-separated key in api_keys, all at base_url.
+    """
+    if upstreams_json:
+        specs = json.loads(upstreams_json)
+        if not isinstance(specs, list) or not specs:
+            raise ValueError("DEEPSEEK_UPSTREAMS must be a non-empty JSON list")
+    else:
+        keys = [key.strip() for key in (api_keys or "").split(",") if key.strip()] or [None]
+        specs = [{"name": "deepseek" if len(keys) == 1 else f"key{n}", "api_key": key} for n, key in enumerate(keys, 1)]
+    targets = []
+    for n, spec in enumerate(specs, 1):
+        if "api_key_env" in spec:
+            spec = dict(spec, api_key=os.getenv(spec["api_key_env"]))
+        targets.append({
+                "name": str(spec.get("name") or f"upstream{n}"),
+                "api_key": spec.get("api_key"),
+                "base_url": spec.get("base_url") or base_url,
+                "weight": float(spec.get("weight", 1.0)),
+                "max_connections": spec.get("max_connections"),
+                "rps": spec.get("rps"),
+                "tpm": spec.get("tpm")
+                })
+    names = [target["name"] for target in targets]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Upstream target names must be unique: {names}")
+    return targets
+
+class UpstreamTarget:
+    """One API key at one base URL, with its own client, rate limiter and circuit breaker.
+
+    weight is the target's capacity relative to the others in its pool. The
+    clients are created by the app; the pool only routes and keeps the counts.
+    """
+
+    def __init__(self, name, base_url, api_key, rate_limiter, breaker, weight=1.0):
+        if weight <= 0:
+            raise ValueError(f"Upstream target {name} needs a positive weight")
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.weight = weight
+        self.client = None
+        self.async_client = None
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.last_probe_error = None
+        self._usage = {"requests": 0, "succeeded": 0, "failed": 0, "tokens": 0}
+        self._lock = threading.Lock()
+
+    def load(self):
+        return self.outstanding / self.weight
+
+    def record_tokens(self, tokens):
+        with self._lock:
+            self._usage["tokens"] += tokens
+
+    def stats(self):
+        with self._lock:
+            usage = dict(self._usage)
+        return {
+                "base_url": self.base_url,
+                "weight": self.weight,
+                "outstanding": self.outstanding,
+                "state": self.breaker.stats()["state"],
+                "last_probe_error": self.last_probe_error,
+                **usage,
+                "rate_limit": self.rate_limiter.stats()
+                }
+
+class _Lease:
+    """One call routed to a target; releases the slot and records the outcome on exit"""
+
+    def __init__(self, pool, target, call):
+        self.pool = pool
+        self.target = target
+        self.call = call
+
+    def __enter__(self):
+        return self.target
+
+    def __exit__(self, exc_type, exc, tb):
+        self.call.__exit__(exc_type, exc, tb)
+        self.pool._release(self.target, exc)
+        return False
+
+class UpstreamPool:
+    """Routes each upstream call to the target with the fewest outstanding requests per unit of weight.
+
+    A target whose breaker has opened after repeated failures is ejected: it
+    gets no calls until its breaker's half-open trial succeeds or a health
+    probe passes. Outstanding counts are per worker process.
+    """
+
+    def __init__(self, name, targets):
+        if not targets:
+            raise ValueError(f"{name} needs at least one upstream target")
+        self.name = name
+        self.targets = targets
+        self._lock = threading.Lock()
+
+    def lease(self):
+        """Context manager yielding the least-loaded available target; raises CircuitOpen if all are ejected"""
+        retry_after = None
+        with self._lock:
+            # Ties go to the target that has not been failing, then to the one used least
+            ranked = sorted(self.targets, key=lambda t: (t.load(), t.consecutive_failures, t._usage["requests"] / t.weight))
+            for target in ranked:
+                try:
+                    call = target.breaker.call()
+                except CircuitOpen as e:
+                    retry_after = min(retry_after or e.retry_after, e.retry_after)
+                    continue
+                target.outstanding += 1
+                return _Lease(self, target, call)
+        raise CircuitOpen(self.name, retry_after)
+
+    def check(self):
+        """Raise CircuitOpen if every target is ejected, without making a call"""
+        retry_after = None
+        for target in self.targets:
+            try:
+                target.breaker.check()
+                return
+            except CircuitOpen as e:
+                retry_after = min(retry_after or e.retry_after, e.retry_after)
+        raise CircuitOpen(self.name, retry_after)
+
+    def _release(self, target, exc):
+        with self._lock:
+            target.outstanding -= 1
+            target.consecutive_failures = 0 if exc is None else target.consecutive_failures + 1
+        with target._lock:
+            target._usage["requests"] += 1
+            target._usage["succeeded" if exc is None else "failed"] += 1
+
+    def check_health(self, probe):
+        """Probe every target not mid-trial: a passing probe reinstates an ejected target,
+        a failing one counts against a healthy target like any other failed call"""
+        for target in self.targets:
+            state = target.breaker.stats()["state"]
+            if state == "half_open":
+                continue
+            try:
+                if state == "open":
+                    probe(target)
+                    target.breaker.reset()
+                    print(f"[INFO] Upstream {target.name} passed its health check and is back in the pool")
+                else:
+                    with target.breaker.call():
+                        probe(target)
+                target.last_probe_error = None
+            except Exception as e:
+                target.last_probe_error = f"{type(e).__name__}: {str(e)}"
+
+    def start_health_checks(self, probe, interval):
+        """Run check_health every `interval` seconds in a daemon thread (0 disables)"""
+        if interval <= 0:
+            return
+
+        def loop():
+            stopped = threading.Event()
+            while not stopped.wait(interval):
+                self.check_health(probe)
+
+        threading.Thread(target=loop, name=f"{self.name}-health", daemon=True).start()
+
+    def stats(self):
+        return {target.name: target.stats() for target in self.targets}
+
+    def breaker_stats(self):
+        return {target.name: target.breaker.stats() for target in self.targets}